@@ -0,0 +1,1068 @@
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from pathlib import Path
+from uuid import uuid4
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from src.analytics.panel import (
+    PANEL_METRICS,
+    PERIOD_START_TOLERANCE_DAYS,
+    _history_arrays,
+)
+from src.analytics.stock_metrics import (
+    DEFAULT_PERIODS,
+    TRADING_DAYS_PER_YEAR,
+    PeriodConfig,
+)
+from src.data.stocks import normalize_brazilian_ticker
+
+
+# Estado incremental das métricas do painel.
+#
+# Para cada ticker fica um buffer com as linhas do histórico ainda dentro de
+# alguma janela e, para cada período, as estatísticas suficientes da janela:
+# somas e somas de quadrados dos retornos diários, contagem de dias
+# positivos, somas de volume e dividendos, fator composto do retorno total e
+# o estado do drawdown (máximo corrente, pico e vale do pior drawdown).
+#
+# Um pregão novo entra em O(1) e as linhas que saem do início da janela são
+# removidas das somas. Algumas partes não são removíveis em O(1) e são
+# refeitas só quando preciso, de forma vetorizada, sobre a janela:
+#
+# - melhor/pior dia e pico do drawdown, quando a linha que os definia sai
+#   da janela;
+# - volatilidade negativa, quando a Selic do período muda (o limiar do
+#   retorno em excesso muda junto).
+#
+# Se o histórico for revisado (ex: dividendo corrigido no overlap da
+# atualização), o estado do ticker é reconstruído do zero.
+#
+# O estado fica em disco, um arquivo .npz por ticker (o fim do buffer que
+# ainda está em alguma janela e as somas de cada janela), ao lado do cache
+# de métricas: cada ranking diário é um processo novo e só aplica o pregão
+# que faltava.
+
+# Linhas finais comparadas para detectar revisão do histórico. Cobre o
+# overlap de daily_stock_history (15 dias corridos).
+REVISION_CHECK_ROWS = 20
+
+# Linhas do fim do histórico lidas em update(); se houver mais linhas novas
+# que isso, lê o histórico inteiro.
+UPDATE_TAIL_ROWS = 128
+
+# Linhas aplicadas incrementalmente antes de reconstruir o estado do zero,
+# para o erro de arredondamento das somas não se acumular.
+REBUILD_AFTER_ROWS = 252
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+DEFAULT_STATE_DIR = PROJECT_ROOT / "storage" / "metrics" / "incremental"
+
+# Aumentar sempre que mudar o formato do estado ou alguma regra de cálculo.
+STATE_VERSION = 1
+
+BUFFER_COLUMNS = [
+    "dates",
+    "close",
+    "dividend",
+    "financial_volume",
+    "price_returns",
+    "total_returns",
+    "total_index",
+]
+
+
+@lru_cache(maxsize=65_536)
+def _period_target(last_date_ns: int, years: int) -> np.datetime64:
+    # Última data menos 'years' anos, com a aritmética de relativedelta.
+    # Todos os tickers e janelas com a mesma data reaproveitam o resultado.
+    return (
+        pd.Timestamp(last_date_ns) - pd.DateOffset(years=years)
+    ).to_datetime64()
+
+
+class _Buffer:
+    """
+    Linhas do histórico de um ticker com índice absoluto crescente. Linhas
+    que já saíram de todas as janelas são descartadas de tempos em tempos
+    (o índice absoluto continua valendo).
+    """
+
+    def __init__(self, dates, close, dividend, financial_volume):
+        n_rows = len(dates)
+        capacity = max(16, n_rows * 2)
+
+        self.offset = 0
+        self.size = n_rows
+        # Primeira linha que ainda está no histórico recebido: a janela do
+        # ranking (últimos N anos) anda, e nenhuma janela começa antes dela.
+        self.floor = 0
+
+        self.dates = np.empty(capacity, dtype="datetime64[ns]")
+        self.close = np.empty(capacity)
+        self.dividend = np.empty(capacity)
+        self.financial_volume = np.empty(capacity)
+        self.price_returns = np.empty(capacity)
+        self.total_returns = np.empty(capacity)
+        # Produto acumulado de (1 + retorno total), ignorando NaN.
+        self.total_index = np.empty(capacity)
+
+        self.dates[:n_rows] = dates
+        self.close[:n_rows] = close
+        self.dividend[:n_rows] = dividend
+        self.financial_volume[:n_rows] = financial_volume
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            previous = np.concatenate([[np.nan], close[:-1]])
+            self.price_returns[:n_rows] = close / previous - 1
+            self.total_returns[:n_rows] = (close + dividend) / previous - 1
+
+        growth = np.where(
+            np.isnan(self.total_returns[:n_rows]),
+            1.0,
+            1 + self.total_returns[:n_rows],
+        )
+        self.total_index[:n_rows] = np.cumprod(growth)
+
+    @property
+    def end(self) -> int:
+        # Índice absoluto da próxima linha.
+        return self.offset + self.size
+
+    def view(self, name: str, start: int, stop: int) -> np.ndarray:
+        """
+        Fatia [start, stop) em índices absolutos.
+        """
+
+        return getattr(self, name)[start - self.offset:stop - self.offset]
+
+    def at(self, name: str, row: int):
+        return getattr(self, name)[row - self.offset]
+
+    def append(self, date, close: float, dividend: float, financial_volume: float) -> int:
+        if self.size == len(self.close):
+            self._grow()
+
+        i = self.size
+        previous_close = self.close[i - 1] if i > 0 else np.nan
+
+        self.dates[i] = date
+        self.close[i] = close
+        self.dividend[i] = dividend
+        self.financial_volume[i] = financial_volume
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.price_returns[i] = close / previous_close - 1
+            self.total_returns[i] = (close + dividend) / previous_close - 1
+
+        previous_index = self.total_index[i - 1] if i > 0 else 1.0
+
+        if np.isnan(self.total_returns[i]):
+            self.total_index[i] = previous_index
+        else:
+            self.total_index[i] = previous_index * (1 + self.total_returns[i])
+
+        self.size += 1
+
+        return self.end - 1
+
+    def _grow(self) -> None:
+        for name in BUFFER_COLUMNS:
+            values = getattr(self, name)
+            grown = np.empty(len(values) * 2, dtype=values.dtype)
+            grown[:self.size] = values[:self.size]
+            setattr(self, name, grown)
+
+    def discard_before(self, row: int) -> None:
+        """
+        Descarta as linhas com índice absoluto < row (ring buffer). Só copia
+        quando a parte morta passa da metade do buffer.
+        """
+
+        dead = row - self.offset
+
+        if dead <= 0 or dead < self.size // 2:
+            return
+
+        for name in BUFFER_COLUMNS:
+            values = getattr(self, name)
+            values[:self.size - dead] = values[dead:self.size].copy()
+
+        self.offset += dead
+        self.size -= dead
+
+
+@dataclass
+class _ReturnStats:
+    """
+    Estatísticas dos retornos diários de uma janela (linhas com retorno
+    válido).
+    """
+
+    count: int = 0
+    total: float = 0.0
+    squares: float = 0.0
+    positive: int = 0
+
+    best: float = np.nan
+    best_row: int = -1
+    worst: float = np.nan
+    worst_row: int = -1
+
+    # Retornos abaixo do limiar diário da Selic (volatilidade negativa).
+    threshold: float = np.nan
+    downside_count: int = 0
+    downside_total: float = 0.0
+    downside_squares: float = 0.0
+
+    def add(self, row: int, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.squares += value * value
+        self.positive += value > 0
+
+        if self.best_row < 0 or value > self.best:
+            self.best, self.best_row = value, row
+
+        if self.worst_row < 0 or value < self.worst:
+            self.worst, self.worst_row = value, row
+
+        if value < self.threshold:
+            self.downside_count += 1
+            self.downside_total += value
+            self.downside_squares += value * value
+
+    def remove(self, value: float) -> None:
+        self.count -= 1
+        self.total -= value
+        self.squares -= value * value
+        self.positive -= value > 0
+
+        if value < self.threshold:
+            self.downside_count -= 1
+            self.downside_total -= value
+            self.downside_squares -= value * value
+
+
+def _std_from_sums(count: int, total: float, squares: float) -> float:
+    if count < 2:
+        return np.nan
+
+    variance = (squares - total * total / count) / (count - 1)
+
+    return float(np.sqrt(max(variance, 0.0)))
+
+
+@dataclass
+class _DrawdownState:
+    """
+    Pior drawdown de uma série em uma janela, com o máximo corrente e o
+    pico do pior drawdown para saber quando é preciso refazer o cálculo.
+    """
+
+    value: float = np.nan
+    peak_row: int = -1
+    running_max: float = np.nan
+    running_max_row: int = -1
+
+    def add(self, row: int, value: float) -> None:
+        if self.running_max_row < 0 or value > self.running_max:
+            self.running_max, self.running_max_row = value, row
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            drawdown = value / self.running_max - 1
+
+        if np.isnan(self.value) or drawdown < self.value:
+            self.value = drawdown
+            self.peak_row = self.running_max_row
+
+
+def _drawdown_from_values(values: np.ndarray, first_row: int) -> _DrawdownState:
+    state = _DrawdownState()
+
+    if len(values) == 0:
+        return state
+
+    running_max = np.fmax.accumulate(values)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        drawdown = values / running_max - 1
+
+    trough = int(np.nanargmin(drawdown)) if not np.isnan(drawdown).all() else 0
+
+    state.value = float(drawdown[trough])
+    state.peak_row = first_row + int(np.argmax(values[:trough + 1]))
+    state.running_max = float(running_max[-1])
+    state.running_max_row = first_row + int(np.argmax(values))
+
+    return state
+
+
+class WindowState:
+    """
+    Estatísticas de um período (ex: 5A) de um ticker. A janela vai do
+    primeiro pregão >= última data menos 'years' anos até a última linha,
+    com as mesmas regras de src.analytics.panel.
+    """
+
+    def __init__(self, buffer: _Buffer, years: int):
+        self.buffer = buffer
+        self.years = years
+        self.rebuild()
+
+    # ---------------------------------------------------------
+    # Limites da janela
+    # ---------------------------------------------------------
+
+    def _target(self, last_date: np.datetime64) -> np.datetime64:
+        return _period_target(int(last_date.astype("int64")), self.years)
+
+    def _start_for(self, last_row: int) -> int:
+        buffer = self.buffer
+        target = self._target(buffer.at("dates", last_row))
+
+        first = max(buffer.offset, buffer.floor)
+        dates = buffer.view("dates", first, last_row + 1)
+
+        return first + int(np.searchsorted(dates, target))
+
+    def raise_floor(self) -> None:
+        # Tira da janela as linhas antes do piso do buffer.
+        if self.start <= self.last and self.start < self.buffer.floor:
+            self._drop_until(min(self.buffer.floor, self.last))
+
+    # ---------------------------------------------------------
+    # Reconstrução vetorizada
+    # ---------------------------------------------------------
+
+    def rebuild(self) -> None:
+        buffer = self.buffer
+        self.last = buffer.end - 1
+
+        if self.last < buffer.offset:
+            self.start = buffer.end
+            self.price = _ReturnStats()
+            self.total = _ReturnStats()
+            self.volume_sum = 0.0
+            self.dividend_sum = 0.0
+            self.price_drawdown = _DrawdownState()
+            self.total_drawdown = _DrawdownState()
+            return
+
+        self.start = self._start_for(self.last)
+        self._rebuild_window()
+
+    def _rebuild_window(self) -> None:
+        buffer = self.buffer
+        start, stop = self.start, self.last + 1
+
+        self.volume_sum = float(buffer.view("financial_volume", start, stop).sum())
+        self.dividend_sum = float(buffer.view("dividend", start, stop).sum())
+
+        self.price = self._return_stats("price_returns", np.nan)
+        self.total = self._return_stats("total_returns", np.nan)
+
+        self._rebuild_price_drawdown()
+        self._rebuild_total_drawdown()
+
+    def _return_rows(self, name: str) -> tuple[np.ndarray, np.ndarray]:
+        # Retornos da janela: linhas depois do início, sem NaN.
+        first = self.start + 1
+        values = self.buffer.view(name, first, self.last + 1)
+        rows = np.arange(first, first + len(values))
+        valid = ~np.isnan(values)
+
+        return rows[valid], values[valid]
+
+    def _return_stats(self, name: str, threshold: float) -> _ReturnStats:
+        rows, values = self._return_rows(name)
+
+        stats = _ReturnStats(
+            count=len(values),
+            total=float(values.sum()),
+            squares=float((values * values).sum()),
+            positive=int((values > 0).sum()),
+        )
+
+        if len(values):
+            best = int(np.argmax(values))
+            worst = int(np.argmin(values))
+
+            stats.best, stats.best_row = float(values[best]), int(rows[best])
+            stats.worst, stats.worst_row = float(values[worst]), int(rows[worst])
+
+        self._set_threshold(stats, values, threshold)
+
+        return stats
+
+    @staticmethod
+    def _set_threshold(stats: _ReturnStats, values: np.ndarray, threshold: float) -> None:
+        below = values[values < threshold]
+
+        stats.threshold = threshold
+        stats.downside_count = len(below)
+        stats.downside_total = float(below.sum())
+        stats.downside_squares = float((below * below).sum())
+
+    def _rebuild_extremes(self, stats: _ReturnStats, name: str) -> None:
+        rows, values = self._return_rows(name)
+
+        if len(values):
+            best = int(np.argmax(values))
+            worst = int(np.argmin(values))
+
+            stats.best, stats.best_row = float(values[best]), int(rows[best])
+            stats.worst, stats.worst_row = float(values[worst]), int(rows[worst])
+        else:
+            stats.best, stats.best_row = np.nan, -1
+            stats.worst, stats.worst_row = np.nan, -1
+
+    def _rebuild_price_drawdown(self) -> None:
+        values = self.buffer.view("close", self.start, self.last + 1)
+        self.price_drawdown = _drawdown_from_values(values, self.start)
+
+    def _rebuild_total_drawdown(self) -> None:
+        # Índice total só nas linhas com retorno total válido.
+        rows, _ = self._return_rows("total_returns")
+        index = self.buffer.total_index[rows - self.buffer.offset]
+
+        state = _drawdown_from_values(index, 0)
+
+        if len(rows):
+            state.peak_row = int(rows[state.peak_row])
+            state.running_max_row = int(rows[state.running_max_row])
+
+        self.total_drawdown = state
+
+    # ---------------------------------------------------------
+    # Atualização incremental
+    # ---------------------------------------------------------
+
+    def advance(self) -> None:
+        """
+        Incorpora a nova última linha do buffer e tira do início as linhas
+        que saíram da janela.
+        """
+
+        buffer = self.buffer
+        row = buffer.end - 1
+
+        if self.start > self.last:
+            # Janela vazia: não há o que atualizar.
+            self.rebuild()
+            return
+
+        self.last = row
+
+        self.volume_sum += buffer.at("financial_volume", row)
+        self.dividend_sum += buffer.at("dividend", row)
+
+        self.price_drawdown.add(row, buffer.at("close", row))
+
+        price_return = buffer.at("price_returns", row)
+        total_return = buffer.at("total_returns", row)
+
+        if not np.isnan(price_return):
+            self.price.add(row, float(price_return))
+
+        if not np.isnan(total_return):
+            self.total.add(row, float(total_return))
+            self.total_drawdown.add(row, buffer.at("total_index", row))
+
+        new_start = self._start_for(row)
+
+        if new_start > self.start:
+            self._drop_until(new_start)
+
+    def _drop_until(self, new_start: int) -> None:
+        buffer = self.buffer
+        old_start = self.start
+
+        self.volume_sum -= float(buffer.view("financial_volume", old_start, new_start).sum())
+        self.dividend_sum -= float(buffer.view("dividend", old_start, new_start).sum())
+
+        # Retornos das linhas old_start+1 .. new_start saem (a linha de
+        # início não conta retorno).
+        for name, stats in (("price_returns", self.price), ("total_returns", self.total)):
+            for value in buffer.view(name, old_start + 1, new_start + 1):
+                if not np.isnan(value):
+                    stats.remove(float(value))
+
+        self.start = new_start
+
+        for name, stats in (("price_returns", self.price), ("total_returns", self.total)):
+            if stats.best_row <= new_start or stats.worst_row <= new_start:
+                self._rebuild_extremes(stats, name)
+
+        if self.price_drawdown.peak_row < new_start:
+            self._rebuild_price_drawdown()
+
+        if self.total_drawdown.peak_row <= new_start:
+            self._rebuild_total_drawdown()
+
+    # ---------------------------------------------------------
+    # Métricas
+    # ---------------------------------------------------------
+
+    def metrics(self, risk_free_rate: float | None) -> dict[str, float]:
+        """
+        Métricas do período, com as mesmas chaves de PANEL_METRICS.
+        """
+
+        output = {key: np.nan for key in PANEL_METRICS}
+        output["valid"] = False
+
+        buffer = self.buffer
+
+        if self.start > self.last:
+            return output
+
+        start_date = buffer.at("dates", self.start)
+        last_date = buffer.at("dates", self.last)
+        tolerance = self._target(last_date) + np.timedelta64(
+            PERIOD_START_TOLERANCE_DAYS,
+            "D",
+        )
+
+        n_rows = self.last - self.start + 1
+        elapsed_days = (last_date - start_date).astype("timedelta64[D]").astype("float64")
+        actual_years = elapsed_days / 365.25
+
+        initial_close = buffer.at("close", self.start)
+        final_close = buffer.at("close", self.last)
+
+        if not (
+            start_date <= tolerance
+            and n_rows >= 2
+            and actual_years > 0
+            and initial_close > 0
+        ):
+            return output
+
+        threshold = 0.0
+
+        if risk_free_rate is not None:
+            threshold = (1 + risk_free_rate) ** (1 / TRADING_DAYS_PER_YEAR) - 1
+
+        for name, stats in (("price_returns", self.price), ("total_returns", self.total)):
+            if stats.threshold != threshold:
+                _, values = self._return_rows(name)
+                self._set_threshold(stats, values, threshold)
+
+        with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+            price_ratio = final_close / initial_close
+            cagr_price = price_ratio ** (1 / actual_years) - 1
+
+            dividends = self.dividend_sum
+            simple_ratio = (final_close + dividends) / initial_close
+
+            if self.total.count > 0:
+                start_index = buffer.at("total_index", self.start)
+
+                if start_index > 0:
+                    total_factor = buffer.at("total_index", self.last) / start_index
+                else:
+                    _, values = self._return_rows("total_returns")
+                    total_factor = float(np.prod(1 + values))
+
+                return_total = total_factor - 1
+                cagr_total = total_factor ** (1 / actual_years) - 1
+                drawdown_total = self.total_drawdown.value
+            else:
+                return_total = cagr_total = drawdown_total = np.nan
+
+        output.update(
+            {
+                "valid": True,
+                "history_years": actual_years,
+
+                "return_price": price_ratio - 1,
+                "cagr_price": cagr_price,
+                "drawdown_price": self.price_drawdown.value,
+
+                "liquidity": self.volume_sum / n_rows,
+
+                "dividends": dividends,
+                "dividend_yield": dividends / initial_close,
+
+                "return_simple": simple_ratio - 1,
+                "cagr_simple": simple_ratio ** (1 / actual_years) - 1,
+
+                "return_total": return_total,
+                "cagr_total": cagr_total,
+                "drawdown_total": drawdown_total,
+
+                "risk_free": np.nan if risk_free_rate is None else risk_free_rate,
+            }
+        )
+
+        for suffix, stats, annual_return, drawdown in (
+            ("price", self.price, cagr_price, self.price_drawdown.value),
+            ("total", self.total, cagr_total, drawdown_total),
+        ):
+            for key, value in _risk_metrics(
+                stats,
+                annual_return,
+                risk_free_rate,
+                threshold,
+                drawdown,
+            ).items():
+                output[f"{key}_{suffix}"] = value
+
+        return output
+
+
+def _risk_metrics(
+        stats: _ReturnStats,
+        annual_return: float,
+        risk_free_rate: float | None,
+        threshold: float,
+        max_drawdown: float,
+) -> dict[str, float]:
+    """
+    Mesmas regras de panel._risk_metrics, a partir das somas.
+    """
+
+    keys = [
+        "vol",
+        "downside_vol",
+        "sharpe",
+        "sortino",
+        "calmar",
+        "return_vol",
+        "best_day",
+        "worst_day",
+        "positive_days",
+    ]
+
+    if stats.count == 0:
+        return {key: np.nan for key in keys}
+
+    volatility = _std_from_sums(stats.count, stats.total, stats.squares) * np.sqrt(
+        TRADING_DAYS_PER_YEAR
+    )
+
+    # Desvio dos retornos em excesso (r - limiar) abaixo do limiar.
+    n = stats.downside_count
+    excess_total = stats.downside_total - n * threshold
+    excess_squares = (
+        stats.downside_squares
+        - 2 * threshold * stats.downside_total
+        + n * threshold * threshold
+    )
+    downside_volatility = _std_from_sums(n, excess_total, excess_squares) * np.sqrt(
+        TRADING_DAYS_PER_YEAR
+    )
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if risk_free_rate is not None and volatility != 0:
+            sharpe = (annual_return - risk_free_rate) / volatility
+        else:
+            sharpe = np.nan
+
+        if risk_free_rate is not None and downside_volatility != 0:
+            sortino = (annual_return - risk_free_rate) / downside_volatility
+        else:
+            sortino = np.nan
+
+        calmar = annual_return / abs(max_drawdown) if max_drawdown < 0 else np.nan
+        return_volatility = annual_return / volatility if volatility != 0 else np.nan
+
+    return {
+        "vol": volatility,
+        "downside_vol": downside_volatility,
+        "sharpe": sharpe,
+        "sortino": sortino,
+        "calmar": calmar,
+        "return_vol": return_volatility,
+        "best_day": stats.best,
+        "worst_day": stats.worst,
+        "positive_days": stats.positive / stats.count,
+    }
+
+
+class TickerState:
+    """
+    Buffer e janelas de um ticker. update() aplica só as linhas novas de um
+    histórico; se as linhas já aplicadas mudaram, reconstrói tudo.
+    """
+
+    def __init__(self, history: pd.DataFrame, periods: list[PeriodConfig]):
+        self.periods = periods
+        self.rebuilds = 0
+        self.rebuild(history)
+
+    def rebuild(self, history: pd.DataFrame) -> None:
+        dates, close, dividend, financial_volume = _history_arrays(history)
+
+        self.buffer = _Buffer(dates, close, dividend, financial_volume)
+        self.windows = {
+            period.label: WindowState(self.buffer, period.years)
+            for period in self.periods
+        }
+        self.rebuilds += 1
+        self.applied_rows = 0
+
+    def _tail_matches(self, dates, close, dividend, financial_volume) -> int | None:
+        """
+        Posição (no histórico novo) da última linha já aplicada, se as
+        últimas REVISION_CHECK_ROWS linhas aplicadas continuam iguais.
+        """
+
+        buffer = self.buffer
+
+        if buffer.size == 0:
+            return None
+
+        last_date = buffer.at("dates", buffer.end - 1)
+        position = int(np.searchsorted(dates, last_date))
+
+        if position >= len(dates) or dates[position] != last_date:
+            return None
+
+        n_check = min(REVISION_CHECK_ROWS, buffer.size, position + 1)
+        new = slice(position + 1 - n_check, position + 1)
+        old_start = buffer.end - n_check
+
+        for name, values in (
+            ("dates", dates),
+            ("close", close),
+            ("dividend", dividend),
+            ("financial_volume", financial_volume),
+        ):
+            if not np.array_equal(
+                buffer.view(name, old_start, buffer.end),
+                values[new],
+                equal_nan=name != "dates",
+            ):
+                return None
+
+        return position
+
+    def update(self, history: pd.DataFrame) -> int:
+        """
+        Aplica as linhas novas de 'history'. Retorna quantas linhas foram
+        aplicadas incrementalmente (-1 se houve reconstrução).
+        """
+
+        # Só o fim do histórico interessa: as linhas já aplicadas que são
+        # conferidas e as novas.
+        tail = history.tail(UPDATE_TAIL_ROWS)
+        arrays = _history_arrays(tail)
+        position = self._tail_matches(*arrays)
+
+        if position is None and len(tail) < len(history):
+            arrays = _history_arrays(history)
+            position = self._tail_matches(*arrays)
+
+        dates, close, dividend, financial_volume = arrays
+
+        if position is None or self.applied_rows + len(dates) - position - 1 > REBUILD_AFTER_ROWS:
+            self.rebuild(history)
+            return -1
+
+        for i in range(position + 1, len(dates)):
+            self.buffer.append(dates[i], close[i], dividend[i], financial_volume[i])
+
+            for window in self.windows.values():
+                window.advance()
+
+        # Linhas que saíram do começo do histórico também saem das janelas.
+        first_dates = _history_arrays(history.head(UPDATE_TAIL_ROWS))[0]
+
+        if len(first_dates):
+            buffer = self.buffer
+            floor = buffer.offset + int(
+                np.searchsorted(buffer.view("dates", buffer.offset, buffer.end), first_dates[0])
+            )
+
+            if floor > buffer.floor:
+                buffer.floor = floor
+
+                for window in self.windows.values():
+                    window.raise_floor()
+
+        first_live = min(window.start for window in self.windows.values())
+        self.buffer.discard_before(first_live)
+
+        self.applied_rows += len(dates) - position - 1
+
+        return len(dates) - position - 1
+
+    def metrics(self, risk_free_by_period: dict[str, float] | None = None) -> dict:
+        output = {}
+
+        for period in self.periods:
+            risk_free_rate = None
+
+            if risk_free_by_period is not None:
+                risk_free_rate = risk_free_by_period.get(period.label)
+
+                if risk_free_rate is not None and pd.isna(risk_free_rate):
+                    risk_free_rate = None
+
+            for key, value in self.windows[period.label].metrics(risk_free_rate).items():
+                output[f"{key}_{period.label}"] = value
+
+        return output
+
+
+@dataclass
+class IncrementalStates:
+    """
+    Estados por ticker, mantidos enquanto o processo viver (Streamlit ou
+    um loop de ranking). Um processo novo reconstrói cada ticker uma vez.
+    """
+
+    states: dict = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def get(self, ticker: str, periods: list[PeriodConfig]) -> TickerState | None:
+        key = (ticker, tuple((period.label, period.years) for period in periods))
+
+        with self.lock:
+            return self.states.get(key)
+
+    def put(self, ticker: str, state: TickerState) -> None:
+        key = (ticker, tuple((period.label, period.years) for period in state.periods))
+
+        with self.lock:
+            self.states[key] = state
+
+    def clear(self) -> None:
+        with self.lock:
+            self.states.clear()
+
+
+INCREMENTAL_STATES = IncrementalStates()
+
+
+# =========================================================
+# Estado em disco
+# =========================================================
+
+# Campos escalares de cada janela, além das dataclasses de estatísticas.
+WINDOW_FIELDS = ["start", "last", "volume_sum", "dividend_sum"]
+WINDOW_STATS = ["price", "total", "price_drawdown", "total_drawdown"]
+
+
+def _periods_key(periods: list[PeriodConfig]) -> str:
+    return ";".join(f"{period.label}:{period.years}" for period in periods)
+
+
+def _state_path(ticker: str, state_dir: str | Path) -> Path:
+    return Path(state_dir) / f"{normalize_brazilian_ticker(ticker)}.npz"
+
+
+def _state_arrays(state: TickerState) -> dict[str, np.ndarray]:
+    """
+    Estado do ticker em arrays: só as linhas do buffer a partir do início
+    da janela mais antiga, com os índices absolutos preservados.
+    """
+
+    buffer = state.buffer
+    first_live = min(
+        [window.start for window in state.windows.values()] + [buffer.end]
+    )
+    first_live = max(first_live, buffer.offset)
+
+    arrays = {
+        "version": np.array(STATE_VERSION),
+        "periods": np.array(_periods_key(state.periods)),
+        "rebuilds": np.array(state.rebuilds),
+        "applied_rows": np.array(state.applied_rows),
+        "offset": np.array(first_live),
+        "floor": np.array(buffer.floor),
+    }
+
+    for name in BUFFER_COLUMNS:
+        arrays[f"buffer.{name}"] = buffer.view(name, first_live, buffer.end)
+
+    for label, window in state.windows.items():
+        for name in WINDOW_FIELDS:
+            arrays[f"{label}.{name}"] = np.array(getattr(window, name))
+
+        for name in WINDOW_STATS:
+            stats = getattr(window, name)
+
+            for item in fields(stats):
+                arrays[f"{label}.{name}.{item.name}"] = np.array(
+                    getattr(stats, item.name)
+                )
+
+    return arrays
+
+
+def _state_from_arrays(
+        arrays,
+        periods: list[PeriodConfig],
+) -> TickerState | None:
+    if (
+        int(arrays["version"]) != STATE_VERSION
+        or str(arrays["periods"]) != _periods_key(periods)
+    ):
+        return None
+
+    buffer = _Buffer.__new__(_Buffer)
+    buffer.offset = int(arrays["offset"])
+    buffer.floor = int(arrays["floor"])
+    buffer.size = len(arrays["buffer.dates"])
+
+    capacity = max(16, buffer.size * 2)
+
+    for name in BUFFER_COLUMNS:
+        values = arrays[f"buffer.{name}"]
+        column = np.empty(capacity, dtype=values.dtype)
+        column[:buffer.size] = values
+        setattr(buffer, name, column)
+
+    state = TickerState.__new__(TickerState)
+    state.periods = periods
+    state.rebuilds = int(arrays["rebuilds"])
+    state.applied_rows = int(arrays["applied_rows"])
+    state.buffer = buffer
+    state.windows = {}
+
+    for period in periods:
+        label = period.label
+
+        window = WindowState.__new__(WindowState)
+        window.buffer = buffer
+        window.years = period.years
+
+        for name in WINDOW_FIELDS:
+            value = arrays[f"{label}.{name}"]
+            setattr(window, name, value.item())
+
+        for name, stats_type in (
+            ("price", _ReturnStats),
+            ("total", _ReturnStats),
+            ("price_drawdown", _DrawdownState),
+            ("total_drawdown", _DrawdownState),
+        ):
+            setattr(
+                window,
+                name,
+                stats_type(
+                    **{
+                        item.name: arrays[f"{label}.{name}.{item.name}"].item()
+                        for item in fields(stats_type)
+                    }
+                ),
+            )
+
+        state.windows[label] = window
+
+    return state
+
+
+def load_ticker_state(
+        ticker: str,
+        periods: list[PeriodConfig],
+        state_dir: str | Path = DEFAULT_STATE_DIR,
+) -> TickerState | None:
+    """
+    Estado gravado do ticker, ou None se não existir, estiver ilegível ou
+    for de outra versão/outros períodos.
+    """
+
+    path = _state_path(ticker, state_dir)
+
+    if not path.exists():
+        return None
+
+    try:
+        with np.load(path, allow_pickle=False) as arrays:
+            return _state_from_arrays(arrays, periods)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_ticker_state(
+        ticker: str,
+        state: TickerState,
+        state_dir: str | Path = DEFAULT_STATE_DIR,
+) -> None:
+    """
+    Grava o estado do ticker (arquivo temporário + os.replace: quem estiver
+    lendo nunca vê um arquivo pela metade).
+    """
+
+    path = _state_path(ticker, state_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = path.with_name(f".{path.stem}.{uuid4().hex}.tmp")
+
+    try:
+        with open(tmp_path, "wb") as handle:
+            np.savez(handle, **_state_arrays(state))
+
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def incremental_universe_metrics(
+        histories: dict[str, pd.DataFrame],
+        periods: list[PeriodConfig] | None = None,
+        risk_free_by_period: dict[str, float] | None = None,
+        states: IncrementalStates | None = INCREMENTAL_STATES,
+        state_dir: str | Path | None = None,
+) -> pd.DataFrame:
+    """
+    Mesmo resultado de universe_metrics (até o arredondamento), mantendo o
+    estado de cada ticker entre chamadas: um pregão novo custa O(1) por
+    ticker e período.
+
+    Com 'state_dir', o estado também é lido de/gravado em disco, e vale
+    entre processos. states=None não guarda nada na memória do processo
+    (o ranking, que percorre o universo uma vez só).
+    """
+
+    if periods is None:
+        periods = DEFAULT_PERIODS
+
+    columns = [
+        f"{key}_{period.label}"
+        for period in periods
+        for key in PANEL_METRICS
+    ]
+    values = {column: [] for column in columns}
+
+    for ticker, history in histories.items():
+        state = states.get(ticker, periods) if states is not None else None
+        changed = True
+
+        if state is None and state_dir is not None:
+            state = load_ticker_state(ticker, periods, state_dir)
+
+        if state is None:
+            state = TickerState(history, periods)
+        else:
+            changed = state.update(history) != 0
+
+        if states is not None:
+            states.put(ticker, state)
+
+        if state_dir is not None and changed:
+            save_ticker_state(ticker, state, state_dir)
+
+        for column, value in state.metrics(risk_free_by_period).items():
+            values[column].append(value)
+
+    # Colunas e tipos iguais aos de panel_metrics.
+    return pd.DataFrame(
+        {
+            column: np.array(
+                values[column],
+                dtype=bool if column.startswith("valid_") else "float64",
+            )
+            for column in columns
+        },
+        index=pd.Index(list(histories), name="ticker"),
+    )
@@ -0,0 +1,275 @@
+from dataclasses import dataclass
+from pathlib import Path
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+from src.analytics.incremental import incremental_universe_metrics
+from src.analytics.panel import (
+    _history_arrays,
+    panel_metrics_frame,
+)
+from src.analytics.stock_metrics import DEFAULT_PERIODS, PeriodConfig
+from src.data.parquet_io import read_parquet_cached, write_parquet_if_changed
+from src.data.single_flight import file_lock
+from src.data.stocks import normalize_brazilian_ticker
+
+
+# Cache persistente das métricas do painel (src.analytics.panel), uma linha
+# por ticker. A linha só é reaproveitada se a chave bater:
+#
+# - última data e hash do histórico usado no cálculo;
+# - Selic e períodos (params_key);
+# - versão do código das métricas.
+#
+# O ranking e as páginas de ativo/valuation leem e gravam o mesmo arquivo.
+#
+# Tickers fora do cache (em geral, com um pregão a mais) são calculados pelo
+# estado incremental (src.analytics.incremental) gravado em
+# <cache_dir>/incremental: só as linhas novas entram nas somas.
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+DEFAULT_METRICS_CACHE_DIR = PROJECT_ROOT / "storage" / "metrics"
+
+# Aumentar sempre que mudar alguma regra de cálculo das métricas.
+METRICS_CODE_VERSION = 1
+
+KEY_COLUMNS = ["ticker", "last_date", "history_hash", "params_key", "code_version"]
+
+
+@dataclass(frozen=True)
+class MetricsCacheKey:
+    last_date: str | None
+    history_hash: str
+    params_key: str
+    code_version: int = METRICS_CODE_VERSION
+
+
+def _cache_path(cache_dir: str | Path) -> Path:
+    return Path(cache_dir) / "panel_metrics.parquet"
+
+
+def incremental_state_dir(cache_dir: str | Path) -> Path:
+    return Path(cache_dir) / "incremental"
+
+
+def metrics_params_key(
+        periods: list[PeriodConfig],
+        risk_free_by_period: dict[str, float] | None,
+) -> str:
+    risk_free = {}
+
+    for period in periods:
+        value = None
+
+        if risk_free_by_period is not None:
+            value = risk_free_by_period.get(period.label)
+
+        # repr preserva todos os dígitos do float.
+        risk_free[period.label] = None if value is None or pd.isna(value) else repr(float(value))
+
+    payload = json.dumps(
+        {
+            "periods": [[period.label, period.years] for period in periods],
+            "risk_free": risk_free,
+        },
+        sort_keys=True,
+    )
+
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def metrics_cache_key(
+        history: pd.DataFrame,
+        params_key: str,
+) -> MetricsCacheKey:
+    """
+    Chave do histórico: hash só do que entra no cálculo (datas, fechamento,
+    dividendos e volume financeiro, já limpos como no painel).
+    """
+
+    dates, close, dividend, financial_volume = _history_arrays(history)
+
+    digest = hashlib.sha1()
+
+    for values in (dates.view("int64"), close, dividend, financial_volume):
+        digest.update(np.ascontiguousarray(values).tobytes())
+
+    last_date = None
+
+    if len(dates):
+        last_date = str(dates[-1].astype("datetime64[D]"))
+
+    return MetricsCacheKey(
+        last_date=last_date,
+        history_hash=digest.hexdigest(),
+        params_key=params_key,
+    )
+
+
+def _read_cache(cache_dir: str | Path) -> pd.DataFrame | None:
+    path = _cache_path(cache_dir)
+
+    if not path.exists():
+        return None
+
+    return read_parquet_cached(path)
+
+
+def load_cached_metrics(
+        keys: dict[str, MetricsCacheKey],
+        cache_dir: str | Path = DEFAULT_METRICS_CACHE_DIR,
+) -> pd.DataFrame:
+    """
+    Métricas em cache cuja chave bate, indexadas pelo ticker pedido
+    (mesmas colunas de panel_metrics). Tickers sem entrada válida ficam de
+    fora.
+    """
+
+    cached = _read_cache(cache_dir)
+
+    if cached is None or cached.empty or not keys:
+        return pd.DataFrame(index=pd.Index([], name="ticker"))
+
+    wanted = pd.DataFrame(
+        [
+            {
+                "ticker": normalize_brazilian_ticker(ticker),
+                "last_date": key.last_date,
+                "history_hash": key.history_hash,
+                "params_key": key.params_key,
+                "code_version": key.code_version,
+                "_requested": ticker,
+            }
+            for ticker, key in keys.items()
+        ]
+    )
+
+    hits = wanted.merge(cached, on=KEY_COLUMNS, how="inner")
+
+    return (
+        hits
+        .drop(columns=KEY_COLUMNS)
+        .rename(columns={"_requested": "ticker"})
+        .set_index("ticker")
+    )
+
+
+def save_cached_metrics(
+        keys: dict[str, MetricsCacheKey],
+        metrics: pd.DataFrame,
+        cache_dir: str | Path = DEFAULT_METRICS_CACHE_DIR,
+) -> None:
+    """
+    Grava (ou substitui) a entrada de cada ticker de 'metrics' (saída de
+    panel_metrics) com a chave correspondente.
+    """
+
+    metrics = metrics[metrics.index.isin(list(keys))]
+
+    if metrics.empty:
+        return
+
+    new = metrics.reset_index()
+    new["ticker"] = [normalize_brazilian_ticker(ticker) for ticker in metrics.index]
+    new["last_date"] = [keys[ticker].last_date for ticker in metrics.index]
+    new["history_hash"] = [keys[ticker].history_hash for ticker in metrics.index]
+    new["params_key"] = [keys[ticker].params_key for ticker in metrics.index]
+    new["code_version"] = [keys[ticker].code_version for ticker in metrics.index]
+
+    new = new.drop_duplicates(subset=["ticker"], keep="last")
+    new = new[KEY_COLUMNS + [col for col in new.columns if col not in KEY_COLUMNS]]
+
+    path = _cache_path(cache_dir)
+
+    with file_lock(Path(cache_dir) / "locks" / "panel_metrics.lock"):
+        stored = _read_cache(cache_dir)
+
+        if stored is None:
+            merged = new
+        else:
+            merged = pd.concat(
+                [stored[~stored["ticker"].isin(new["ticker"])], new],
+                ignore_index=True,
+            )
+
+        merged = merged.sort_values("ticker").reset_index(drop=True)
+
+        write_parquet_if_changed(merged, path, previous=stored)
+
+
+def cached_universe_metrics(
+        histories: dict[str, pd.DataFrame],
+        periods: list[PeriodConfig] | None = None,
+        risk_free_by_period: dict[str, float] | None = None,
+        cache_dir: str | Path = DEFAULT_METRICS_CACHE_DIR,
+) -> pd.DataFrame:
+    """
+    Mesmo resultado de universe_metrics, recalculando só os tickers cujo
+    histórico, Selic ou versão do código mudaram desde o último cálculo,
+    a partir do estado incremental de cada um.
+    """
+
+    if periods is None:
+        periods = DEFAULT_PERIODS
+
+    params_key = metrics_params_key(periods, risk_free_by_period)
+
+    keys = {
+        ticker: metrics_cache_key(history, params_key)
+        for ticker, history in histories.items()
+    }
+
+    hits = load_cached_metrics(keys, cache_dir)
+    missing = [ticker for ticker in histories if ticker not in hits.index]
+
+    computed = incremental_universe_metrics(
+        {ticker: histories[ticker] for ticker in missing},
+        periods=periods,
+        risk_free_by_period=risk_free_by_period,
+        states=None,
+        state_dir=incremental_state_dir(cache_dir),
+    )
+
+    if missing:
+        save_cached_metrics(
+            {ticker: keys[ticker] for ticker in missing},
+            computed,
+            cache_dir,
+        )
+
+    if hits.empty:
+        return computed
+
+    metrics = pd.concat([hits[computed.columns], computed])
+    metrics = metrics.astype(computed.dtypes.to_dict())
+
+    return metrics.reindex(pd.Index(list(histories), name="ticker"))
+
+
+def cached_stock_metrics(
+        ticker: str,
+        history: pd.DataFrame,
+        periods: list[PeriodConfig] | None = None,
+        risk_free_by_period: dict[str, float] | None = None,
+        cache_dir: str | Path = DEFAULT_METRICS_CACHE_DIR,
+) -> pd.DataFrame:
+    """
+    Métricas de um ativo no formato de stock_metrics_by_period, passando
+    pelo mesmo cache do ranking.
+    """
+
+    if periods is None:
+        periods = DEFAULT_PERIODS
+
+    metrics = cached_universe_metrics(
+        {ticker: history},
+        periods=periods,
+        risk_free_by_period=risk_free_by_period,
+        cache_dir=cache_dir,
+    )
+
+    return panel_metrics_frame(metrics.loc[ticker], periods)
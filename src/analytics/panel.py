@@ -0,0 +1,834 @@
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+import sys
+
+import numpy as np
+import pandas as pd
+
+from src.analytics.stock_metrics import (
+    DEFAULT_PERIODS,
+    TRADING_DAYS_PER_YEAR,
+    PeriodConfig,
+    _metrics_frame,
+)
+from src.data.market_store import (
+    DEFAULT_MARKET_STORE_DIR,
+    load_manifest,
+    read_histories,
+)
+from src.data.stocks import normalize_brazilian_ticker
+
+
+# Motor de painel: em vez de calcular as métricas ativo por ativo, monta
+# matrizes datas x tickers (fechamento, dividendos, volume financeiro) e
+# calcula todas as métricas de stock_metrics para todos os tickers e
+# períodos com operações NumPy por coluna.
+#
+# As regras são as mesmas de calculate_metrics_for_period (período de cada
+# ticker termina na sua última data, tolerância de 10 dias no início, retorno
+# entre pregões consecutivos do próprio ticker). Os valores batem com o
+# cálculo por ativo até o arredondamento de ponto flutuante, já que as somas
+# são feitas em outra ordem.
+
+PERIOD_START_TOLERANCE_DAYS = 10
+
+# Pico de memória de panel_metrics por célula (data x ticker): as matrizes
+# do painel, os índices de linha, os retornos e os temporários de cada
+# período. Medido com tracemalloc (~120 bytes), com folga.
+PANEL_BYTES_PER_CELL = 160
+
+# Orçamento padrão do modo em blocos (chunked_universe_metrics e ranking).
+DEFAULT_MEMORY_BUDGET_BYTES = 256 * 1024 ** 2
+
+PANEL_COLUMNS = ["date", "close", "dividend", "financial_volume"]
+
+# Coluna do painel -> linha de stock_metrics_by_period.
+PANEL_METRICS = {
+    "valid": "Histórico Válido",
+    "history_years": "Anos de Histórico no Período",
+
+    "return_price": "Retorno Acumulado Preço",
+    "cagr_price": "CAGR Preço",
+    "vol_price": "Volatilidade Preço Anualizada",
+    "downside_vol_price": "Volatilidade Negativa Preço Anualizada",
+    "drawdown_price": "Drawdown Máximo Preço",
+
+    "liquidity": "Liquidez Média Diária",
+
+    "dividends": "Dividendos Acumulados por Ação",
+    "dividend_yield": "Dividend Yield Histórico Aproximado",
+
+    "return_simple": "Retorno Acumulado com Dividendos Simples",
+    "cagr_simple": "CAGR com Dividendos Simples",
+
+    "return_total": "Retorno Total Reinvestido",
+    "cagr_total": "CAGR Total Reinvestido",
+    "vol_total": "Volatilidade Total Anualizada",
+    "downside_vol_total": "Volatilidade Negativa Total Anualizada",
+    "drawdown_total": "Drawdown Máximo Total",
+
+    "risk_free": "SELIC Anualizada",
+
+    "sharpe_price": "Sharpe Preço",
+    "sortino_price": "Sortino Preço",
+    "calmar_price": "Calmar Preço",
+    "return_vol_price": "Retorno/Volatilidade Preço",
+
+    "sharpe_total": "Sharpe Total",
+    "sortino_total": "Sortino Total",
+    "calmar_total": "Calmar Total",
+    "return_vol_total": "Retorno/Volatilidade Total",
+
+    "best_day_price": "Melhor Dia Preço",
+    "worst_day_price": "Pior Dia Preço",
+    "positive_days_price": "% Dias Positivos Preço",
+
+    "best_day_total": "Melhor Dia Total",
+    "worst_day_total": "Pior Dia Total",
+    "positive_days_total": "% Dias Positivos Total",
+}
+
+
+@dataclass(frozen=True)
+class PricePanel:
+    tickers: list[str]
+    # Todas as datas presentes em algum ticker, em ordem (datetime64[ns]).
+    dates: np.ndarray
+    # Matrizes len(dates) x len(tickers); NaN onde o ticker não tem pregão.
+    close: np.ndarray
+    dividend: np.ndarray
+    financial_volume: np.ndarray
+    # True onde o ticker tem pregão (fechamento válido) na data.
+    mask: np.ndarray
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.close.shape
+
+
+def _history_arrays(df: pd.DataFrame) -> tuple[np.ndarray, ...]:
+    """
+    Mesmas regras de stock_metrics._prepare_history, direto em NumPy:
+    ordena por data, dividendos/volume vazios viram 0 e linhas sem
+    fechamento (ou sem data) saem. Datas repetidas ficam com a última linha.
+    """
+
+    dates = df["date"]
+
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates)
+
+    dates = dates.to_numpy(dtype="datetime64[ns]")
+    n_rows = len(dates)
+
+    def column(name: str) -> np.ndarray:
+        if name not in df.columns:
+            return np.zeros(n_rows)
+
+        values = df[name]
+
+        # Coluna já numérica (o caso do store): to_numeric é só custo.
+        if not pd.api.types.is_numeric_dtype(values):
+            values = pd.to_numeric(values, errors="coerce")
+
+        return values.to_numpy(dtype="float64", na_value=np.nan)
+
+    close = column("close")
+    dividend = np.nan_to_num(column("dividend"), nan=0.0)
+    financial_volume = np.nan_to_num(column("financial_volume"), nan=0.0)
+
+    keep = ~np.isnan(close) & ~np.isnat(dates)
+
+    dates = dates[keep]
+    close = close[keep]
+    dividend = dividend[keep]
+    financial_volume = financial_volume[keep]
+
+    if len(dates) > 1 and not (dates[1:] >= dates[:-1]).all():
+        order = np.argsort(dates, kind="stable")
+        dates = dates[order]
+        close = close[order]
+        dividend = dividend[order]
+        financial_volume = financial_volume[order]
+
+    if len(dates) > 1:
+        last_of_date = np.append(dates[1:] != dates[:-1], True)
+
+        if not last_of_date.all():
+            dates = dates[last_of_date]
+            close = close[last_of_date]
+            dividend = dividend[last_of_date]
+            financial_volume = financial_volume[last_of_date]
+
+    return dates, close, dividend, financial_volume
+
+
+def build_price_panel(histories: dict[str, pd.DataFrame]) -> PricePanel:
+    """
+    Alinha os históricos (formato de daily_stock_history) em matrizes
+    datas x tickers.
+    """
+
+    tickers = list(histories)
+    prepared = [_history_arrays(histories[ticker]) for ticker in tickers]
+
+    if prepared:
+        dates = np.unique(np.concatenate([arrays[0] for arrays in prepared]))
+    else:
+        dates = np.array([], dtype="datetime64[ns]")
+
+    shape = (len(dates), len(tickers))
+
+    close = np.full(shape, np.nan)
+    dividend = np.full(shape, np.nan)
+    financial_volume = np.full(shape, np.nan)
+
+    for j, (ticker_dates, *values) in enumerate(prepared):
+        rows = np.searchsorted(dates, ticker_dates)
+
+        close[rows, j] = values[0]
+        dividend[rows, j] = values[1]
+        financial_volume[rows, j] = values[2]
+
+    return PricePanel(
+        tickers=tickers,
+        dates=dates,
+        close=close,
+        dividend=dividend,
+        financial_volume=financial_volume,
+        mask=~np.isnan(close),
+    )
+
+
+def _previous_valid_rows(mask: np.ndarray) -> np.ndarray:
+    """
+    Para cada (data, ticker), a linha do pregão anterior do mesmo ticker
+    (-1 se não houver).
+    """
+
+    rows = np.arange(mask.shape[0])[:, None]
+    last_valid = np.maximum.accumulate(np.where(mask, rows, -1), axis=0)
+
+    previous = np.full(mask.shape, -1)
+    previous[1:] = last_valid[:-1]
+
+    return previous
+
+
+def _next_valid_rows(mask: np.ndarray) -> np.ndarray:
+    """
+    Para cada (data, ticker), a primeira linha >= data em que o ticker tem
+    pregão (len(dates) se não houver). Tem uma linha extra no fim.
+    """
+
+    n_rows = mask.shape[0]
+    rows = np.arange(n_rows)[:, None]
+
+    candidates = np.where(mask, rows, n_rows)
+    candidates = np.vstack([candidates, np.full((1, mask.shape[1]), n_rows)])
+
+    return np.minimum.accumulate(candidates[::-1], axis=0)[::-1]
+
+
+def _take(matrix: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    matrix[rows[j], j] para cada coluna; NaN onde a linha não existe.
+    """
+
+    columns = np.arange(matrix.shape[1])
+    inside = (rows >= 0) & (rows < matrix.shape[0])
+
+    values = np.full(matrix.shape[1], np.nan)
+    values[inside] = matrix[rows[inside], columns[inside]]
+
+    return values
+
+
+def _nan_std(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    count = mask.sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(mask, values, 0.0).sum(axis=0) / count
+        squares = np.where(mask, (values - mean) ** 2, 0.0).sum(axis=0)
+
+        return np.where(count >= 2, np.sqrt(squares / (count - 1)), np.nan)
+
+
+def _masked_max_drawdown(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    # Como _max_drawdown_from_series, valores NaN ficam de fora.
+    mask = mask & ~np.isnan(values)
+    masked = np.where(mask, values, np.nan)
+    running_max = np.fmax.accumulate(masked, axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        drawdown = masked / running_max - 1
+
+    drawdown = np.where(mask, drawdown, np.inf)
+    result = drawdown.min(axis=0)
+
+    return np.where(np.isinf(result) & (result > 0), np.nan, result)
+
+
+def _risk_metrics(
+        returns: np.ndarray,
+        window: np.ndarray,
+        annual_return: np.ndarray,
+        risk_free_rate: float | None,
+        max_drawdown: np.ndarray,
+) -> dict[str, np.ndarray]:
+    """
+    Versão em painel de stock_metrics._risk_metrics_from_returns: uma
+    coluna por ticker, NaN no lugar de None.
+    """
+
+    window = window & ~np.isnan(returns)
+    count = window.sum(axis=0)
+    has_returns = count > 0
+
+    volatility = _nan_std(returns, window) * np.sqrt(TRADING_DAYS_PER_YEAR)
+
+    best_day = np.where(window, returns, -np.inf).max(axis=0)
+    worst_day = np.where(window, returns, np.inf).min(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        positive_days_ratio = (window & (returns > 0)).sum(axis=0) / count
+
+    if risk_free_rate is not None:
+        daily_risk_free = (1 + risk_free_rate) ** (1 / TRADING_DAYS_PER_YEAR) - 1
+        excess = returns - daily_risk_free
+    else:
+        excess = returns
+
+    downside = window & (excess < 0)
+    downside_volatility = np.where(
+        downside.sum(axis=0) >= 2,
+        _nan_std(excess, downside) * np.sqrt(TRADING_DAYS_PER_YEAR),
+        np.nan,
+    )
+
+    nan = np.full(returns.shape[1], np.nan)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if risk_free_rate is not None:
+            sharpe = np.where(
+                volatility != 0,
+                (annual_return - risk_free_rate) / volatility,
+                np.nan,
+            )
+            sortino = np.where(
+                downside_volatility != 0,
+                (annual_return - risk_free_rate) / downside_volatility,
+                np.nan,
+            )
+        else:
+            sharpe = nan
+            sortino = nan
+
+        calmar = np.where(
+            max_drawdown < 0,
+            annual_return / np.abs(max_drawdown),
+            np.nan,
+        )
+
+        return_volatility = np.where(
+            volatility != 0,
+            annual_return / volatility,
+            np.nan,
+        )
+
+    metrics = {
+        "vol": volatility,
+        "downside_vol": downside_volatility,
+        "sharpe": sharpe,
+        "sortino": sortino,
+        "calmar": calmar,
+        "return_vol": return_volatility,
+        "best_day": best_day,
+        "worst_day": worst_day,
+        "positive_days": positive_days_ratio,
+    }
+
+    return {
+        key: np.where(has_returns, value, np.nan)
+        for key, value in metrics.items()
+    }
+
+
+def _period_metrics(
+        panel: PricePanel,
+        years: int,
+        risk_free_rate: float | None,
+        next_rows: np.ndarray,
+        last_rows: np.ndarray,
+        price_returns: np.ndarray,
+        total_returns: np.ndarray,
+) -> dict[str, np.ndarray]:
+    n_dates, n_tickers = panel.shape
+    columns = np.arange(n_tickers)
+    has_history = last_rows >= 0
+
+    # Início do período de cada ticker: primeiro pregão >= última data menos
+    # 'years' anos (mesma aritmética de relativedelta).
+    last_dates = pd.DatetimeIndex(
+        np.where(
+            has_history,
+            panel.dates[np.maximum(last_rows, 0)],
+            np.datetime64("NaT"),
+        )
+    )
+    target = last_dates - pd.DateOffset(years=years)
+
+    target_rows = np.searchsorted(panel.dates, target.to_numpy(dtype="datetime64[ns]"))
+    start_rows = next_rows[target_rows, columns]
+
+    start_ok = has_history & (start_rows < n_dates)
+    start_dates = np.where(
+        start_ok,
+        panel.dates[np.minimum(start_rows, n_dates - 1)],
+        np.datetime64("NaT"),
+    )
+
+    tolerance = (
+        target + pd.Timedelta(days=PERIOD_START_TOLERANCE_DAYS)
+    ).to_numpy(dtype="datetime64[ns]")
+    start_ok &= start_dates <= tolerance
+
+    rows = np.arange(n_dates)[:, None]
+    window = panel.mask & (rows >= start_rows) & (rows <= last_rows) & start_ok
+    return_window = window & (rows > start_rows)
+
+    n_rows = window.sum(axis=0)
+
+    elapsed_days = (
+        (panel.dates[np.maximum(last_rows, 0)] - start_dates)
+        .astype("timedelta64[D]")
+        .astype("float64")
+    )
+    actual_years = elapsed_days / 365.25
+
+    initial_close = _take(panel.close, np.where(start_ok, start_rows, -1))
+    final_close = _take(panel.close, last_rows)
+
+    valid = (
+        start_ok
+        & (n_rows >= 2)
+        & (actual_years > 0)
+        & (initial_close > 0)
+    )
+
+    window &= valid
+    return_window &= valid
+
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        # Preço
+        price_ratio = final_close / initial_close
+        return_price = price_ratio - 1
+        cagr_price = price_ratio ** (1 / actual_years) - 1
+
+        drawdown_price = _masked_max_drawdown(panel.close, window)
+
+        price_risk = _risk_metrics(
+            price_returns,
+            return_window,
+            cagr_price,
+            risk_free_rate,
+            drawdown_price,
+        )
+
+        # Liquidez e dividendos simples
+        liquidity = (
+            np.where(window, panel.financial_volume, 0.0).sum(axis=0)
+            / n_rows
+        )
+        dividends = np.where(window, panel.dividend, 0.0).sum(axis=0)
+
+        dividend_yield = dividends / initial_close
+        simple_ratio = (final_close + dividends) / initial_close
+        return_simple = simple_ratio - 1
+        cagr_simple = simple_ratio ** (1 / actual_years) - 1
+
+        # Retorno total reinvestido
+        total_window = return_window & ~np.isnan(total_returns)
+        has_total = total_window.any(axis=0)
+
+        growth = np.where(total_window, 1 + total_returns, 1.0)
+        total_index = np.cumprod(growth, axis=0)
+        total_factor = total_index[-1]
+
+        return_total = np.where(has_total, total_factor - 1, np.nan)
+        cagr_total = np.where(
+            has_total,
+            total_factor ** (1 / actual_years) - 1,
+            np.nan,
+        )
+
+        drawdown_total = _masked_max_drawdown(total_index, total_window)
+
+        total_risk = _risk_metrics(
+            total_returns,
+            total_window,
+            cagr_total,
+            risk_free_rate,
+            drawdown_total,
+        )
+
+    metrics = {
+        "history_years": actual_years,
+
+        "return_price": return_price,
+        "cagr_price": cagr_price,
+        "drawdown_price": drawdown_price,
+
+        "liquidity": liquidity,
+
+        "dividends": dividends,
+        "dividend_yield": dividend_yield,
+
+        "return_simple": return_simple,
+        "cagr_simple": cagr_simple,
+
+        "return_total": return_total,
+        "cagr_total": cagr_total,
+        "drawdown_total": drawdown_total,
+
+        "risk_free": np.full(
+            n_tickers,
+            np.nan if risk_free_rate is None else risk_free_rate,
+        ),
+    }
+
+    for key, value in price_risk.items():
+        metrics[f"{key}_price"] = value
+
+    for key, value in total_risk.items():
+        metrics[f"{key}_total"] = value
+
+    output = {"valid": valid}
+
+    for key in list(PANEL_METRICS)[1:]:
+        output[key] = np.where(valid, metrics[key], np.nan).astype("float64")
+
+    return output
+
+
+def panel_metrics(
+        panel: PricePanel,
+        periods: list[PeriodConfig] | None = None,
+        risk_free_by_period: dict[str, float] | None = None,
+) -> pd.DataFrame:
+    """
+    Todas as métricas de stock_metrics para todos os tickers e períodos.
+
+    Retorna um DataFrame tickers x colunas '<métrica>_<período>'
+    (ex: 'cagr_total_5A', 'sharpe_price_12m'); 'valid_<período>' é bool e o
+    restante float64, com NaN onde a métrica não existe.
+    """
+
+    if periods is None:
+        periods = DEFAULT_PERIODS
+
+    n_dates, n_tickers = panel.shape
+
+    if n_dates == 0:
+        # Nenhum ticker com pregão: todos os períodos inválidos.
+        panel = PricePanel(
+            tickers=panel.tickers,
+            dates=np.array(["1970-01-01"], dtype="datetime64[ns]"),
+            close=np.full((1, n_tickers), np.nan),
+            dividend=np.full((1, n_tickers), np.nan),
+            financial_volume=np.full((1, n_tickers), np.nan),
+            mask=np.zeros((1, n_tickers), dtype=bool),
+        )
+        n_dates = 1
+
+    mask = panel.mask
+    previous_rows = _previous_valid_rows(mask)
+    next_rows = _next_valid_rows(mask)
+
+    last_rows = np.where(
+        mask.any(axis=0),
+        n_dates - 1 - np.argmax(mask[::-1], axis=0),
+        -1,
+    )
+
+    # Retorno de cada pregão em relação ao pregão anterior do mesmo ticker.
+    has_previous = mask & (previous_rows >= 0)
+    previous_close = np.where(
+        has_previous,
+        np.take_along_axis(panel.close, np.maximum(previous_rows, 0), axis=0),
+        np.nan,
+    )
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        price_returns = panel.close / previous_close - 1
+        total_returns = (panel.close + panel.dividend) / previous_close - 1
+
+    columns = {}
+
+    for period in periods:
+        risk_free_rate = None
+
+        if risk_free_by_period is not None:
+            risk_free_rate = risk_free_by_period.get(period.label)
+
+            if risk_free_rate is not None and pd.isna(risk_free_rate):
+                risk_free_rate = None
+
+        metrics = _period_metrics(
+            panel,
+            period.years,
+            risk_free_rate,
+            next_rows,
+            last_rows,
+            price_returns,
+            total_returns,
+        )
+
+        for key, values in metrics.items():
+            columns[f"{key}_{period.label}"] = values
+
+    return pd.DataFrame(
+        columns,
+        index=pd.Index(panel.tickers, name="ticker"),
+    )
+
+
+def panel_metrics_frame(
+        metrics: pd.Series,
+        periods: list[PeriodConfig] | None = None,
+) -> pd.DataFrame:
+    """
+    Uma linha de panel_metrics no formato de stock_metrics_by_period
+    (linhas = métricas, colunas = períodos, None onde não há valor).
+    """
+
+    if periods is None:
+        periods = DEFAULT_PERIODS
+
+    metrics_by_period = {}
+
+    for period in periods:
+        values = {}
+
+        for key, row in PANEL_METRICS.items():
+            value = metrics[f"{key}_{period.label}"]
+
+            if key == "valid":
+                values["valid"] = bool(value)
+            elif pd.isna(value):
+                values[row] = None
+            else:
+                values[row] = float(value)
+
+        values["history_years"] = values.pop(PANEL_METRICS["history_years"])
+
+        metrics_by_period[period.label] = values
+
+    return _metrics_frame(metrics_by_period)
+
+
+def universe_metrics(
+        histories: dict[str, pd.DataFrame],
+        periods: list[PeriodConfig] | None = None,
+        risk_free_by_period: dict[str, float] | None = None,
+) -> pd.DataFrame:
+    """
+    Atalho: monta o painel e calcula as métricas de todos os tickers.
+    """
+
+    return panel_metrics(
+        build_price_panel(histories),
+        periods=periods,
+        risk_free_by_period=risk_free_by_period,
+    )
+
+
+# ==========================================================
+# Execução em blocos
+# ==========================================================
+
+@dataclass
+class PanelRunStats:
+    tickers: int
+    blocks: int
+    block_size: int
+    n_dates: int
+    # Pico de memória residente do processo (None se o SO não informar).
+    peak_rss_bytes: int | None
+
+
+def peak_rss_bytes() -> int | None:
+    """
+    Pico de memória residente do processo até agora (ru_maxrss).
+    """
+
+    try:
+        import resource
+    except ImportError:
+        # Windows não tem o módulo resource.
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux informa em KiB; macOS, em bytes.
+    if sys.platform == "darwin":
+        return int(peak)
+
+    return int(peak) * 1024
+
+
+def estimate_panel_dates(start: date, end: date) -> int:
+    """
+    Estimativa (por cima) do número de linhas do painel entre duas datas:
+    dias úteis, sem descontar feriados.
+    """
+
+    if end < start:
+        return 0
+
+    return int(np.busday_count(start, end + timedelta(days=1)))
+
+
+def panel_block_size(
+        n_dates: int,
+        memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_BYTES,
+) -> int:
+    """
+    Quantos tickers cabem em um painel de 'n_dates' linhas dentro do
+    orçamento de memória (no mínimo 1).
+    """
+
+    if memory_budget_bytes <= 0:
+        raise ValueError("memory_budget_bytes deve ser positivo")
+
+    bytes_per_ticker = max(n_dates, 1) * PANEL_BYTES_PER_CELL
+
+    return max(1, int(memory_budget_bytes // bytes_per_ticker))
+
+
+def _panel_start(
+        last_dates: list[date],
+        periods: list[PeriodConfig],
+) -> date | None:
+    """
+    Primeira data necessária para calcular todos os períodos: o início do
+    período mais longo do ticker que termina mais cedo. Linhas anteriores
+    não entram em nenhuma janela.
+    """
+
+    if not last_dates or not periods:
+        return None
+
+    longest = max(period.years for period in periods)
+
+    return (pd.Timestamp(min(last_dates)) - pd.DateOffset(years=longest)).date()
+
+
+def chunked_universe_metrics(
+        tickers: list[str] | None = None,
+        periods: list[PeriodConfig] | None = None,
+        risk_free_by_period: dict[str, float] | None = None,
+        memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_BYTES,
+        store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
+) -> tuple[pd.DataFrame, PanelRunStats]:
+    """
+    Mesmo resultado de universe_metrics, lendo os históricos direto do
+    store Parquet em blocos de tickers.
+
+    O tamanho do bloco sai do orçamento de memória (panel_block_size) e do
+    número de datas estimado pelo manifest; só um bloco fica em memória por
+    vez. Sem 'tickers', usa todos os tickers do store.
+
+    Retorna as métricas (na ordem dos tickers pedidos) e as estatísticas da
+    execução, incluindo o pico de RSS.
+    """
+
+    if periods is None:
+        periods = DEFAULT_PERIODS
+
+    entries = load_manifest(store_dir)["tickers"]
+
+    if tickers is None:
+        tickers = sorted(entries)
+
+    keys = {ticker: normalize_brazilian_ticker(ticker) for ticker in tickers}
+
+    def last_date(ticker: str) -> date | None:
+        entry = entries.get(keys[ticker])
+
+        if entry is None or entry["last_date"] is None:
+            return None
+
+        return date.fromisoformat(entry["last_date"])
+
+    known = [ticker for ticker in tickers if last_date(ticker) is not None]
+    start = _panel_start([last_date(ticker) for ticker in known], periods)
+
+    if known:
+        n_dates = estimate_panel_dates(start, max(last_date(t) for t in known))
+    else:
+        n_dates = 0
+
+    block_size = panel_block_size(n_dates, memory_budget_bytes)
+
+    # Tickers com a última data parecida ficam no mesmo bloco, para que o
+    # início de cada bloco corte o máximo de linhas antigas.
+    ordered = sorted(known, key=last_date) + [
+        ticker for ticker in tickers if last_date(ticker) is None
+    ]
+
+    blocks = []
+
+    for offset in range(0, len(ordered), block_size):
+        block = ordered[offset:offset + block_size]
+        block_keys = list(dict.fromkeys(keys[ticker] for ticker in block))
+
+        block_start = _panel_start(
+            [last_date(ticker) for ticker in block if last_date(ticker)],
+            periods,
+        )
+
+        df = read_histories(
+            tickers=block_keys,
+            start=block_start,
+            columns=PANEL_COLUMNS,
+            store_dir=store_dir,
+        )
+
+        by_ticker = dict(tuple(df.groupby("ticker", sort=False)))
+        empty = df.iloc[0:0]
+
+        histories = {
+            ticker: by_ticker.get(keys[ticker], empty)
+            for ticker in dict.fromkeys(block)
+        }
+
+        blocks.append(
+            universe_metrics(
+                histories,
+                periods=periods,
+                risk_free_by_period=risk_free_by_period,
+            )
+        )
+
+        del df, by_ticker, histories
+
+    if blocks:
+        metrics = pd.concat(blocks)
+    else:
+        metrics = universe_metrics({}, periods, risk_free_by_period)
+
+    metrics = metrics[~metrics.index.duplicated()].reindex(
+        pd.Index(tickers, name="ticker")
+    )
+
+    stats = PanelRunStats(
+        tickers=len(tickers),
+        blocks=len(blocks),
+        block_size=block_size,
+        n_dates=n_dates,
+        peak_rss_bytes=peak_rss_bytes(),
+    )
+
+    return metrics, stats
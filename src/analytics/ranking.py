@@ -1,36 +1,70 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from datetime import date
 from pathlib import Path
+from typing import Iterator
+import signal
 
+import numpy as np
 import pandas as pd
+from dateutil.relativedelta import relativedelta
 
-from src.data.stocks import daily_stock_history
+from src.data.hot_cache import load_hot_history
+from src.data.market_store import DEFAULT_MARKET_STORE_DIR, read_ticker_history
+from src.data.stocks import daily_stock_history_many, normalize_brazilian_ticker
 from src.data.selic import selic_periods_row
-from src.analytics.stock_metrics import stock_metrics_by_period
+from src.analytics.stock_metrics import DEFAULT_PERIODS
+from src.analytics.incremental import incremental_universe_metrics
+from src.analytics.metrics_cache import (
+    DEFAULT_METRICS_CACHE_DIR,
+    cached_universe_metrics,
+    incremental_state_dir,
+    load_cached_metrics,
+    metrics_cache_key,
+    metrics_params_key,
+    save_cached_metrics,
+)
+from src.analytics.ranking_runs import (
+    DEFAULT_RUNS_DIR,
+    RUN_CHECKPOINT_TICKERS,
+    default_run_id,
+    open_ranking_run,
+)
+from src.analytics.panel import (
+    DEFAULT_MEMORY_BUDGET_BYTES,
+    estimate_panel_dates,
+    panel_block_size,
+    peak_rss_bytes,
+    universe_metrics,
+)
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 
+RANKING_PERIODS = ["12m", "3A", "5A", "10A"]
 
-def _safe_metric(
-    metrics: pd.DataFrame,
-    row: str,
-    period: str,
-):
-    if metrics.empty:
-        return None
-
-    if row not in metrics.index:
-        return None
-
-    if period not in metrics.columns:
-        return None
+# Métricas do painel (src.analytics.panel) que vão para o ranking, por período.
+RANKING_METRICS = [
+    "return_total",
+    "cagr_total",
+    "sharpe_total",
+    "sortino_total",
+    "calmar_total",
+    "drawdown_total",
+    "vol_total",
+    "positive_days_total",
+]
 
-    value = metrics.loc[row, period]
+# Tickers por tarefa enviada ao pool de processos.
+RANKING_BATCH_SIZE = 16
 
-    if pd.isna(value):
-        return None
+DEFAULT_TICKER_TIMEOUT_SECONDS = 120
 
-    return value
+# Folga do processo principal sobre o limite do lote no worker: envio das
+# tarefas e dos resultados pelo pool.
+BATCH_TIMEOUT_SLACK_SECONDS = 10
 
 
 def load_validated_tickers(
@@ -84,113 +118,665 @@ def get_risk_free_by_period() -> dict[str, float]:
     )
 
 
+def _metric_columns() -> list[str]:
+    return [
+        f"{metric}_{period}"
+        for period in RANKING_PERIODS
+        for metric in RANKING_METRICS
+    ]
+
+
+def _ranking_metrics(metric_row: dict | None) -> dict | None:
+    # Só as colunas do ranking entre todas as métricas do painel.
+    if metric_row is None:
+        return None
+
+    return {column: metric_row[column] for column in _metric_columns()}
+
+
+def _error_row(
+    ticker: str,
+    sector: str | None,
+    company_type: str | None,
+    exc: BaseException,
+) -> dict:
+    return {
+        "date": date.today(),
+        "ticker": ticker,
+        "sector": sector,
+        "company_type": company_type,
+        "status": "erro",
+        "error": str(exc),
+    }
+
+
+def _ranking_row(
+    ticker: str,
+    history: pd.DataFrame,
+    metric_row: dict | None,
+    sector: str | None,
+    company_type: str | None,
+) -> dict:
+    if history.empty:
+        return {
+            "ticker": ticker,
+            "status": "sem histórico",
+        }
+
+    latest_price = history["close"].iloc[-1]
+    latest_date = pd.to_datetime(history["date"].iloc[-1]).date()
+
+    row = {
+        "date": date.today(),
+        "ticker": ticker,
+        "sector": sector,
+        "company_type": company_type,
+        "status": "ok",
+        "latest_price": latest_price,
+        "latest_date": latest_date,
+        "history_rows": len(history),
+        "liquidity_12m": history["financial_volume"].tail(252).mean(),
+    }
+
+    for column, value in metric_row.items():
+        row[column] = None if np.isnan(value) else value
+
+    return row
+
+
+# ==========================================================
+# Modo paralelo (pool de processos)
+# ==========================================================
+
+class TickerTimeoutError(TimeoutError):
+    pass
+
+
+# Contexto de cada processo do pool, preenchido uma vez pelo initializer.
+_worker_context: dict = {}
+
+
+def _init_ranking_worker(context: dict) -> None:
+    _worker_context.clear()
+    _worker_context.update(context)
+
+
+@contextmanager
+def _ticker_timeout(seconds: float | None) -> Iterator[None]:
+    """
+    Interrompe o ticker com TickerTimeoutError depois de 'seconds'.
+
+    Usa SIGALRM, então só vale na thread principal de sistemas Unix (o caso
+    dos processos do pool); no Windows roda sem limite.
+    """
+
+    if not seconds or not hasattr(signal, "SIGALRM"):
+        yield
+        return
+
+    def on_timeout(signum, frame):
+        raise TickerTimeoutError(f"Tempo limite de {seconds:g}s excedido")
+
+    previous = signal.signal(signal.SIGALRM, on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _batch_timeout(seconds: float | None, n_tickers: int) -> float | None:
+    """
+    Limite, no processo principal, para o resultado de um lote.
+
+    É o limite do próprio worker para o lote (o de um ticker vezes o
+    tamanho do lote) mais uma folga curta: só estoura se o processo travou
+    onde o SIGALRM não alcança (código C, I/O bloqueado).
+    """
+
+    if not seconds:
+        return None
+
+    return n_tickers * seconds + BATCH_TIMEOUT_SLACK_SECONDS
+
+
+def _terminate_executor(executor: ProcessPoolExecutor) -> None:
+    # Encerra o pool sem esperar: processos travados são mortos.
+    processes = list((executor._processes or {}).values())
+
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    for process in processes:
+        process.terminate()
+
+    for process in processes:
+        process.join(timeout=5)
+
+
+def _worker_history(ticker: str) -> pd.DataFrame:
+    context = _worker_context
+
+    # O histórico já foi atualizado pelo processo principal; aqui só se lê
+    # a camada quente do store, sem ir à rede.
+    key = normalize_brazilian_ticker(ticker)
+    hot = load_hot_history(key, store_dir=context["store_dir"])
+
+    if hot is not None:
+        return hot.to_frame(
+            start=context["initial_date"],
+            end=context["final_date"],
+        )
+
+    return read_ticker_history(
+        key,
+        start=context["initial_date"],
+        end=context["final_date"],
+        store_dir=context["store_dir"],
+    )
+
+
+def _worker_results(histories: dict[str, pd.DataFrame]) -> list[dict]:
+    """
+    Linha do ranking de cada ticker, junto com a chave e as métricas
+    completas para o processo principal gravar no cache.
+    """
+
+    context = _worker_context
+
+    histories_with_rows = {
+        ticker: history
+        for ticker, history in histories.items()
+        if not history.empty
+    }
+
+    if context["state_dir"] is not None:
+        # Estado incremental em disco: um arquivo por ticker, então os
+        # processos do pool não disputam a gravação.
+        metrics = incremental_universe_metrics(
+            histories_with_rows,
+            risk_free_by_period=context["risk_free_by_period"],
+            states=None,
+            state_dir=context["state_dir"],
+        )
+    else:
+        metrics = universe_metrics(
+            histories_with_rows,
+            risk_free_by_period=context["risk_free_by_period"],
+        )
+
+    metric_rows = metrics.to_dict("index")
+    results = []
+
+    for ticker, history in histories.items():
+        full_row = metric_rows.get(ticker)
+
+        results.append(
+            {
+                "row": _ranking_row(
+                    ticker,
+                    history,
+                    _ranking_metrics(full_row),
+                    context["sector"],
+                    context["company_type"],
+                ),
+                "cache_key": (
+                    metrics_cache_key(history, context["params_key"])
+                    if full_row is not None
+                    else None
+                ),
+                "metrics": full_row,
+            }
+        )
+
+    return results
+
+
+def _rank_ticker_in_worker(ticker: str) -> dict:
+    context = _worker_context
+
+    try:
+        with _ticker_timeout(context["timeout_seconds"]):
+            return _worker_results({ticker: _worker_history(ticker)})[0]
+
+    except Exception as exc:
+        return {
+            "row": _error_row(
+                ticker,
+                context["sector"],
+                context["company_type"],
+                exc,
+            ),
+            "cache_key": None,
+            "metrics": None,
+        }
+
+
+def _rank_batch_in_worker(tickers: list[str]) -> list[dict] | None:
+    """
+    Calcula o lote em um único painel, com o tempo limite de um ticker
+    vezes o tamanho do lote.
+
+    Se o lote falhar ou passar do limite, devolve None: o processo principal
+    refaz ticker a ticker, cada um com o seu limite, para que só o culpado
+    vire erro. Um lote de um ticker só já devolve a linha de erro.
+    """
+
+    if len(tickers) == 1:
+        return [_rank_ticker_in_worker(tickers[0])]
+
+    context = _worker_context
+    seconds = context["timeout_seconds"]
+
+    try:
+        with _ticker_timeout(seconds * len(tickers) if seconds else None):
+            histories = {ticker: _worker_history(ticker) for ticker in tickers}
+            results = _worker_results(histories)
+
+    except Exception:
+        return None
+
+    by_ticker = dict(zip(histories, results))
+
+    return [by_ticker[ticker] for ticker in tickers]
+
+
 def build_quantitative_ranking(
     tickers: list[str],
     sector: str | None = None,
     company_type: str | None = None,
+    max_workers: int = 8,
+    memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_BYTES,
+    years: int = 10,
+    processes: int | None = None,
+    batch_size: int = RANKING_BATCH_SIZE,
+    timeout_seconds: float | None = DEFAULT_TICKER_TIMEOUT_SECONDS,
+    store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
+    run_id: str | None = None,
+    resume: bool = False,
+    runs_dir: str | Path = DEFAULT_RUNS_DIR,
+    cache_dir: str | Path | None = DEFAULT_METRICS_CACHE_DIR,
 ) -> pd.DataFrame:
     """
     Calcula ranking quantitativo usando preço, dividendos, Selic e métricas de risco.
 
+    Os tickers são processados em blocos dimensionados pelo orçamento de
+    memória: cada bloco é baixado/atualizado em paralelo (threads), tem as
+    métricas calculadas e é descartado antes do próximo. Assim a memória não
+    cresce com o tamanho do universo.
+
+    Com 'processes' > 1, o cálculo sai do painel único e vai para um pool de
+    processos, em lotes de 'batch_size' tickers. Cada processo lê os
+    históricos do store e recebe a Selic uma única vez; um ticker que passe
+    de 'timeout_seconds' (ou que quebre ou trave o processo) vira linha de
+    erro sem travar os demais. A ordem das linhas é sempre a da entrada.
+
+    Com 'run_id', cada lote de linhas prontas é gravado no checkpoint da
+    execução (src.analytics.ranking_runs) em vez de ficar em memória, e o
+    ranking final é montado a partir dele. Com resume=True, tickers já
+    concluídos no mesmo dia e mesmo run_id são pulados; os que deram erro
+    são refeitos.
+
+    As métricas passam pelo cache persistente (src.analytics.metrics_cache):
+    só tickers cujo histórico ou Selic mudaram são recalculados, e a partir
+    do estado incremental gravado (só os pregões novos entram nas somas).
+    Use cache_dir=None para recalcular tudo.
+
     Ainda não usa fundamentos como P/L, ROE, FCL etc.
     """
 
     risk_free_by_period = get_risk_free_by_period()
 
-    rows = []
+    final_date = date.today()
+    initial_date = final_date - relativedelta(years=years)
 
-    for ticker in tickers:
-        print(f"Calculando ranking de {ticker}...")
+    n_dates = estimate_panel_dates(initial_date, final_date)
+    block_size = panel_block_size(n_dates, memory_budget_bytes)
 
-        try:
-            history = daily_stock_history(ticker)
+    metric_columns = _metric_columns()
+    params_key = metrics_params_key(DEFAULT_PERIODS, risk_free_by_period)
 
-            if history.empty:
-                rows.append(
-                    {
-                        "ticker": ticker,
-                        "status": "sem histórico",
-                    }
-                )
-                continue
+    run = None
+    pending_tickers = tickers
 
-            metrics = stock_metrics_by_period(
-                history,
-                risk_free_by_period=risk_free_by_period,
+    if run_id is not None:
+        run = open_ranking_run(
+            run_id,
+            resume=resume,
+            run_date=final_date,
+            runs_dir=runs_dir,
+        )
+
+        # Lotes menores: é o máximo de trabalho perdido se a execução cair.
+        block_size = min(block_size, RUN_CHECKPOINT_TICKERS)
+        pending_tickers = [ticker for ticker in tickers if ticker not in run.done]
+
+        if len(pending_tickers) < len(tickers):
+            print(
+                f"Retomando execução {run_id}: "
+                f"{len(tickers) - len(pending_tickers)} ativos já concluídos."
             )
 
-            latest_price = history["close"].iloc[-1]
-            latest_date = pd.to_datetime(history["date"].iloc[-1]).date()
-
-            row = {
-                "date": date.today(),
-                "ticker": ticker,
-                "sector": sector,
-                "company_type": company_type,
-                "status": "ok",
-                "latest_price": latest_price,
-                "latest_date": latest_date,
-                "history_rows": len(history),
-                "liquidity_12m": history["financial_volume"].tail(252).mean(),
-            }
+    context = {
+        "risk_free_by_period": risk_free_by_period,
+        "sector": sector,
+        "company_type": company_type,
+        "initial_date": initial_date,
+        "final_date": final_date,
+        "store_dir": store_dir,
+        "timeout_seconds": timeout_seconds,
+        "params_key": params_key,
+        "state_dir": (
+            incremental_state_dir(cache_dir)
+            if cache_dir is not None
+            else None
+        ),
+    }
+
+    parallel = processes is not None and processes > 1
+    executor = None
+
+    def new_executor() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=_init_ranking_worker,
+            initargs=(context,),
+        )
 
-            for period in ["12m", "3A", "5A", "10A"]:
-                row[f"return_total_{period}"] = _safe_metric(
-                    metrics,
-                    "Retorno Total Reinvestido",
-                    period,
-                )
-                row[f"cagr_total_{period}"] = _safe_metric(
-                    metrics,
-                    "CAGR Total Reinvestido",
-                    period,
-                )
-                row[f"sharpe_total_{period}"] = _safe_metric(
-                    metrics,
-                    "Sharpe Total",
-                    period,
-                )
-                row[f"sortino_total_{period}"] = _safe_metric(
-                    metrics,
-                    "Sortino Total",
-                    period,
-                )
-                row[f"calmar_total_{period}"] = _safe_metric(
-                    metrics,
-                    "Calmar Total",
-                    period,
-                )
-                row[f"drawdown_total_{period}"] = _safe_metric(
-                    metrics,
-                    "Drawdown Máximo Total",
-                    period,
-                )
-                row[f"vol_total_{period}"] = _safe_metric(
-                    metrics,
-                    "Volatilidade Total Anualizada",
-                    period,
-                )
-                row[f"positive_days_total_{period}"] = _safe_metric(
-                    metrics,
-                    "% Dias Positivos Total",
-                    period,
-                )
-
-            rows.append(row)
-
-        except Exception as exc:
-            rows.append(
-                {
-                    "date": date.today(),
-                    "ticker": ticker,
-                    "sector": sector,
-                    "company_type": company_type,
-                    "status": "erro",
-                    "error": str(exc),
-                }
+    rows = []
+
+    try:
+        for offset in range(0, len(pending_tickers), block_size):
+            block = pending_tickers[offset:offset + block_size]
+
+            print(
+                f"Atualizando histórico de {len(block)} ativos "
+                f"({offset + len(block)}/{len(pending_tickers)})..."
+            )
+
+            histories = daily_stock_history_many(
+                block,
+                max_workers=max_workers,
+                years=years,
+                final_date=final_date,
+                store_dir=store_dir,
             )
 
-    ranking = pd.DataFrame(rows)
+            if parallel:
+                block_rows: list[dict | None] = [None] * len(block)
+                keys = {}
+                pending = []
+
+                for position, (ticker, loaded) in enumerate(zip(block, histories)):
+                    if loaded.error is not None:
+                        block_rows[position] = _error_row(
+                            ticker,
+                            sector,
+                            company_type,
+                            loaded.error,
+                        )
+                    elif loaded.history.empty:
+                        block_rows[position] = _ranking_row(
+                            ticker,
+                            loaded.history,
+                            None,
+                            sector,
+                            company_type,
+                        )
+                    else:
+                        pending.append(position)
+
+                        if cache_dir is not None:
+                            keys[ticker] = metrics_cache_key(loaded.history, params_key)
+
+                # Tickers com métricas em cache nem vão para o pool.
+                if keys:
+                    hits = load_cached_metrics(keys, cache_dir)
+                    hits = hits[~hits.index.duplicated()].to_dict("index")
+
+                    for position in list(pending):
+                        ticker = block[position]
+
+                        if ticker in hits:
+                            block_rows[position] = _ranking_row(
+                                ticker,
+                                histories[position].history,
+                                _ranking_metrics(hits[ticker]),
+                                sector,
+                                company_type,
+                            )
+                            pending.remove(position)
+
+                if pending and executor is None:
+                    executor = new_executor()
+
+                batches = [
+                    pending[start:start + batch_size]
+                    for start in range(0, len(pending), batch_size)
+                ]
+
+                futures = [
+                    executor.submit(
+                        _rank_batch_in_worker,
+                        [block[position] for position in batch],
+                    )
+                    for batch in batches
+                ]
+
+                computed_keys = {}
+                computed_metrics = {}
+
+                def collect(position: int, result: dict) -> None:
+                    block_rows[position] = result["row"]
+
+                    if result["metrics"] is not None:
+                        computed_keys[block[position]] = result["cache_key"]
+                        computed_metrics[block[position]] = result["metrics"]
+
+                failed = []
+                broken = False
+                queue = list(zip(batches, futures))
+
+                # O pool despacha na ordem de envio: quando o lote anterior
+                # termina, o próximo já está em execução, então o limite conta
+                # a partir daqui.
+                for index, (batch, future) in enumerate(queue):
+                    try:
+                        results = future.result(
+                            timeout=_batch_timeout(timeout_seconds, len(batch)),
+                        )
+                    except FuturesTimeoutError:
+                        # Processo travado: recicla o pool, manda os lotes
+                        # ainda pendentes para o pool novo e refaz este
+                        # ticker a ticker abaixo.
+                        _terminate_executor(executor)
+                        executor = new_executor()
+
+                        queue[index + 1:] = [
+                            (
+                                pending_batch,
+                                executor.submit(
+                                    _rank_batch_in_worker,
+                                    [block[position] for position in pending_batch],
+                                ),
+                            )
+                            for pending_batch, _ in queue[index + 1:]
+                        ]
+
+                        failed.extend(batch)
+                        continue
+                    except BrokenProcessPool:
+                        # Algum processo morreu (ex: falta de memória) e
+                        # levou junto as tarefas pendentes; esses tickers
+                        # são refeitos um a um abaixo.
+                        broken = True
+                        failed.extend(batch)
+                        continue
+                    except Exception as exc:
+                        results = [
+                            {
+                                "row": _error_row(
+                                    block[position],
+                                    sector,
+                                    company_type,
+                                    exc,
+                                ),
+                                "metrics": None,
+                            }
+                            for position in batch
+                        ]
+
+                    if results is None:
+                        # O lote falhou ou passou do limite no worker.
+                        failed.extend(batch)
+                        continue
+
+                    for position, result in zip(batch, results):
+                        collect(position, result)
+
+                    print(f"Ranking calculado para {len(batch)} ativos...")
+
+                # Refaz um ticker por vez, recriando o pool sempre que ele
+                # quebrar: só o culpado vira erro.
+                for position in failed:
+                    if broken:
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        executor = new_executor()
+                        broken = False
+
+                    ticker = block[position]
+
+                    try:
+                        collect(
+                            position,
+                            executor.submit(
+                                _rank_batch_in_worker,
+                                [ticker],
+                            ).result(timeout=_batch_timeout(timeout_seconds, 1))[0],
+                        )
+                    except FuturesTimeoutError:
+                        _terminate_executor(executor)
+                        executor = new_executor()
+
+                        block_rows[position] = _error_row(
+                            ticker,
+                            sector,
+                            company_type,
+                            TickerTimeoutError(
+                                f"Processo travado por mais de "
+                                f"{_batch_timeout(timeout_seconds, 1):g}s"
+                            ),
+                        )
+                    except Exception as exc:
+                        broken = isinstance(exc, BrokenProcessPool)
+                        block_rows[position] = _error_row(
+                            ticker,
+                            sector,
+                            company_type,
+                            exc,
+                        )
+
+                if broken:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = None
+
+                if cache_dir is not None and computed_metrics:
+                    computed = pd.DataFrame.from_dict(computed_metrics, orient="index")
+                    computed.index.name = "ticker"
+
+                    save_cached_metrics(computed_keys, computed, cache_dir)
+
+            else:
+                # Métricas de todos os tickers do bloco e períodos de uma
+                # vez, no painel datas x tickers.
+                loaded_histories = {
+                    ticker: loaded.history
+                    for ticker, loaded in zip(block, histories)
+                    if loaded.ok and not loaded.history.empty
+                }
+
+                def block_metrics(block_histories: dict[str, pd.DataFrame]) -> dict:
+                    if cache_dir is not None:
+                        metrics = cached_universe_metrics(
+                            block_histories,
+                            risk_free_by_period=risk_free_by_period,
+                            cache_dir=cache_dir,
+                        )
+                    else:
+                        metrics = universe_metrics(
+                            block_histories,
+                            risk_free_by_period=risk_free_by_period,
+                        )
+
+                    return metrics[metric_columns].to_dict("index")
+
+                metric_errors: dict[str, Exception] = {}
+
+                try:
+                    metric_rows = block_metrics(loaded_histories)
+
+                except Exception:
+                    # Um histórico problemático derruba o painel do bloco
+                    # inteiro; refaz ticker a ticker para que só o culpado
+                    # vire erro.
+                    metric_rows = {}
+
+                    for ticker, history in loaded_histories.items():
+                        try:
+                            metric_rows.update(block_metrics({ticker: history}))
+                        except Exception as exc:
+                            metric_errors[ticker] = exc
+
+                block_rows = []
+
+                for ticker, loaded in zip(block, histories):
+                    print(f"Calculando ranking de {ticker}...")
+
+                    try:
+                        if loaded.error is not None:
+                            raise loaded.error
+
+                        if ticker in metric_errors:
+                            raise metric_errors[ticker]
+
+                        block_rows.append(
+                            _ranking_row(
+                                ticker,
+                                loaded.history,
+                                metric_rows.get(ticker),
+                                sector,
+                                company_type,
+                            )
+                        )
+
+                    except Exception as exc:
+                        block_rows.append(
+                            _error_row(ticker, sector, company_type, exc)
+                        )
+
+                del loaded_histories, metric_rows, metric_errors
+
+            if run is not None:
+                run.append(block_rows)
+            else:
+                rows.extend(block_rows)
+
+            del histories, block_rows
+
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    peak = peak_rss_bytes()
+
+    if peak is not None:
+        print(f"Pico de memória (RSS): {peak / 1024 ** 2:.0f} MiB")
+
+    if run is not None:
+        ranking = run.load_rows(tickers)
+    else:
+        ranking = pd.DataFrame(rows)
 
     ranking = add_quantitative_scores(ranking)
 
@@ -319,7 +905,16 @@ def build_and_save_ranking_from_validated_tickers(
     company_type: str | None = "eletrica",
     min_lines: int = 500,
     min_liquidity_12m: float = 1_000_000,
+    processes: int | None = None,
+    run_id: str | None = None,
+    resume: bool = False,
 ) -> pd.DataFrame:
+    """
+    Ranking dos tickers validados, com checkpoint em
+    storage/rankings/runs/<run_id>/. Se a execução cair, rodar de novo com
+    resume=True no mesmo dia continua de onde parou.
+    """
+
     valid = load_validated_tickers(
         path=validated_path,
         min_lines=min_lines,
@@ -328,10 +923,16 @@ def build_and_save_ranking_from_validated_tickers(
 
     tickers = valid["ticker"].tolist()
 
+    if run_id is None:
+        run_id = default_run_id(tickers, sector, company_type)
+
     ranking = build_quantitative_ranking(
         tickers=tickers,
         sector=sector,
         company_type=company_type,
+        processes=processes,
+        run_id=run_id,
+        resume=resume,
     )
 
     dated_path, latest_path = save_ranking_snapshot(ranking)
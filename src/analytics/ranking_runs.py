@@ -0,0 +1,182 @@
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from pathlib import Path
+from uuid import uuid4
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from src.data.parquet_io import write_parquet_atomic
+
+
+# Checkpoint de uma execução do ranking.
+#
+# Cada lote de linhas prontas vira um Parquet em
+# storage/rankings/runs/<run_id>/parts/ e um manifest pequeno guarda quais
+# tickers já foram concluídos. Se a execução cair no meio (erro, ban do
+# Yahoo), rodar de novo com resume=True no mesmo dia só processa o que
+# falta.
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+DEFAULT_RUNS_DIR = PROJECT_ROOT / "storage" / "rankings" / "runs"
+
+# Tickers por lote gravado no checkpoint: é o máximo de trabalho perdido se
+# a execução cair.
+RUN_CHECKPOINT_TICKERS = 50
+
+
+def default_run_id(
+        tickers: list[str],
+        sector: str | None = None,
+        company_type: str | None = None,
+) -> str:
+    """
+    Id estável para a mesma lista de tickers e filtros.
+    """
+
+    payload = json.dumps([tickers, sector, company_type], ensure_ascii=False)
+
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass
+class RankingRun:
+    run_id: str
+    run_date: date
+    path: Path
+    parts: list[str] = field(default_factory=list)
+    # Tickers com linha 'ok' ou 'sem histórico'. Linhas de erro não contam:
+    # são refeitas ao retomar.
+    done: set[str] = field(default_factory=set)
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.path / "manifest.json"
+
+    def _save_manifest(self) -> None:
+        manifest = {
+            "run_id": self.run_id,
+            "date": self.run_date.isoformat(),
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+            "parts": self.parts,
+            "done": sorted(self.done),
+        }
+
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        tmp_path = self.manifest_path.with_name(
+            f".{self.manifest_path.name}.{uuid4().hex}.tmp"
+        )
+        tmp_path.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+        os.replace(tmp_path, self.manifest_path)
+
+    def append(self, rows: list[dict]) -> None:
+        """
+        Grava um lote de linhas como nova parte e marca os tickers
+        concluídos. O manifest só é atualizado depois que a parte está no
+        disco.
+        """
+
+        if not rows:
+            return
+
+        name = f"part-{len(self.parts):05d}.parquet"
+
+        write_parquet_atomic(pd.DataFrame(rows), self.path / "parts" / name)
+
+        self.parts.append(name)
+        self.done.update(
+            row["ticker"]
+            for row in rows
+            if row.get("status") != "erro"
+        )
+
+        self._save_manifest()
+
+    def load_rows(self, tickers: list[str] | None = None) -> pd.DataFrame:
+        """
+        Junta as partes: a linha mais recente de cada ticker, na ordem de
+        'tickers' (se informada).
+        """
+
+        frames = [
+            pd.read_parquet(self.path / "parts" / name)
+            for name in self.parts
+        ]
+        frames = [frame for frame in frames if not frame.empty]
+
+        if not frames:
+            return pd.DataFrame()
+
+        rows = (
+            pd.concat(frames, ignore_index=True)
+            .drop_duplicates(subset=["ticker"], keep="last")
+        )
+
+        # Mesmo formato de pd.DataFrame(linhas): chaves ausentes e None
+        # viram NaN, e colunas sem nenhum valor ficam float64.
+        for column in rows.columns[rows.dtypes == object]:
+            values = rows[column]
+
+            if values.isna().all():
+                rows[column] = values.astype("float64")
+            else:
+                rows[column] = values.where(values.notna(), np.nan)
+
+        if tickers is not None:
+            order = {}
+
+            for position, ticker in enumerate(tickers):
+                order.setdefault(ticker, position)
+
+            rows = rows[rows["ticker"].isin(order)]
+            rows = rows.iloc[
+                rows["ticker"].map(order).argsort(kind="stable")
+            ]
+
+        return rows.reset_index(drop=True)
+
+
+def open_ranking_run(
+        run_id: str,
+        resume: bool = False,
+        run_date: date | None = None,
+        runs_dir: str | Path = DEFAULT_RUNS_DIR,
+) -> RankingRun:
+    """
+    Abre o checkpoint da execução 'run_id'.
+
+    Com resume=True e um checkpoint do mesmo dia, continua de onde parou;
+    caso contrário, descarta o que houver e começa do zero.
+    """
+
+    if run_date is None:
+        run_date = date.today()
+
+    path = Path(runs_dir) / run_id
+    manifest_path = path / "manifest.json"
+
+    if resume and manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+
+        if manifest.get("date") == run_date.isoformat():
+            return RankingRun(
+                run_id=run_id,
+                run_date=run_date,
+                path=path,
+                parts=list(manifest["parts"]),
+                done=set(manifest["done"]),
+            )
+
+    if path.exists():
+        shutil.rmtree(path)
+
+    run = RankingRun(run_id=run_id, run_date=run_date, path=path)
+    run._save_manifest()
+
+    return run
@@ -0,0 +1,514 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.analytics.panel import PricePanel, build_price_panel
+from src.analytics.stock_metrics import TRADING_DAYS_PER_YEAR
+from src.data.selic import SelicIndex
+
+
+# Séries de métricas em janela móvel (volatilidade, Sharpe, Sortino, beta e
+# drawdown dos últimos N pregões), para gráficos e análise de regime.
+#
+# As definições são as de stock_metrics, aplicadas a cada janela: o valor na
+# data t é o que calculate_metrics_for_period daria para os pregões
+# t - window .. t do ticker (window retornos diários). Tudo é O(n) por
+# ticker, sem rolling().apply:
+#
+# - somas e contagens vêm de somas acumuladas (valores centralizados pela
+#   média do ticker, para não perder precisão na variância);
+# - máximo e drawdown máximo da janela usam decomposição em blocos do
+#   tamanho da janela (van Herk/Gil-Werman): agregados de prefixo e sufixo
+#   de cada bloco, combinados para cada janela.
+#
+# As contas são feitas no "espaço de pregões": cada coluna do painel é
+# compactada para os pregões do próprio ticker, então a janela de N pregões
+# é a mesma fatia de linhas para todos os tickers.
+#
+# Com a Selic diária (SelicIndex), cada janela usa a taxa livre de risco do
+# próprio intervalo, como stock_metrics faz para cada período. A exceção ao
+# O(n) é a volatilidade negativa: o limite muda de janela para janela, e
+# com ele o conjunto de retornos abaixo dele. Essa parte é O(n * janela),
+# vetorizada e em fatias de colunas.
+
+ROLLING_WINDOW = TRADING_DAYS_PER_YEAR
+
+# Elementos (linhas x janela x colunas) por fatia do cálculo com limite por
+# janela.
+ROLLING_CHUNK_ELEMENTS = 2 ** 22
+
+ROLLING_METRICS = {
+    "cagr_price": "CAGR Preço",
+    "vol_price": "Volatilidade Preço Anualizada",
+    "downside_vol_price": "Volatilidade Negativa Preço Anualizada",
+    "sharpe_price": "Sharpe Preço",
+    "sortino_price": "Sortino Preço",
+    "drawdown_price": "Drawdown Máximo Preço",
+    "current_drawdown_price": "Drawdown Atual Preço",
+
+    "cagr_total": "CAGR Total Reinvestido",
+    "vol_total": "Volatilidade Total Anualizada",
+    "downside_vol_total": "Volatilidade Negativa Total Anualizada",
+    "sharpe_total": "Sharpe Total",
+    "sortino_total": "Sortino Total",
+    "drawdown_total": "Drawdown Máximo Total",
+
+    "beta": "Beta",
+}
+
+
+def _compress(panel: PricePanel) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Ordem de linhas que leva cada coluna para o espaço de pregões (pregões
+    do ticker no topo, na ordem das datas) e a máscara desse espaço.
+    """
+
+    order = np.argsort(~panel.mask, axis=0, kind="stable")
+    sessions = np.arange(panel.mask.shape[0])[:, None] < panel.mask.sum(axis=0)
+
+    return order, sessions
+
+
+def _moving_sum(matrix: np.ndarray, window: int) -> np.ndarray:
+    # Soma das últimas 'window' linhas, por diferença de somas acumuladas.
+    cumulative = np.cumsum(matrix, axis=0)
+    result = cumulative.copy()
+    result[window:] -= cumulative[:-window]
+
+    return result
+
+
+def _centered(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """
+    Valores de 'mask' menos a média da coluna (0 fora da máscara). Somas
+    acumuladas de valores centralizados não perdem precisão na variância,
+    que não depende do centro.
+    """
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        center = np.where(mask, values, 0.0).sum(axis=0) / mask.sum(axis=0)
+
+    return np.where(mask, values - np.nan_to_num(center), 0.0)
+
+
+def _window_sums(values: np.ndarray, mask: np.ndarray, window: int) -> tuple:
+    """
+    Contagem, soma e soma dos quadrados (centralizados) dos valores de
+    'mask' nas últimas 'window' linhas, para cada linha.
+    """
+
+    shifted = _centered(values, mask)
+
+    return (
+        _moving_sum(mask.astype("float64"), window),
+        _moving_sum(shifted, window),
+        _moving_sum(shifted ** 2, window),
+    )
+
+
+def _window_sums_below(
+        values: np.ndarray,
+        mask: np.ndarray,
+        thresholds: np.ndarray,
+        window: int,
+) -> tuple:
+    """
+    Como _window_sums, só com os valores de 'mask' abaixo do limite da
+    própria janela ('thresholds', um por linha). Sem somas acumuladas: cada
+    janela é comparada inteira, em fatias de colunas.
+    """
+
+    n_rows, n_columns = values.shape
+    count, total, squares = (np.full(values.shape, np.nan) for _ in range(3))
+
+    if n_rows < window:
+        return count, total, squares
+
+    # Fora da máscara o valor nunca fica abaixo do limite.
+    values = np.where(mask, values, np.inf)
+    step = max(1, ROLLING_CHUNK_ELEMENTS // (n_rows * window))
+
+    for start in range(0, n_columns, step):
+        columns = slice(start, start + step)
+
+        # (linhas - window + 1, colunas, window): janela que termina em cada
+        # linha a partir de window - 1.
+        windows = sliding_window_view(values[:, columns], window, axis=0)
+        below = windows < thresholds[window - 1:, columns, None]
+        selected = np.where(below, windows, 0.0)
+
+        count[window - 1:, columns] = below.sum(axis=2)
+        total[window - 1:, columns] = selected.sum(axis=2)
+        squares[window - 1:, columns] = (selected ** 2).sum(axis=2)
+
+    return count, total, squares
+
+
+def _window_std(count: np.ndarray, total: np.ndarray, squares: np.ndarray) -> np.ndarray:
+    # Mesma conta de pandas.Series.std(ddof=1).
+    with np.errstate(invalid="ignore", divide="ignore"):
+        variance = (squares - total ** 2 / count) / (count - 1)
+
+    return np.where(count >= 2, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+
+
+def _blocks(values: np.ndarray, length: int) -> np.ndarray:
+    # Linhas em blocos de 'length', completando o último com NaN.
+    n_rows, n_columns = values.shape
+    n_blocks = -(-n_rows // length)
+
+    padded = np.full((n_blocks * length, n_columns), np.nan)
+    padded[:n_rows] = values
+
+    return padded.reshape(n_blocks, length, n_columns)
+
+
+def _unblock(values: np.ndarray, n_rows: int) -> np.ndarray:
+    return values.reshape(-1, values.shape[-1])[:n_rows]
+
+
+def _window_bounds(n_rows: int, length: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Para cada janela completa: primeira linha, última linha e se a janela
+    # coincide com um bloco.
+    last = np.arange(length - 1, n_rows)
+    first = last - length + 1
+
+    return first, last, first % length == 0
+
+
+def _window_max(values: np.ndarray, length: int) -> np.ndarray:
+    """
+    Máximo (ignorando NaN) das últimas 'length' linhas; NaN enquanto a
+    janela não está completa.
+    """
+
+    n_rows = values.shape[0]
+    result = np.full(values.shape, np.nan)
+
+    if n_rows < length:
+        return result
+
+    blocks = _blocks(values, length)
+
+    prefix = _unblock(np.fmax.accumulate(blocks, axis=1), n_rows)
+    suffix = _unblock(np.fmax.accumulate(blocks[:, ::-1], axis=1)[:, ::-1], n_rows)
+
+    first, last, _ = _window_bounds(n_rows, length)
+    result[last] = np.fmax(suffix[first], prefix[last])
+
+    return result
+
+
+def _window_max_drawdown(values: np.ndarray, length: int) -> np.ndarray:
+    """
+    Drawdown máximo dentro de cada janela das últimas 'length' linhas (como
+    _max_drawdown_from_series na janela: o topo também precisa estar nela).
+    """
+
+    n_rows = values.shape[0]
+    result = np.full(values.shape, np.nan)
+
+    if n_rows < length:
+        return result
+
+    blocks = _blocks(values, length)
+    reverse = blocks[:, ::-1]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Prefixo do bloco: topo, fundo e drawdown máximo até a linha.
+        prefix_max = np.fmax.accumulate(blocks, axis=1)
+        prefix_min = np.fmin.accumulate(blocks, axis=1)
+        prefix_drawdown = np.fmin.accumulate(blocks / prefix_max - 1, axis=1)
+
+        # Sufixo do bloco: a partir de cada linha, o pior fundo depois de um
+        # topo.
+        suffix_max = np.fmax.accumulate(reverse, axis=1)
+        suffix_min = np.fmin.accumulate(reverse, axis=1)
+        suffix_drawdown = np.fmin.accumulate(suffix_min / reverse - 1, axis=1)
+
+        prefix_max, prefix_min, prefix_drawdown, suffix_max, suffix_drawdown = (
+            _unblock(matrix, n_rows)
+            for matrix in (
+                prefix_max,
+                prefix_min,
+                prefix_drawdown,
+                suffix_max[:, ::-1],
+                suffix_drawdown[:, ::-1],
+            )
+        )
+
+        first, last, aligned = _window_bounds(n_rows, length)
+
+        # Janela que atravessa dois blocos: pior entre o sufixo do primeiro,
+        # o prefixo do segundo e o fundo do segundo contra o topo do
+        # primeiro.
+        across = np.fmin(
+            np.fmin(suffix_drawdown[first], prefix_drawdown[last]),
+            prefix_min[last] / suffix_max[first] - 1,
+        )
+
+    result[last] = np.where(aligned[:, None], prefix_drawdown[last], across)
+
+    return result
+
+
+def _benchmark_close(
+        benchmark: pd.DataFrame | None,
+        dates: np.ndarray,
+) -> np.ndarray | None:
+    """
+    Fechamento do benchmark em cada data (último disponível até a data).
+    """
+
+    if benchmark is None or benchmark.empty:
+        return None
+
+    benchmark = benchmark.dropna(subset=["date", "close"]).sort_values("date")
+
+    benchmark_dates = pd.to_datetime(benchmark["date"]).to_numpy(dtype="datetime64[ns]")
+    benchmark_close = benchmark["close"].to_numpy(dtype="float64")
+
+    rows = np.searchsorted(benchmark_dates, dates, side="right") - 1
+
+    return np.where(rows >= 0, benchmark_close[np.maximum(rows, 0)], np.nan)
+
+
+def rolling_panel_metrics(
+        panel: PricePanel,
+        window: int = ROLLING_WINDOW,
+        risk_free_rate: float | None = None,
+        benchmark: pd.DataFrame | None = None,
+        selic_index: SelicIndex | None = None,
+) -> dict[str, pd.DataFrame]:
+    """
+    Métricas das últimas 'window' sessões de cada ticker, em cada data do
+    painel. Uma matriz datas x tickers por chave de ROLLING_METRICS; NaN
+    onde o ticker não tem pregão ou ainda não tem 'window' retornos.
+
+    A taxa livre de risco de Sharpe e Sortino vem de 'selic_index' (Selic
+    anualizada entre a primeira e a última data de cada janela; NaN sem
+    Selic no intervalo) ou, sem ele, da taxa fixa 'risk_free_rate'.
+
+    O beta é contra 'benchmark' (histórico com date e close, p. ex. o IBOV),
+    com o retorno do benchmark entre os mesmos pregões do ativo.
+    """
+
+    if window < 2:
+        raise ValueError("window precisa ser de pelo menos 2 pregões.")
+
+    n_rows, n_columns = panel.close.shape
+    order, sessions = _compress(panel)
+
+    close = np.where(sessions, np.take_along_axis(panel.close, order, axis=0), np.nan)
+    dividend = np.take_along_axis(panel.dividend, order, axis=0)
+    dates = panel.dates[order] if n_rows else np.empty((0, n_columns), dtype="datetime64[ns]")
+
+    previous_close = np.full(close.shape, np.nan)
+    previous_close[1:] = close[:-1]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        price_returns = close / previous_close - 1
+        total_returns = (close + dividend) / previous_close - 1
+
+    # Valor na linha i: janela de preços i - window .. i.
+    complete = sessions & (np.arange(n_rows)[:, None] >= window)
+
+    start_close = np.full(close.shape, np.nan)
+    start_close[window:] = close[:-window]
+
+    elapsed_days = np.full(close.shape, np.nan)
+
+    if n_rows > window:
+        elapsed_days[window:] = (
+            (dates[window:] - dates[:-window]) // np.timedelta64(1, "D")
+        )
+
+    years = elapsed_days / 365.25
+
+    # Índice do retorno total reinvestido (retornos NaN ficam de fora, como
+    # no dropna de stock_metrics).
+    total_valid = sessions & ~np.isnan(total_returns)
+    total_index = np.where(
+        sessions,
+        np.cumprod(np.where(total_valid, 1 + total_returns, 1.0), axis=0),
+        np.nan,
+    )
+
+    start_index = np.full(close.shape, np.nan)
+    start_index[window:] = total_index[:-window]
+
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        cagr_price = (close / start_close) ** (1 / years) - 1
+        cagr_total = (total_index / start_index) ** (1 / years) - 1
+
+    cagr_price = np.where(start_close > 0, cagr_price, np.nan)
+
+    # Taxa livre de risco de cada janela (escalar se for fixa).
+    if selic_index is not None:
+        risk_free = np.full(close.shape, np.nan)
+
+        if n_rows > window:
+            start_dates = dates[:-window]
+            end_dates = dates[window:]
+
+            with np.errstate(invalid="ignore", divide="ignore"):
+                rates = selic_index.annualized(
+                    start_dates.ravel(),
+                    end_dates.ravel(),
+                    years[window:].ravel(),
+                ).reshape(start_dates.shape)
+
+            days = selic_index.days(start_dates.ravel(), end_dates.ravel())
+            risk_free[window:] = np.where(
+                days.reshape(start_dates.shape) > 0,
+                rates,
+                np.nan,
+            )
+
+    elif risk_free_rate is not None:
+        risk_free = risk_free_rate
+    else:
+        risk_free = None
+
+    if risk_free is not None:
+        daily_risk_free = (1 + risk_free) ** (1 / TRADING_DAYS_PER_YEAR) - 1
+    else:
+        daily_risk_free = 0.0
+
+    output = {}
+
+    for name, returns, cagr in (
+        ("price", price_returns, cagr_price),
+        ("total", total_returns, cagr_total),
+    ):
+        valid = sessions & ~np.isnan(returns)
+
+        volatility = _window_std(*_window_sums(returns, valid, window)) * np.sqrt(
+            TRADING_DAYS_PER_YEAR
+        )
+
+        if np.ndim(daily_risk_free) == 0:
+            excess = returns - daily_risk_free
+            downside = valid & (excess < 0)
+
+            downside_sums = _window_sums(excess, downside, window)
+        else:
+            # O desvio dos retornos abaixo do limite é o mesmo do excesso:
+            # só o conjunto depende do limite da janela.
+            downside_sums = _window_sums_below(
+                returns, valid, daily_risk_free, window
+            )
+
+        downside_volatility = _window_std(*downside_sums) * np.sqrt(
+            TRADING_DAYS_PER_YEAR
+        )
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if risk_free is not None:
+                sharpe = np.where(
+                    volatility != 0,
+                    (cagr - risk_free) / volatility,
+                    np.nan,
+                )
+                sortino = np.where(
+                    downside_volatility != 0,
+                    (cagr - risk_free) / downside_volatility,
+                    np.nan,
+                )
+            else:
+                sharpe = np.full(close.shape, np.nan)
+                sortino = np.full(close.shape, np.nan)
+
+        output[f"cagr_{name}"] = cagr
+        output[f"vol_{name}"] = volatility
+        output[f"downside_vol_{name}"] = downside_volatility
+        output[f"sharpe_{name}"] = sharpe
+        output[f"sortino_{name}"] = sortino
+
+    # Drawdown de preço: window + 1 fechamentos. O índice total de
+    # stock_metrics começa no primeiro retorno: window valores.
+    output["drawdown_price"] = _window_max_drawdown(close, window + 1)
+    output["drawdown_total"] = _window_max_drawdown(total_index, window)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        output["current_drawdown_price"] = close / _window_max(close, window + 1) - 1
+
+    # Beta: covariância / variância do benchmark, nos pares válidos.
+    beta = np.full(close.shape, np.nan)
+    benchmark_close = _benchmark_close(benchmark, panel.dates)
+
+    if benchmark_close is not None:
+        benchmark_close = np.where(sessions, benchmark_close[order], np.nan)
+
+        previous_benchmark = np.full(close.shape, np.nan)
+        previous_benchmark[1:] = benchmark_close[:-1]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            benchmark_returns = benchmark_close / previous_benchmark - 1
+
+        pairs = sessions & ~np.isnan(price_returns) & ~np.isnan(benchmark_returns)
+
+        asset = _centered(price_returns, pairs)
+        market = _centered(benchmark_returns, pairs)
+
+        count = _moving_sum(pairs.astype("float64"), window)
+        asset_total = _moving_sum(asset, window)
+        benchmark_total = _moving_sum(market, window)
+        benchmark_squares = _moving_sum(market ** 2, window)
+        cross_total = _moving_sum(asset * market, window)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            covariance = cross_total - asset_total * benchmark_total / count
+            variance = benchmark_squares - benchmark_total ** 2 / count
+
+            beta = np.where(
+                (count >= 2) & (variance > 0),
+                covariance / variance,
+                np.nan,
+            )
+
+    output["beta"] = beta
+
+    # De volta para datas x tickers.
+    result = {}
+
+    for key in ROLLING_METRICS:
+        values = np.where(complete, output[key], np.nan)
+
+        matrix = np.full((n_rows, n_columns), np.nan)
+        np.put_along_axis(matrix, order, values, axis=0)
+
+        result[key] = pd.DataFrame(
+            matrix,
+            index=pd.DatetimeIndex(panel.dates, name="date"),
+            columns=pd.Index(panel.tickers, name="ticker"),
+        )
+
+    return result
+
+
+def rolling_metrics(
+        history: pd.DataFrame,
+        window: int = ROLLING_WINDOW,
+        risk_free_rate: float | None = None,
+        benchmark: pd.DataFrame | None = None,
+        selic_index: SelicIndex | None = None,
+) -> pd.DataFrame:
+    """
+    Séries das métricas móveis de um ativo: uma linha por pregão, uma
+    coluna por chave de ROLLING_METRICS.
+    """
+
+    panel = build_price_panel({"": history})
+    metrics = rolling_panel_metrics(
+        panel,
+        window=window,
+        risk_free_rate=risk_free_rate,
+        benchmark=benchmark,
+        selic_index=selic_index,
+    )
+
+    return pd.DataFrame(
+        {key: frame.iloc[:, 0] for key, frame in metrics.items()},
+        index=metrics["beta"].index,
+    )
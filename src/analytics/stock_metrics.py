@@ -79,10 +79,16 @@ def _max_drawdown_from_series(series: pd.Series) -> float | None:
     return drawdown.min()
 
 def _prepare_history(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
+    # Cópia rasa: com Copy-on-Write as colunas só são copiadas se forem
+    # alteradas. Históricos vindos da camada quente não são duplicados.
+    df = df.copy(deep=False)
 
     df["date"] = pd.to_datetime(df["date"])
-    df = df.sort_values("date").reset_index(drop=True)
+
+    if not df["date"].is_monotonic_increasing:
+        df = df.sort_values("date")
+
+    df = df.reset_index(drop=True)
 
     needed_columns = [
         "close",
@@ -293,83 +299,437 @@ def calculate_metrics_for_period(
     return result
 
 
-def stock_metrics_by_period(
-    df: pd.DataFrame,
-    periods: list[PeriodConfig] | None = None,
-    risk_free_by_period: dict[str, float] | None = None,
-) -> pd.DataFrame:
-    if periods is None:
-        periods = DEFAULT_PERIODS
+# ==========================================================
+# Kernel NumPy de vários períodos
+# ==========================================================
+#
+# calculate_metrics_for_period é a implementação de referência: prepara o
+# histórico, recorta o período e recalcula retornos para cada período. O
+# kernel abaixo prepara o histórico e calcula os retornos diários uma vez só;
+# cada período é um sufixo desses arrays. As operações (e a ordem delas) são
+# as mesmas do pandas, então o resultado é idêntico.
 
-    metrics_by_period = {}
 
-    for period in periods:
-        risk_free_rate = None
+@dataclass(frozen=True)
+class HistoryArrays:
+    dates: np.ndarray
+    close: np.ndarray
+    dividend: np.ndarray
+    financial_volume: np.ndarray
+    # Retorno do dia i + 1 em relação ao dia i (len = len(close) - 1).
+    price_returns: np.ndarray
+    total_returns: np.ndarray
 
-        if risk_free_by_period is not None:
-            risk_free_rate = risk_free_by_period.get(period.label)
 
-        metrics_by_period[period.label] = calculate_metrics_for_period(
-            df=df,
-            years=period.years,
+def prepare_history_arrays(df: pd.DataFrame) -> HistoryArrays:
+    df = _prepare_history(df)
+
+    # Datas vazias nunca entram em um período (date >= início é falso).
+    df = df[df["date"].notna()]
+
+    close = df["close"].to_numpy(dtype="float64")
+    dividend = df["dividend"].to_numpy(dtype="float64")
+
+    previous_close = close[:-1]
+
+    # Fechamento zero vira inf/NaN em silêncio, como no pct_change.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        price_returns = close[1:] / previous_close - 1
+        total_returns = (close[1:] + dividend[1:]) / previous_close - 1
+
+    return HistoryArrays(
+        dates=df["date"].to_numpy(dtype="datetime64[ns]"),
+        close=close,
+        dividend=dividend,
+        financial_volume=df["financial_volume"].to_numpy(dtype="float64"),
+        price_returns=price_returns,
+        total_returns=total_returns,
+    )
+
+
+def _period_start(
+        arrays: HistoryArrays,
+        years: int,
+        tolerance_days: int = 10,
+) -> int | None:
+    """
+    Índice da primeira linha do período (mesmas regras de _slice_period).
+    Retorna None se o histórico não cobre o início do período.
+    """
+
+    if len(arrays.dates) == 0:
+        return None
+
+    final_date = pd.Timestamp(arrays.dates[-1])
+    target_initial_date = final_date - relativedelta(years=years)
+
+    start = int(
+        np.searchsorted(
+            arrays.dates,
+            target_initial_date.to_datetime64().astype("datetime64[ns]"),
+            side="left",
+        )
+    )
+
+    if start >= len(arrays.dates):
+        return None
+
+    maximum_accepted_initial_date = target_initial_date + pd.Timedelta(
+        days=tolerance_days
+    )
+
+    if pd.Timestamp(arrays.dates[start]) > maximum_accepted_initial_date:
+        return None
+
+    return start
+
+
+def _std(values: np.ndarray) -> float:
+    # Mesma conta de pandas.Series.std(ddof=1).
+    count = len(values)
+
+    if count < 2:
+        return np.nan
+
+    mean = values.sum(dtype=np.float64) / count
+
+    return np.sqrt(((mean - values) ** 2).sum(dtype=np.float64) / (count - 1))
+
+
+def _max_drawdown_from_array(values: np.ndarray) -> float | None:
+    values = values[~np.isnan(values)]
+
+    if len(values) == 0:
+        return None
+
+    running_max = np.maximum.accumulate(values)
+
+    return (values / running_max - 1).min()
+
+
+def _risk_metrics_from_array(
+    returns: np.ndarray,
+    annual_return: float,
+    risk_free_rate: float | None,
+    max_drawdown: float | None,
+) -> dict:
+    """
+    Versão NumPy de _risk_metrics_from_returns.
+    """
+
+    returns = returns[~np.isnan(returns)]
+
+    if len(returns) == 0:
+        return _risk_metrics_from_returns(
+            pd.Series(dtype="float64"),
+            annual_return,
+            risk_free_rate,
+            max_drawdown,
+        )
+
+    volatility = _std(returns) * np.sqrt(TRADING_DAYS_PER_YEAR)
+
+    best_day = returns.max()
+    worst_day = returns.min()
+    positive_days_ratio = (returns > 0).mean()
+
+    if risk_free_rate is not None:
+        daily_risk_free = (1 + risk_free_rate) ** (1 / TRADING_DAYS_PER_YEAR) - 1
+        downside_returns = returns - daily_risk_free
+    else:
+        downside_returns = returns
+
+    downside_returns = downside_returns[downside_returns < 0]
+
+    if len(downside_returns) >= 2:
+        downside_volatility = _std(downside_returns) * np.sqrt(
+            TRADING_DAYS_PER_YEAR
+        )
+    else:
+        downside_volatility = None
+
+    if risk_free_rate is not None and volatility != 0:
+        sharpe = (annual_return - risk_free_rate) / volatility
+    else:
+        sharpe = None
+
+    if (
+        risk_free_rate is not None
+        and downside_volatility is not None
+        and downside_volatility != 0
+    ):
+        sortino = (annual_return - risk_free_rate) / downside_volatility
+    else:
+        sortino = None
+
+    if max_drawdown is not None and max_drawdown < 0:
+        calmar = annual_return / abs(max_drawdown)
+    else:
+        calmar = None
+
+    if volatility != 0:
+        return_volatility = annual_return / volatility
+    else:
+        return_volatility = None
+
+    return {
+        "volatility": volatility,
+        "downside_volatility": downside_volatility,
+        "sharpe": sharpe,
+        "sortino": sortino,
+        "calmar": calmar,
+        "return_volatility": return_volatility,
+        "best_day": best_day,
+        "worst_day": worst_day,
+        "positive_days_ratio": positive_days_ratio,
+    }
+
+
+def metrics_for_period_arrays(
+    arrays: HistoryArrays,
+    years: int,
+    risk_free_rate: float | None = None,
+) -> dict:
+    """
+    Mesmo resultado de calculate_metrics_for_period, a partir de arrays já
+    preparados por prepare_history_arrays.
+    """
+
+    result = _empty_metrics_result()
+
+    start = _period_start(arrays, years)
+
+    if start is None or len(arrays.close) - start < 2:
+        return result
+
+    dates = arrays.dates[start:]
+    close = arrays.close[start:]
+    dividend = arrays.dividend[start:]
+
+    elapsed = pd.Timestamp(dates[-1]) - pd.Timestamp(dates[0])
+    actual_years = elapsed.days / 365.25
+
+    if actual_years <= 0:
+        return result
+
+    initial_close = close[0]
+    final_close = close[-1]
+
+    if initial_close <= 0:
+        return result
+
+    # Preço
+    price_accumulated_return = final_close / initial_close - 1
+    price_cagr = (final_close / initial_close) ** (1 / actual_years) - 1
+
+    price_returns = arrays.price_returns[start:]
+    price_returns = price_returns[~np.isnan(price_returns)]
+
+    price_max_drawdown = _max_drawdown_from_array(close)
+
+    price_risk = _risk_metrics_from_array(
+        returns=price_returns,
+        annual_return=price_cagr,
+        risk_free_rate=risk_free_rate,
+        max_drawdown=price_max_drawdown,
+    )
+
+    # Liquidez
+    average_daily_liquidity = arrays.financial_volume[start:].mean()
+
+    # Dividendos simples
+    accumulated_dividends = dividend.sum()
+
+    historical_dividend_yield = accumulated_dividends / initial_close
+
+    simple_total_return = (
+        final_close + accumulated_dividends
+    ) / initial_close - 1
+
+    simple_total_cagr = (
+        (final_close + accumulated_dividends) / initial_close
+    ) ** (1 / actual_years) - 1
+
+    # Retorno total reinvestido
+    total_returns = arrays.total_returns[start:]
+    total_returns = total_returns[~np.isnan(total_returns)]
+
+    if len(total_returns) == 0:
+        total_accumulated_return = None
+        total_cagr = None
+        total_max_drawdown = None
+
+        total_risk = _risk_metrics_from_returns(
+            pd.Series(dtype="float64"),
+            None,
+            risk_free_rate,
+            None,
+        )
+
+    else:
+        total_factor = (1 + total_returns).prod()
+
+        total_accumulated_return = total_factor - 1
+        total_cagr = total_factor ** (1 / actual_years) - 1
+
+        total_index = np.cumprod(1 + total_returns)
+
+        total_max_drawdown = _max_drawdown_from_array(total_index)
+
+        total_risk = _risk_metrics_from_array(
+            returns=total_returns,
+            annual_return=total_cagr,
             risk_free_rate=risk_free_rate,
+            max_drawdown=total_max_drawdown,
         )
 
-    rows = [
-        "Histórico Válido",
-        "Anos de Histórico no Período",
+    result.update(
+        {
+            "valid": True,
+            "history_years": actual_years,
 
-        "Retorno Acumulado Preço",
-        "CAGR Preço",
-        "Volatilidade Preço Anualizada",
-        "Volatilidade Negativa Preço Anualizada",
-        "Drawdown Máximo Preço",
+            "Retorno Acumulado Preço": price_accumulated_return,
+            "CAGR Preço": price_cagr,
+            "Volatilidade Preço Anualizada": price_risk["volatility"],
+            "Volatilidade Negativa Preço Anualizada": price_risk["downside_volatility"],
+            "Drawdown Máximo Preço": price_max_drawdown,
 
-        "Liquidez Média Diária",
+            "Liquidez Média Diária": average_daily_liquidity,
 
-        "Dividendos Acumulados por Ação",
-        "Dividend Yield Histórico Aproximado",
+            "Dividendos Acumulados por Ação": accumulated_dividends,
+            "Dividend Yield Histórico Aproximado": historical_dividend_yield,
 
-        "Retorno Acumulado com Dividendos Simples",
-        "CAGR com Dividendos Simples",
+            "Retorno Acumulado com Dividendos Simples": simple_total_return,
+            "CAGR com Dividendos Simples": simple_total_cagr,
+
+            "Retorno Total Reinvestido": total_accumulated_return,
+            "CAGR Total Reinvestido": total_cagr,
+            "Volatilidade Total Anualizada": total_risk["volatility"],
+            "Volatilidade Negativa Total Anualizada": total_risk["downside_volatility"],
+            "Drawdown Máximo Total": total_max_drawdown,
 
-        "Retorno Total Reinvestido",
-        "CAGR Total Reinvestido",
-        "Volatilidade Total Anualizada",
-        "Volatilidade Negativa Total Anualizada",
-        "Drawdown Máximo Total",
+            "SELIC Anualizada": risk_free_rate,
 
-        "SELIC Anualizada",
+            "Sharpe Preço": price_risk["sharpe"],
+            "Sortino Preço": price_risk["sortino"],
+            "Calmar Preço": price_risk["calmar"],
+            "Retorno/Volatilidade Preço": price_risk["return_volatility"],
 
-        "Sharpe Preço",
-        "Sortino Preço",
-        "Calmar Preço",
-        "Retorno/Volatilidade Preço",
+            "Sharpe Total": total_risk["sharpe"],
+            "Sortino Total": total_risk["sortino"],
+            "Calmar Total": total_risk["calmar"],
+            "Retorno/Volatilidade Total": total_risk["return_volatility"],
 
-        "Sharpe Total",
-        "Sortino Total",
-        "Calmar Total",
-        "Retorno/Volatilidade Total",
+            "Melhor Dia Preço": price_risk["best_day"],
+            "Pior Dia Preço": price_risk["worst_day"],
+            "% Dias Positivos Preço": price_risk["positive_days_ratio"],
 
-        "Melhor Dia Preço",
-        "Pior Dia Preço",
-        "% Dias Positivos Preço",
+            "Melhor Dia Total": total_risk["best_day"],
+            "Pior Dia Total": total_risk["worst_day"],
+            "% Dias Positivos Total": total_risk["positive_days_ratio"],
+        }
+    )
 
-        "Melhor Dia Total",
-        "Pior Dia Total",
-        "% Dias Positivos Total",
-    ]
+    return result
+
+
+METRIC_ROWS = [
+    "Histórico Válido",
+    "Anos de Histórico no Período",
+
+    "Retorno Acumulado Preço",
+    "CAGR Preço",
+    "Volatilidade Preço Anualizada",
+    "Volatilidade Negativa Preço Anualizada",
+    "Drawdown Máximo Preço",
+
+    "Liquidez Média Diária",
+
+    "Dividendos Acumulados por Ação",
+    "Dividend Yield Histórico Aproximado",
+
+    "Retorno Acumulado com Dividendos Simples",
+    "CAGR com Dividendos Simples",
 
-    output = pd.DataFrame(index=rows)
+    "Retorno Total Reinvestido",
+    "CAGR Total Reinvestido",
+    "Volatilidade Total Anualizada",
+    "Volatilidade Negativa Total Anualizada",
+    "Drawdown Máximo Total",
 
-    for label, metrics in metrics_by_period.items():
-        output.loc["Histórico Válido", label] = metrics["valid"]
-        output.loc["Anos de Histórico no Período", label] = metrics["history_years"]
+    "SELIC Anualizada",
 
-        for row in rows[2:]:
-            output.loc[row, label] = metrics[row]
+    "Sharpe Preço",
+    "Sortino Preço",
+    "Calmar Preço",
+    "Retorno/Volatilidade Preço",
+
+    "Sharpe Total",
+    "Sortino Total",
+    "Calmar Total",
+    "Retorno/Volatilidade Total",
+
+    "Melhor Dia Preço",
+    "Pior Dia Preço",
+    "% Dias Positivos Preço",
+
+    "Melhor Dia Total",
+    "Pior Dia Total",
+    "% Dias Positivos Total",
+]
+
+
+def _metrics_frame(metrics_by_period: dict[str, dict]) -> pd.DataFrame:
+    # Colunas object, como se cada célula fosse atribuída com .loc, mas sem
+    # o custo de uma atribuição por célula.
+    columns = {
+        label: pd.Series(
+            [
+                metrics["valid"],
+                metrics["history_years"],
+                *[metrics[row] for row in METRIC_ROWS[2:]],
+            ],
+            index=METRIC_ROWS,
+            dtype=object,
+        )
+        for label, metrics in metrics_by_period.items()
+    }
+
+    return pd.DataFrame(columns, index=METRIC_ROWS)
+
+
+def stock_metrics_by_period(
+    df: pd.DataFrame,
+    periods: list[PeriodConfig] | None = None,
+    risk_free_by_period: dict[str, float] | None = None,
+) -> pd.DataFrame:
+    """
+    Métricas de todos os períodos (linhas = métricas, colunas = períodos).
+
+    O histórico é preparado uma vez e cada período reaproveita os mesmos
+    arrays (ver metrics_for_period_arrays).
+    """
+
+    if periods is None:
+        periods = DEFAULT_PERIODS
+
+    arrays = prepare_history_arrays(df)
+
+    metrics_by_period = {}
+
+    for period in periods:
+        risk_free_rate = None
+
+        if risk_free_by_period is not None:
+            risk_free_rate = risk_free_by_period.get(period.label)
+
+        metrics_by_period[period.label] = metrics_for_period_arrays(
+            arrays,
+            years=period.years,
+            risk_free_rate=risk_free_rate,
+        )
 
-    return output
+    return _metrics_frame(metrics_by_period)
 
 def _risk_metrics_from_returns(
     returns: pd.Series,
@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 from pathlib import Path
 import base64
@@ -10,6 +11,19 @@ import pandas as pd
 import requests
 from dateutil.relativedelta import relativedelta
 
+from src.data.http_client import http_get
+from src.data.parquet_io import (
+    read_parquet_cached,
+    write_parquet_atomic,
+    write_parquet_if_changed,
+)
+from src.data.single_flight import SingleFlight, file_lock
+from src.data.trading_calendar import (
+    is_history_up_to_date,
+    last_trading_day_on_or_before,
+    latest_published_session,
+)
+
 YAHOO_CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart"
 
 B3_INDEX_DOWNLOAD_URL = (
@@ -17,6 +31,9 @@ B3_INDEX_DOWNLOAD_URL = (
     "indexStatisticsProxy/IndexCall/GetDownloadPortfolioDay"
 )
 
+# Downloads anuais da B3 feitos em paralelo numa carga a frio.
+IFIX_FETCH_WORKERS = 4
+
 BENCHMARK_TICKERS = {
     "IBOV": "^BVSP",
 }
@@ -192,7 +209,7 @@ def _fetch_benchmark_history_yahoo(
         "includeAdjustedClose": "true",
     }
 
-    response = requests.get(
+    response = http_get(
         url,
         params=params,
         timeout=30,
@@ -287,6 +304,23 @@ def _parse_b3_number(value) -> float | None:
         return None
 
 
+def _parse_b3_numbers(values: pd.Series) -> pd.Series:
+    """
+    Versão vetorizada de _parse_b3_number para uma coluna inteira.
+    """
+
+    text = values.astype(str).str.strip()
+
+    # B3 geralmente vem como 3.860,37.
+    has_comma = text.str.contains(",", regex=False)
+    text = text.where(
+        ~has_comma,
+        text.str.replace(".", "", regex=False).str.replace(",", ".", regex=False),
+    )
+
+    return pd.to_numeric(text, errors="coerce")
+
+
 def _encode_b3_payload(index: str, year: int, language: str = "pt-br") -> str:
     payload = {
         "index": index.upper(),
@@ -480,52 +514,60 @@ def _parse_ifix_download_table(df: pd.DataFrame, year: int) -> pd.DataFrame:
     if day_col is None:
         day_col = df.columns[0]
 
-    for _, row in df.iterrows():
-        day_raw = str(row[day_col]).strip()
-
-        # Pode vir como "1", "01", "1.0".
-        day_raw = day_raw.replace(".0", "")
+    month_columns = {}
 
-        if not re.fullmatch(r"\d{1,2}", day_raw):
+    for col in df.columns:
+        if col == day_col:
             continue
 
-        day = int(day_raw)
+        month = B3_MONTHS.get(_normalize_text(col))
 
-        for col in df.columns:
-            if col == day_col:
-                continue
+        if month is not None:
+            month_columns[col] = month
 
-            month = B3_MONTHS.get(_normalize_text(col))
+    if not month_columns:
+        return _empty_benchmark_history()
 
-            if month is None:
-                continue
+    # Pode vir como "1", "01", "1.0".
+    day_text = (
+        df[day_col]
+        .astype(str)
+        .str.strip()
+        .str.replace(".0", "", regex=False)
+    )
+    valid_days = day_text.str.fullmatch(r"\d{1,2}")
 
-            close = _parse_b3_number(row[col])
+    grid = df.loc[valid_days, list(month_columns)].copy()
+    grid.insert(0, "_day", day_text[valid_days].astype(int))
 
-            if close is None:
-                continue
+    # Dia x Mês -> uma linha por (dia, mês).
+    long = grid.melt(id_vars="_day", var_name="_month", value_name="_value")
 
-            try:
-                current_date = date(year, month, day)
-            except ValueError:
-                continue
-
-            rows.append(
-                {
-                    "date": pd.Timestamp(current_date),
-                    "open": close,
-                    "high": close,
-                    "low": close,
-                    "close": close,
-                    "adj_close": close,
-                    "volume": 0.0,
-                }
-            )
+    close = _parse_b3_numbers(long["_value"])
+
+    dates = pd.to_datetime(
+        pd.DataFrame(
+            {
+                "year": year,
+                "month": long["_month"].map(month_columns),
+                "day": long["_day"],
+            }
+        ),
+        errors="coerce",
+    ).astype("datetime64[s]")
+
+    out = pd.DataFrame({"date": dates, "close": close}).dropna()
 
-    if not rows:
+    if out.empty:
         return _empty_benchmark_history()
 
-    return _standardize_benchmark_df(pd.DataFrame(rows))
+    out["open"] = out["close"]
+    out["high"] = out["close"]
+    out["low"] = out["close"]
+    out["adj_close"] = out["close"]
+    out["volume"] = 0.0
+
+    return _standardize_benchmark_df(out)
 
 
 def _save_b3_debug_response(
@@ -550,7 +592,7 @@ def _fetch_ifix_b3_year(year: int) -> pd.DataFrame:
     encoded = _encode_b3_payload("IFIX", year, language="pt-br")
     url = f"{B3_INDEX_DOWNLOAD_URL}/{encoded}"
 
-    response = requests.get(
+    response = http_get(
         url,
         timeout=30,
         headers={
@@ -584,22 +626,71 @@ def _fetch_ifix_b3_year(year: int) -> pd.DataFrame:
     return df
 
 
+def _is_closed_year(year: int) -> bool:
+    """
+    Um ano está fechado quando o seu último pregão já foi publicado pela
+    B3; a partir daí o arquivo anual não muda mais.
+    """
+
+    last_session = last_trading_day_on_or_before(date(year, 12, 31))
+
+    return latest_published_session("b3") >= last_session
+
+
+def _ifix_year_path(year: int, storage_dir: str | Path) -> Path:
+    return Path(storage_dir) / "IFIX" / "years" / f"{year}.parquet"
+
+
+def _load_ifix_year(year: int, storage_dir: str | Path) -> pd.DataFrame:
+    """
+    Ano do IFIX: anos fechados vêm do cache permanente em disco; o ano em
+    aberto (e anos fechados ainda não baixados) vêm da B3.
+    """
+
+    path = _ifix_year_path(year, storage_dir)
+    closed = _is_closed_year(year)
+
+    if closed and path.exists():
+        return read_parquet_cached(path)
+
+    df = _fetch_ifix_b3_year(year)
+
+    if closed and not df.empty:
+        write_parquet_atomic(df, path)
+
+    return df
+
+
 def _fetch_ifix_history_b3(
         initial_date: date,
         final_date: date,
+        storage_dir: str | Path = "storage/benchmarks",
 ) -> pd.DataFrame:
+    years = list(range(initial_date.year, final_date.year + 1))
+
     frames = []
     errors = []
 
-    for year in range(initial_date.year, final_date.year + 1):
-        try:
-            df_year = _fetch_ifix_b3_year(year)
+    def load(year: int) -> pd.DataFrame:
+        return _load_ifix_year(year, storage_dir)
+
+    workers = max(1, min(IFIX_FETCH_WORKERS, len(years)))
+
+    with ThreadPoolExecutor(
+        max_workers=workers,
+        thread_name_prefix="ifix-b3",
+    ) as executor:
+        futures = [(year, executor.submit(load, year)) for year in years]
+
+        for year, future in futures:
+            try:
+                df_year = future.result()
 
-            if not df_year.empty:
-                frames.append(df_year)
+                if not df_year.empty:
+                    frames.append(df_year)
 
-        except Exception as exc:
-            errors.append(f"{year}: {exc}")
+            except Exception as exc:
+                errors.append(f"{year}: {exc}")
 
     if not frames:
         print()
@@ -627,8 +718,15 @@ def _benchmark_history_ifix_b3(
         years: int = 10,
         final_date: date | None = None,
         storage_dir: str | Path = "storage/benchmarks",
-        overlap_days: int = 15,
 ) -> pd.DataFrame:
+    """
+    IFIX pela B3, montado a partir dos arquivos anuais.
+
+    Anos fechados ficam em cache permanente (IFIX/years/<ano>.parquet), então
+    uma atualização a quente faz uma única requisição (o ano em aberto) e
+    uma carga a frio baixa os anos em paralelo.
+    """
+
     if final_date is None:
         final_date = date.today()
 
@@ -637,31 +735,35 @@ def _benchmark_history_ifix_b3(
     path = Path(storage_dir) / "IFIX" / "history.parquet"
     path.parent.mkdir(parents=True, exist_ok=True)
 
+    # Conteúdo atual do disco, para só reescrever se algo mudar.
+    stored = None
+
     if path.exists():
-        df_old = pd.read_parquet(path)
+        stored = read_parquet_cached(path)
+        df_old = stored.copy()
         df_old = _standardize_benchmark_df(df_old)
 
         df_old = df_old[df_old["date"] >= pd.Timestamp(initial_date)]
 
-        # Se veio aquele arquivo ruim com uma ou poucas linhas, refaz tudo.
-        if len(df_old) < 200:
-            df_old = _empty_benchmark_history()
-            delta_initial_date = initial_date
-
-        elif df_old.empty:
-            delta_initial_date = initial_date
+        last_saved_date = None
 
-        else:
+        if not df_old.empty:
             last_saved_date = df_old["date"].max().date()
-            delta_initial_date = last_saved_date - timedelta(days=overlap_days)
 
-            if delta_initial_date < initial_date:
-                delta_initial_date = initial_date
+        up_to_date = is_history_up_to_date(
+            last_saved_date,
+            "b3",
+            final_date=final_date,
+        )
 
-        if delta_initial_date <= final_date:
+        if not up_to_date:
+            # A janela inteira é remontada: anos fechados vêm do cache
+            # anual e só o ano em aberto vai à B3. Um ano que falhar mantém
+            # as linhas que já estavam salvas.
             df_new = _fetch_ifix_history_b3(
-                initial_date=delta_initial_date,
+                initial_date=initial_date,
                 final_date=final_date,
+                storage_dir=storage_dir,
             )
 
             df = pd.concat([df_old, df_new], ignore_index=True)
@@ -673,10 +775,11 @@ def _benchmark_history_ifix_b3(
         df = _fetch_ifix_history_b3(
             initial_date=initial_date,
             final_date=final_date,
+            storage_dir=storage_dir,
         )
 
     if df.empty:
-        df.to_parquet(path, index=False)
+        write_parquet_if_changed(df, path, previous=stored)
         return df
 
     df = _standardize_benchmark_df(df)
@@ -688,7 +791,7 @@ def _benchmark_history_ifix_b3(
 
     df = _standardize_benchmark_df(df)
 
-    df.to_parquet(path, index=False)
+    write_parquet_if_changed(df, path, previous=stored)
 
     return df
 
@@ -697,6 +800,9 @@ def _benchmark_history_ifix_b3(
 # Função pública genérica
 # ==========================================================
 
+_benchmark_flights = SingleFlight()
+
+
 def benchmark_history(
         benchmark: str,
         years: int = 10,
@@ -704,6 +810,51 @@ def benchmark_history(
         final_date: date | None = None,
         storage_dir: str | Path = "storage/benchmarks",
         overlap_days: int = 15,
+) -> pd.DataFrame:
+    """
+    Busca/atualiza o histórico de um benchmark (IBOV pela Yahoo, IFIX pela B3).
+
+    Chamadas concorrentes para o mesmo benchmark compartilham uma única
+    atualização, e um lock de arquivo impede que dois processos reescrevam
+    o mesmo Parquet ao mesmo tempo.
+    """
+
+    benchmark_name = benchmark.strip().upper()
+
+    if final_date is None:
+        final_date = date.today()
+
+    def update() -> pd.DataFrame:
+        lock_path = Path(storage_dir) / "locks" / f"{benchmark_name}.lock"
+
+        with file_lock(lock_path):
+            return _update_benchmark_history(
+                benchmark=benchmark_name,
+                years=years,
+                interval=interval,
+                final_date=final_date,
+                storage_dir=storage_dir,
+                overlap_days=overlap_days,
+            )
+
+    key = (
+        str(Path(storage_dir).resolve()),
+        benchmark_name,
+        years,
+        interval,
+        final_date,
+    )
+
+    return _benchmark_flights.do(key, update)
+
+
+def _update_benchmark_history(
+        benchmark: str,
+        years: int,
+        interval: str,
+        final_date: date,
+        storage_dir: str | Path,
+        overlap_days: int,
 ) -> pd.DataFrame:
     benchmark_name = benchmark.strip().upper()
 
@@ -712,26 +863,27 @@ def benchmark_history(
             years=years,
             final_date=final_date,
             storage_dir=storage_dir,
-            overlap_days=overlap_days,
         )
 
     ticker = normalize_benchmark_ticker(benchmark_name)
 
-    if final_date is None:
-        final_date = date.today()
-
     initial_date = final_date - relativedelta(years=years)
 
     path = Path(storage_dir) / benchmark_name / "history.parquet"
     path.parent.mkdir(parents=True, exist_ok=True)
 
+    # Conteúdo atual do disco, para só reescrever se algo mudar.
+    stored = None
+
     if path.exists():
-        df_old = pd.read_parquet(path)
+        stored = read_parquet_cached(path)
+        df_old = stored.copy()
         df_old = _standardize_benchmark_df(df_old)
 
         df_old = df_old[df_old["date"] >= pd.Timestamp(initial_date)]
 
         if df_old.empty:
+            last_saved_date = None
             delta_initial_date = initial_date
         else:
             last_saved_date = df_old["date"].max().date()
@@ -741,7 +893,13 @@ def benchmark_history(
             if delta_initial_date < initial_date:
                 delta_initial_date = initial_date
 
-        if delta_initial_date <= final_date:
+        up_to_date = is_history_up_to_date(
+            last_saved_date,
+            "yahoo",
+            final_date=final_date,
+        )
+
+        if delta_initial_date <= final_date and not up_to_date:
             df_new = _fetch_benchmark_history_yahoo(
                 benchmark=ticker,
                 initial_date=delta_initial_date,
@@ -763,7 +921,7 @@ def benchmark_history(
         )
 
     if df.empty:
-        df.to_parquet(path, index=False)
+        write_parquet_if_changed(df, path, previous=stored)
         return df
 
     df = _standardize_benchmark_df(df)
@@ -775,7 +933,7 @@ def benchmark_history(
 
     df = _standardize_benchmark_df(df)
 
-    df.to_parquet(path, index=False)
+    write_parquet_if_changed(df, path, previous=stored)
 
     return df
 
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Hashable
+import threading
+
+import pandas as pd
+
+
+# Limite padrão de memória do cache de históricos do processo.
+DEFAULT_HISTORY_CACHE_BYTES = 256 * 1024 * 1024
+
+
+@dataclass
+class HistoryCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+
+def _frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class HistoryCache:
+    """
+    LRU de DataFrames compartilhado pelo processo, limitado em bytes.
+
+    Cada entrada é identificada por um nome (ex: o ticker) e uma versão do
+    armazenamento (versão do manifest, mtime/tamanho do arquivo). Ao gravar
+    uma versão nova, as versões antigas do mesmo nome saem do cache.
+
+    Os DataFrames devolvidos são cópias rasas: com Copy-on-Write, alterar a
+    cópia não altera a entrada do cache.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_HISTORY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+
+        self._entries: OrderedDict[tuple, tuple[pd.DataFrame, int]] = OrderedDict()
+        self._keys_by_name: dict[Hashable, set[tuple]] = {}
+        self._stats = HistoryCacheStats()
+        self._lock = threading.Lock()
+
+    def get(
+            self,
+            name: Hashable,
+            version: Hashable,
+            *params: Hashable,
+    ) -> pd.DataFrame | None:
+        key = (name, version, *params)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self._stats.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+
+            return entry[0].copy(deep=False)
+
+    def put(
+            self,
+            name: Hashable,
+            version: Hashable,
+            *params: Hashable,
+            value: pd.DataFrame,
+    ) -> pd.DataFrame:
+        key = (name, version, *params)
+        size = _frame_bytes(value)
+
+        with self._lock:
+            for old_key in list(self._keys_by_name.get(name, ())):
+                if old_key[1] != version:
+                    self._remove(old_key)
+
+            if key in self._entries:
+                self._remove(key)
+
+            if size <= self.max_bytes:
+                self._entries[key] = (value, size)
+                self._keys_by_name.setdefault(name, set()).add(key)
+                self._stats.bytes += size
+
+                while self._stats.bytes > self.max_bytes:
+                    oldest = next(iter(self._entries))
+                    self._remove(oldest)
+                    self._stats.evictions += 1
+
+            self._stats.entries = len(self._entries)
+
+        return value.copy(deep=False)
+
+    def _remove(self, key: tuple) -> None:
+        _, size = self._entries.pop(key)
+        self._stats.bytes -= size
+
+        keys = self._keys_by_name.get(key[0])
+
+        if keys is not None:
+            keys.discard(key)
+
+            if not keys:
+                del self._keys_by_name[key[0]]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_name.clear()
+            self._stats.bytes = 0
+            self._stats.entries = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return asdict(self._stats)
+
+
+HISTORY_CACHE = HistoryCache()
+
+
+def history_cache_stats() -> dict[str, int]:
+    return HISTORY_CACHE.stats()
@@ -0,0 +1,202 @@
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from uuid import uuid4
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from src.data.market_store import (
+    DEFAULT_MARKET_STORE_DIR,
+    PRICE_COLUMNS,
+    load_manifest,
+    read_ticker_history,
+)
+
+
+# Camada quente: um arquivo Arrow IPC (Feather v2) sem compressão por ticker,
+# aberto via memory map. As colunas viram arrays NumPy que apontam direto
+# para o page cache do sistema operacional; vários processos (workers do
+# Streamlit, ranking na CLI) compartilham as mesmas páginas em vez de cada
+# um decodificar o Parquet para a sua própria memória.
+
+HOT_DIR_NAME = "hot"
+VERSION_METADATA_KEY = b"store_version"
+
+
+@dataclass(frozen=True)
+class HotHistory:
+    ticker: str
+    version: int
+    columns: dict[str, np.ndarray]
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self.columns["date"]
+
+    @property
+    def close(self) -> np.ndarray:
+        return self.columns["close"]
+
+    @property
+    def dividend(self) -> np.ndarray:
+        return self.columns["dividend"]
+
+    @property
+    def financial_volume(self) -> np.ndarray:
+        return self.columns["financial_volume"]
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def to_frame(
+            self,
+            start: date | pd.Timestamp | None = None,
+            end: date | pd.Timestamp | None = None,
+    ) -> pd.DataFrame:
+        """
+        DataFrame no formato de daily_stock_history, sem copiar os dados.
+        """
+
+        begin = 0
+        finish = len(self)
+
+        if start is not None:
+            begin = np.searchsorted(
+                self.dates,
+                pd.Timestamp(start).to_datetime64(),
+                side="left",
+            )
+
+        if end is not None:
+            finish = np.searchsorted(
+                self.dates,
+                pd.Timestamp(end).to_datetime64(),
+                side="right",
+            )
+
+        return pd.DataFrame(
+            {
+                col: self.columns[col][begin:finish]
+                for col in PRICE_COLUMNS
+            },
+            copy=False,
+        )
+
+
+def _hot_path(ticker: str, store_dir: str | Path) -> Path:
+    return Path(store_dir) / HOT_DIR_NAME / f"{ticker}.arrow"
+
+
+def write_hot_history(
+        ticker: str,
+        history: pd.DataFrame,
+        version: int,
+        store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
+) -> Path:
+    path = _hot_path(ticker, store_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    history = history.sort_values("date")
+
+    arrays = {
+        "date": pa.array(
+            pd.to_datetime(history["date"]).to_numpy(dtype="datetime64[ns]")
+        ),
+    }
+
+    for col in PRICE_COLUMNS[1:]:
+        values = pd.to_numeric(history[col], errors="coerce").to_numpy(
+            dtype="float64",
+            na_value=np.nan,
+        )
+
+        # from_pandas=False mantém NaN como NaN (e não null); sem bitmap
+        # de nulos a leitura pode ser zero-copy.
+        arrays[col] = pa.array(values, from_pandas=False)
+
+    table = pa.table(arrays).replace_schema_metadata(
+        {VERSION_METADATA_KEY: str(version).encode("utf-8")}
+    )
+
+    tmp_path = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+
+    try:
+        with pa.OSFile(str(tmp_path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                # Um único record batch: cada coluna fica contígua no arquivo.
+                writer.write_table(table, max_chunksize=max(len(table), 1))
+
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    return path
+
+
+def open_hot_history(
+        ticker: str,
+        store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
+) -> HotHistory | None:
+    """
+    Abre o arquivo quente do ticker via memory map, sem verificar versão.
+    """
+
+    path = _hot_path(ticker, store_dir)
+
+    if not path.exists():
+        return None
+
+    source = pa.memory_map(str(path), "r")
+    reader = pa.ipc.open_file(source)
+
+    metadata = reader.schema.metadata or {}
+    version = int(metadata.get(VERSION_METADATA_KEY, b"-1"))
+
+    # Lendo de um memory map, os buffers das colunas apontam para o arquivo.
+    table = reader.read_all()
+
+    columns = {
+        name: table.column(name).combine_chunks().to_numpy(
+            zero_copy_only=len(table) > 0,
+        )
+        for name in PRICE_COLUMNS
+    }
+
+    return HotHistory(ticker=ticker, version=version, columns=columns)
+
+
+def load_hot_history(
+        ticker: str,
+        version: int | None = None,
+        store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
+) -> HotHistory | None:
+    """
+    Devolve a camada quente do ticker na versão atual do store,
+    reconstruindo o arquivo a partir do Parquet se ele estiver
+    desatualizado.
+
+    Retorna None se o ticker não existir no store.
+    """
+
+    if version is None:
+        entry = load_manifest(store_dir)["tickers"].get(ticker)
+
+        if entry is None:
+            return None
+
+        version = entry["version"]
+
+    hot = open_hot_history(ticker, store_dir)
+
+    if hot is not None and hot.version == version:
+        return hot
+
+    history = read_ticker_history(ticker, store_dir=store_dir)
+
+    write_hot_history(ticker, history, version, store_dir)
+
+    return open_hot_history(ticker, store_dir)
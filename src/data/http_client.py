@@ -0,0 +1,373 @@
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+DEFAULT_TIMEOUT = 30
+
+# Quantos hosts diferentes mantêm pool aberto e quantas conexões keep-alive
+# cada pool guarda.
+POOL_CONNECTIONS = 8
+POOL_MAXSIZE = 16
+
+# Limite de requisições simultâneas por host. A Yahoo começa a devolver 429
+# quando recebe muitas conexões em paralelo do mesmo IP.
+MAX_CONCURRENT_REQUESTS_PER_HOST = 4
+
+MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+RETRY_AFTER_MAX_SECONDS = 120.0
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class HttpStats:
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    bytes_received: int = 0
+
+
+# Modos:
+# - "live": vai à rede normalmente;
+# - "record": vai à rede e grava cada resposta em 'cassette_dir';
+# - "replay": responde só com o que foi gravado, sem rede.
+HTTP_MODES = {"live", "record", "replay"}
+
+# Headers guardados junto com as respostas gravadas.
+RECORDED_HEADERS = ["Content-Type", "Retry-After"]
+
+
+@dataclass
+class HttpConfig:
+    mode: str = "live"
+    cassette_dir: Path | None = None
+    # host -> URL base que o substitui (ex: servidor local de testes).
+    upstream_overrides: dict[str, str] = field(default_factory=dict)
+
+
+_config = HttpConfig()
+_stats = HttpStats()
+_stats_lock = threading.Lock()
+
+# O adapter guarda os pools de conexão (urllib3), que são thread-safe.
+# Cada thread tem a sua Session (cookies/headers), mas todas compartilham
+# o mesmo adapter e, portanto, as mesmas conexões keep-alive.
+_adapter = HTTPAdapter(
+    pool_connections=POOL_CONNECTIONS,
+    pool_maxsize=POOL_MAXSIZE,
+    max_retries=0,
+)
+_local = threading.local()
+
+_host_semaphores: dict[str, threading.BoundedSemaphore] = {}
+_host_semaphores_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    session = getattr(_local, "session", None)
+
+    if session is None:
+        session = requests.Session()
+        session.mount("https://", _adapter)
+        session.mount("http://", _adapter)
+        _local.session = session
+
+    return session
+
+
+def _host_semaphore(url: str) -> threading.BoundedSemaphore:
+    host = urlsplit(url).netloc
+
+    with _host_semaphores_lock:
+        semaphore = _host_semaphores.get(host)
+
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(
+                MAX_CONCURRENT_REQUESTS_PER_HOST
+            )
+            _host_semaphores[host] = semaphore
+
+    return semaphore
+
+
+def _count(**increments: int) -> None:
+    with _stats_lock:
+        for name, value in increments.items():
+            setattr(_stats, name, getattr(_stats, name) + value)
+
+
+def http_stats() -> dict[str, int]:
+    with _stats_lock:
+        return asdict(_stats)
+
+
+def reset_http_stats() -> None:
+    global _stats
+
+    with _stats_lock:
+        _stats = HttpStats()
+
+
+def configure_http(
+        mode: str = "live",
+        cassette_dir: str | Path | None = None,
+        upstream_overrides: dict[str, str] | None = None,
+) -> None:
+    """
+    Define como http_get atende as requisições.
+
+    Ex: gravar uma atualização real e depois repeti-la sem rede:
+
+        configure_http("record", "storage/cassettes")
+        configure_http("replay", "storage/cassettes")
+
+    Ou apontar Yahoo/BCB/B3 para o servidor local (src.data.standin_server):
+
+        configure_http(upstream_overrides={
+            "query1.finance.yahoo.com": "http://127.0.0.1:8765",
+        })
+    """
+
+    global _config
+
+    if mode not in HTTP_MODES:
+        raise ValueError(f"Modo HTTP inválido: {mode}")
+
+    if mode != "live" and cassette_dir is None:
+        raise ValueError(f"O modo {mode} precisa de um cassette_dir.")
+
+    _config = HttpConfig(
+        mode=mode,
+        cassette_dir=Path(cassette_dir) if cassette_dir is not None else None,
+        upstream_overrides=dict(upstream_overrides or {}),
+    )
+
+
+def request_key(url: str, params: dict | None = None) -> str:
+    """
+    Identificador de uma requisição gravada: caminho + query ordenada.
+
+    O host fica de fora, para que uma gravação feita contra a fonte real
+    também sirva ao servidor local.
+    """
+
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+
+    if params:
+        query.extend((str(k), str(v)) for k, v in params.items())
+
+    canonical = parts.path + "?" + "&".join(
+        f"{k}={v}" for k, v in sorted(query)
+    )
+
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def _apply_override(url: str) -> str:
+    parts = urlsplit(url)
+    base = _config.upstream_overrides.get(parts.netloc)
+
+    if base is None:
+        return url
+
+    base_parts = urlsplit(base)
+
+    return urlunsplit(
+        (
+            base_parts.scheme,
+            base_parts.netloc,
+            base_parts.path.rstrip("/") + parts.path,
+            parts.query,
+            parts.fragment,
+        )
+    )
+
+
+def _cassette_path(key: str) -> Path:
+    return _config.cassette_dir / f"{key}.json"
+
+
+def _record_response(key: str, response: requests.Response) -> None:
+    path = _cassette_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    payload = {
+        "url": response.url,
+        "status": response.status_code,
+        "headers": {
+            name: response.headers[name]
+            for name in RECORDED_HEADERS
+            if name in response.headers
+        },
+        "body": base64.b64encode(response.content).decode("ascii"),
+    }
+
+    path.write_text(json.dumps(payload, indent=1), encoding="utf-8")
+
+
+def load_recorded_response(
+        cassette_dir: str | Path,
+        key: str,
+) -> dict | None:
+    """
+    Lê uma resposta gravada: {"url", "status", "headers", "body"} com o
+    corpo já decodificado em bytes. Retorna None se não houver gravação.
+    """
+
+    path = Path(cassette_dir) / f"{key}.json"
+
+    if not path.exists():
+        return None
+
+    payload = json.loads(path.read_text(encoding="utf-8"))
+    payload["body"] = base64.b64decode(payload["body"])
+
+    return payload
+
+
+def _replay_response(key: str, url: str) -> requests.Response:
+    payload = load_recorded_response(_config.cassette_dir, key)
+
+    if payload is None:
+        raise RuntimeError(f"Sem resposta gravada para {url}")
+
+    response = requests.Response()
+    response.status_code = payload["status"]
+    response.headers = CaseInsensitiveDict(payload["headers"])
+    response.url = payload["url"]
+    response._content = payload["body"]
+    response.encoding = requests.utils.get_encoding_from_headers(
+        response.headers
+    )
+
+    return response
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    """
+    Retry-After pode vir em segundos ("120") ou como data HTTP.
+    """
+
+    if not value:
+        return None
+
+    value = value.strip()
+
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _backoff_delay(
+        attempt: int,
+        response: requests.Response | None = None,
+) -> float:
+    if response is not None:
+        retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+
+        if retry_after is not None:
+            return min(retry_after, RETRY_AFTER_MAX_SECONDS)
+
+    # Backoff exponencial com "full jitter": espalha as novas tentativas
+    # das várias threads em vez de todas voltarem ao mesmo tempo.
+    ceiling = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)
+
+    return random.uniform(0, ceiling)
+
+
+def http_get(
+        url: str,
+        params: dict | None = None,
+        headers: dict | None = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_retries: int = MAX_RETRIES,
+) -> requests.Response:
+    """
+    GET com conexão reaproveitada e novas tentativas.
+
+    - reaproveita conexões keep-alive por host;
+    - limita requisições simultâneas por host;
+    - repete em 429/5xx e erros de conexão, com backoff exponencial e jitter;
+    - respeita o header Retry-After;
+    - grava/repete respostas e troca o host de origem conforme
+      configure_http.
+
+    A última resposta é devolvida mesmo que não seja 'ok'; cada chamador
+    continua tratando os códigos de erro da sua fonte.
+    """
+
+    config = _config
+    key = request_key(url, params)
+
+    if config.mode == "replay":
+        response = _replay_response(key, url)
+        _count(requests=1, bytes_received=len(response.content))
+        return response
+
+    url = _apply_override(url)
+
+    session = get_session()
+    attempt = 0
+
+    while True:
+        _count(requests=1)
+
+        try:
+            with _host_semaphore(url):
+                response = session.get(
+                    url,
+                    params=params,
+                    headers=headers,
+                    timeout=timeout,
+                )
+
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt >= max_retries:
+                _count(failures=1)
+                raise
+
+            _count(retries=1)
+            time.sleep(_backoff_delay(attempt))
+            attempt += 1
+            continue
+
+        _count(bytes_received=len(response.content))
+
+        if response.status_code in RETRY_STATUS_CODES and attempt < max_retries:
+            _count(retries=1)
+            time.sleep(_backoff_delay(attempt, response))
+            attempt += 1
+            continue
+
+        if not response.ok:
+            _count(failures=1)
+
+        if config.mode == "record":
+            _record_response(key, response)
+
+        return response
@@ -0,0 +1,610 @@
+from datetime import date
+from pathlib import Path
+from uuid import uuid4
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.data.parquet_io import frame_content_hash
+from src.data.single_flight import file_lock
+
+
+DEFAULT_MARKET_STORE_DIR = "storage/market"
+LEGACY_STOCKS_DIR = "storage/stocks"
+
+# Linhas por row group nos arquivos compactados. Como os arquivos são
+# ordenados por (ticker, date), row groups menores deixam o filtro por ticker
+# pular quase todo o arquivo usando só as estatísticas do Parquet.
+COMPACTED_ROW_GROUP_SIZE = 16_384
+
+# Acima deste número de deltas em uma partição, a próxima carga em lote
+# dispara a compactação.
+MAX_DELTA_FILES_PER_PARTITION = 64
+
+PRICE_COLUMNS = [
+    "date",
+    "open",
+    "high",
+    "low",
+    "close",
+    "adj_close",
+    "volume",
+    "financial_volume",
+    "dividend",
+]
+
+PRICE_SCHEMA = pa.schema(
+    [
+        ("ticker", pa.string()),
+        ("date", pa.timestamp("ns")),
+        ("open", pa.float64()),
+        ("high", pa.float64()),
+        ("low", pa.float64()),
+        ("close", pa.float64()),
+        ("adj_close", pa.float64()),
+        ("volume", pa.float64()),
+        ("financial_volume", pa.float64()),
+        ("dividend", pa.float64()),
+        # Momento da escrita. Na leitura, entre linhas repetidas de
+        # (ticker, date), vale a de maior versão.
+        ("_version", pa.int64()),
+    ]
+)
+
+_manifest_lock = threading.Lock()
+_manifest_memo: dict[Path, tuple[tuple[int, int], dict]] = {}
+
+
+def _prices_dir(store_dir: str | Path) -> Path:
+    return Path(store_dir) / "prices"
+
+
+def _manifest_path(store_dir: str | Path) -> Path:
+    return Path(store_dir) / "manifest.json"
+
+
+def _empty_prices() -> pd.DataFrame:
+    return PRICE_SCHEMA.empty_table().to_pandas()
+
+
+def _normalize_prices(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte um histórico para os tipos do schema do store.
+    """
+
+    df = df.copy()
+
+    for col in PRICE_COLUMNS:
+        if col not in df.columns:
+            df[col] = 0.0 if col == "dividend" else None
+
+    df["date"] = pd.to_datetime(df["date"]).astype("datetime64[ns]")
+
+    for col in PRICE_COLUMNS[1:]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+
+    return df
+
+
+# ==========================================================
+# Manifest
+# ==========================================================
+
+def _read_manifest_file(path: Path) -> dict:
+    if not path.exists():
+        return {"version": 0, "tickers": {}}
+
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def load_manifest(store_dir: str | Path = DEFAULT_MARKET_STORE_DIR) -> dict:
+    """
+    Manifest do store. O JSON só é relido quando o mtime/tamanho do arquivo
+    mudam; o dicionário devolvido é compartilhado e não deve ser alterado.
+    """
+
+    path = _manifest_path(store_dir)
+
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return {"version": 0, "tickers": {}}
+
+    signature = (stat.st_mtime_ns, stat.st_size)
+    memo = _manifest_memo.get(path)
+
+    if memo is not None and memo[0] == signature:
+        return memo[1]
+
+    manifest = _read_manifest_file(path)
+    _manifest_memo[path] = (signature, manifest)
+
+    return manifest
+
+
+def _save_manifest(manifest: dict, store_dir: str | Path) -> None:
+    path = _manifest_path(store_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def _update_manifest(
+        entries: dict[str, dict],
+        store_dir: str | Path,
+) -> int:
+    # O lock de thread evita disputa dentro do processo; o de arquivo, entre
+    # processos (CLI e Streamlit gravando ao mesmo tempo).
+    with _manifest_lock, file_lock(Path(store_dir) / "locks" / "manifest.lock"):
+        manifest = _read_manifest_file(_manifest_path(store_dir))
+        manifest["version"] += 1
+
+        for ticker, entry in entries.items():
+            manifest["tickers"][ticker] = {
+                **manifest["tickers"].get(ticker, {}),
+                **entry,
+                "version": manifest["version"],
+            }
+
+        _save_manifest(manifest, store_dir)
+
+        return manifest["version"]
+
+
+def mark_tickers_checked(
+        tickers: list[str],
+        session: date,
+        store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
+) -> None:
+    """
+    Registra que a fonte já foi consultada até o pregão 'session', mesmo
+    que não tenha devolvido nada novo (ativo deslistado ou suspenso, fonte
+    atrasada). Os dados não mudam, então a versão também não.
+    """
+
+    with _manifest_lock, file_lock(Path(store_dir) / "locks" / "manifest.lock"):
+        manifest = _read_manifest_file(_manifest_path(store_dir))
+        changed = False
+
+        for ticker in tickers:
+            entry = manifest["tickers"].get(ticker)
+
+            if entry is None:
+                continue
+
+            checked = entry.get("checked_session")
+
+            if checked is None or checked < session.isoformat():
+                entry["checked_session"] = session.isoformat()
+                changed = True
+
+        if changed:
+            _save_manifest(manifest, store_dir)
+
+
+def checked_through(entry: dict | None) -> date | None:
+    """
+    Último pregão que o store já cobre para o ticker: a última linha gravada
+    ou o último pregão consultado na fonte, o que for mais recente.
+    """
+
+    if entry is None:
+        return None
+
+    dates = [
+        value
+        for value in (entry.get("last_date"), entry.get("checked_session"))
+        if value is not None
+    ]
+
+    if not dates:
+        return None
+
+    return date.fromisoformat(max(dates))
+
+
+def _manifest_entry(history: pd.DataFrame) -> dict:
+    if history.empty:
+        return {"rows": 0, "first_date": None, "last_date": None, "hash": None}
+
+    dates = pd.to_datetime(history["date"])
+
+    return {
+        "rows": len(history),
+        "first_date": dates.min().date().isoformat(),
+        "last_date": dates.max().date().isoformat(),
+        "hash": frame_content_hash(history),
+    }
+
+
+# ==========================================================
+# Escrita
+# ==========================================================
+
+def _write_partition_file(
+        table: pa.Table,
+        path: Path,
+        row_group_size: int | None = None,
+) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Prefixo "." faz o pyarrow.dataset ignorar o arquivo até o rename.
+    tmp_path = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+
+    try:
+        pq.write_table(table, tmp_path, row_group_size=row_group_size)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def _write_delta(rows: pd.DataFrame, store_dir: str | Path) -> None:
+    """
+    Grava linhas novas/alteradas como arquivos delta, um por ano.
+    """
+
+    if rows.empty:
+        return
+
+    rows = rows.sort_values(["ticker", "date"]).reset_index(drop=True)
+    rows["_version"] = time.time_ns()
+
+    years = rows["date"].dt.year
+
+    for year, year_rows in rows.groupby(years, sort=True):
+        table = pa.Table.from_pandas(
+            year_rows[PRICE_SCHEMA.names],
+            schema=PRICE_SCHEMA,
+            preserve_index=False,
+        )
+
+        path = (
+            _prices_dir(store_dir)
+            / f"year={int(year)}"
+            / f"delta-{time.time_ns()}-{uuid4().hex[:8]}.parquet"
+        )
+
+        _write_partition_file(table, path)
+
+
+def _changed_rows(
+        history: pd.DataFrame,
+        previous: pd.DataFrame | None,
+) -> pd.DataFrame:
+    if previous is None or previous.empty:
+        return history
+
+    previous = _normalize_prices(previous)[PRICE_COLUMNS].drop_duplicates()
+
+    merged = history.merge(
+        previous,
+        on=PRICE_COLUMNS,
+        how="left",
+        indicator=True,
+    )
+
+    return merged.loc[
+        merged["_merge"] == "left_only",
+        PRICE_COLUMNS,
+    ].reset_index(drop=True)
+
+
+def write_ticker_history(
+        ticker: str,
+        history: pd.DataFrame,
+        previous: pd.DataFrame | None = None,
+        store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
+) -> bool:
+    """
+    Grava no store apenas as linhas de 'history' que não estão iguais em
+    'previous' (o que foi lido do store antes da atualização).
+
+    Retorna True se algo foi escrito.
+    """
+
+    history = _normalize_prices(history)[PRICE_COLUMNS]
+
+    changed = _changed_rows(history, previous)
+
+    if changed.empty:
+        return False
+
+    changed.insert(0, "ticker", ticker)
+
+    _write_delta(changed, store_dir)
+    _update_manifest({ticker: _manifest_entry(history)}, store_dir)
+
+    return True
+
+
+def write_histories(
+        histories: dict[str, pd.DataFrame],
+        store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
+) -> None:
+    """
+    Grava vários históricos completos de uma vez (ex: migração).
+    """
+
+    frames = []
+    entries = {}
+
+    for ticker, history in histories.items():
+        history = _normalize_prices(history)[PRICE_COLUMNS]
+
+        if history.empty:
+            continue
+
+        frames.append(history.assign(ticker=ticker))
+        entries[ticker] = _manifest_entry(history)
+
+    if not frames:
+        return
+
+    _write_delta(pd.concat(frames, ignore_index=True), store_dir)
+    _update_manifest(entries, store_dir)
+
+
+# ==========================================================
+# Leitura
+# ==========================================================
+
+def _build_filter(
+        tickers: list[str] | None,
+        start: date | pd.Timestamp | None,
+        end: date | pd.Timestamp | None,
+):
+    expression = None
+
+    def combine(current, new):
+        return new if current is None else current & new
+
+    if tickers is not None:
+        expression = combine(expression, ds.field("ticker").isin(list(tickers)))
+
+    if start is not None:
+        start = pd.Timestamp(start)
+        # Filtro na partição poda diretórios inteiros.
+        expression = combine(expression, ds.field("year") >= start.year)
+        expression = combine(
+            expression,
+            ds.field("date") >= pa.scalar(start.value, pa.timestamp("ns")),
+        )
+
+    if end is not None:
+        end = pd.Timestamp(end)
+        expression = combine(expression, ds.field("year") <= end.year)
+        expression = combine(
+            expression,
+            ds.field("date") <= pa.scalar(end.value, pa.timestamp("ns")),
+        )
+
+    return expression
+
+
+def _price_dataset(store_dir: str | Path) -> ds.Dataset | None:
+    path = _prices_dir(store_dir)
+
+    if not path.exists():
+        return None
+
+    return ds.dataset(
+        path,
+        format="parquet",
+        partitioning="hive",
+        schema=PRICE_SCHEMA.append(pa.field("year", pa.int32())),
+    )
+
+
+def read_histories(
+        tickers: list[str] | None = None,
+        start: date | pd.Timestamp | None = None,
+        end: date | pd.Timestamp | None = None,
+        columns: list[str] | None = None,
+        store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
+) -> pd.DataFrame:
+    """
+    Lê históricos do store em formato longo (ticker, date, ...), ordenados
+    por (ticker, date).
+
+    Os filtros de ticker/data e a seleção de colunas são empurrados para o
+    Parquet: partições e row groups fora do filtro nem são lidos.
+    """
+
+    if columns is None:
+        columns = PRICE_COLUMNS[1:]
+
+    read_columns = ["ticker", "date", "_version"] + [
+        col for col in columns if col not in {"ticker", "date"}
+    ]
+
+    expression = _build_filter(tickers, start, end)
+
+    # Uma compactação concorrente pode remover um arquivo entre a listagem
+    # e a leitura; nesse caso basta listar de novo.
+    for attempt in range(3):
+        dataset = _price_dataset(store_dir)
+
+        if dataset is None:
+            return _empty_prices()[["ticker", "date"] + read_columns[3:]]
+
+        try:
+            table = dataset.to_table(columns=read_columns, filter=expression)
+            break
+        except FileNotFoundError:
+            if attempt == 2:
+                raise
+
+    df = table.to_pandas()
+
+    df = (
+        df
+        .sort_values(["ticker", "date", "_version"])
+        .drop_duplicates(subset=["ticker", "date"], keep="last")
+        .drop(columns="_version")
+        .reset_index(drop=True)
+    )
+
+    return df
+
+
+def read_ticker_history(
+        ticker: str,
+        start: date | pd.Timestamp | None = None,
+        end: date | pd.Timestamp | None = None,
+        columns: list[str] | None = None,
+        store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
+) -> pd.DataFrame:
+    """
+    Histórico de um ticker no formato de daily_stock_history.
+    """
+
+    df = read_histories(
+        tickers=[ticker],
+        start=start,
+        end=end,
+        columns=columns,
+        store_dir=store_dir,
+    )
+
+    return df.drop(columns="ticker")
+
+
+# ==========================================================
+# Manutenção
+# ==========================================================
+
+def _partition_dirs(store_dir: str | Path) -> list[Path]:
+    path = _prices_dir(store_dir)
+
+    if not path.exists():
+        return []
+
+    return sorted(
+        child
+        for child in path.iterdir()
+        if child.is_dir() and child.name.startswith("year=")
+    )
+
+
+def _data_files(partition: Path) -> list[Path]:
+    return sorted(
+        child
+        for child in partition.iterdir()
+        if child.suffix == ".parquet" and not child.name.startswith(".")
+    )
+
+
+def needs_compaction(store_dir: str | Path = DEFAULT_MARKET_STORE_DIR) -> bool:
+    return any(
+        sum(1 for f in _data_files(p) if f.name.startswith("delta-"))
+        > MAX_DELTA_FILES_PER_PARTITION
+        for p in _partition_dirs(store_dir)
+    )
+
+
+def compact_market_store(
+        store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
+        retention_years: int | None = None,
+) -> int:
+    """
+    Junta os deltas de cada partição (ano) em um único arquivo ordenado por
+    (ticker, date), mantendo só a versão mais recente de cada linha.
+
+    Se 'retention_years' for informado, apaga partições mais antigas.
+
+    Retorna o número de partições reescritas.
+    """
+
+    rewritten = 0
+    oldest_year = None
+
+    if retention_years is not None:
+        oldest_year = date.today().year - retention_years
+
+    for partition in _partition_dirs(store_dir):
+        files = _data_files(partition)
+        year = int(partition.name.split("=", 1)[1])
+
+        if oldest_year is not None and year < oldest_year:
+            for file in files:
+                file.unlink(missing_ok=True)
+            continue
+
+        if len(files) <= 1:
+            continue
+
+        table = pa.concat_tables(
+            [pq.read_table(file, schema=PRICE_SCHEMA) for file in files]
+        )
+
+        df = (
+            table.to_pandas()
+            .sort_values(["ticker", "date", "_version"])
+            .drop_duplicates(subset=["ticker", "date"], keep="last")
+            .reset_index(drop=True)
+        )
+
+        compacted = pa.Table.from_pandas(
+            df[PRICE_SCHEMA.names],
+            schema=PRICE_SCHEMA,
+            preserve_index=False,
+        )
+
+        _write_partition_file(
+            compacted,
+            partition / f"part-{time.time_ns()}.parquet",
+            row_group_size=COMPACTED_ROW_GROUP_SIZE,
+        )
+
+        # O arquivo compactado mantém as versões, então um leitor que veja
+        # os dois ao mesmo tempo continua deduplicando corretamente.
+        for file in files:
+            file.unlink(missing_ok=True)
+
+        rewritten += 1
+
+    return rewritten
+
+
+def migrate_legacy_stock_histories(
+        legacy_dir: str | Path = LEGACY_STOCKS_DIR,
+        store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
+) -> list[str]:
+    """
+    Importa storage/stocks/<TICKER>/price_history.parquet para o store
+    consolidado e compacta. Os arquivos antigos não são apagados e tickers
+    que já estão no store não são sobrescritos.
+
+    Retorna os tickers importados.
+    """
+
+    legacy_dir = Path(legacy_dir)
+
+    if not legacy_dir.exists():
+        return []
+
+    known_tickers = load_manifest(store_dir)["tickers"]
+
+    histories = {}
+
+    for path in sorted(legacy_dir.glob("*/price_history.parquet")):
+        ticker = path.parent.name
+
+        if ticker in known_tickers:
+            continue
+
+        histories[ticker] = pd.read_parquet(path)
+
+    write_histories(histories, store_dir=store_dir)
+    compact_market_store(store_dir=store_dir)
+
+    return sorted(histories)
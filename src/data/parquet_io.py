@@ -0,0 +1,115 @@
+from pathlib import Path
+from uuid import uuid4
+import hashlib
+import os
+
+import pandas as pd
+
+from src.data.history_cache import HISTORY_CACHE
+
+
+def frame_fingerprint(df: pd.DataFrame | None) -> tuple:
+    """
+    Impressão digital barata de um histórico: linhas, última data e um
+    hash do conteúdo.
+
+    Datas são comparadas em nanossegundos para que um arquivo lido do disco
+    e o mesmo histórico montado em memória tenham o mesmo hash, mesmo que a
+    resolução do datetime seja diferente.
+    """
+
+    if df is None:
+        return (0, None, None)
+
+    last_date = None
+
+    if "date" in df.columns and not df.empty:
+        last_date = pd.to_datetime(df["date"]).max()
+
+    return (len(df), last_date, frame_content_hash(df))
+
+
+def frame_content_hash(df: pd.DataFrame) -> str:
+    normalized = df.reset_index(drop=True).copy()
+
+    for column in normalized.columns:
+        if pd.api.types.is_datetime64_any_dtype(normalized[column]):
+            normalized[column] = normalized[column].astype("datetime64[ns]")
+
+    digest = hashlib.sha1()
+    digest.update("|".join(map(str, normalized.columns)).encode("utf-8"))
+    digest.update(
+        pd.util.hash_pandas_object(normalized, index=False).to_numpy().tobytes()
+    )
+
+    return digest.hexdigest()
+
+
+def read_parquet_cached(path: str | Path) -> pd.DataFrame:
+    """
+    Lê um Parquet passando pelo cache de históricos do processo.
+
+    A versão é o mtime/tamanho do arquivo: uma escrita (sempre atômica, via
+    os.replace) invalida a entrada automaticamente.
+    """
+
+    path = Path(path).resolve()
+    stat = path.stat()
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    cached = HISTORY_CACHE.get(str(path), version)
+
+    if cached is not None:
+        return cached
+
+    return HISTORY_CACHE.put(str(path), version, value=pd.read_parquet(path))
+
+
+def write_parquet_atomic(df: pd.DataFrame, path: str | Path) -> None:
+    """
+    Escreve em um arquivo temporário no mesmo diretório e troca pelo
+    definitivo com os.replace. Quem estiver lendo nunca vê um Parquet
+    pela metade.
+    """
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def write_parquet_if_changed(
+        df: pd.DataFrame,
+        path: str | Path,
+        previous: pd.DataFrame | None,
+) -> bool:
+    """
+    Só escreve se 'df' for diferente do que já estava no disco ('previous').
+
+    Compara primeiro número de linhas e última data; o hash do conteúdo só é
+    calculado quando essas duas coincidem.
+
+    Retorna True se o arquivo foi escrito.
+    """
+
+    path = Path(path)
+
+    if previous is not None and path.exists():
+        same_shape = (
+            len(df) == len(previous)
+            and list(df.columns) == list(previous.columns)
+        )
+
+        if same_shape and frame_fingerprint(df) == frame_fingerprint(previous):
+            return False
+
+    write_parquet_atomic(df, path)
+
+    return True
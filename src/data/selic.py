@@ -1,121 +1,223 @@
-from datetime import date, timedelta
+from dataclasses import dataclass
+from datetime import date
 from dateutil.relativedelta import relativedelta
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
-import requests
 
-BCB_SELIC_URL = "https://api.bcb.gov.br/dados/serie/bcdata.sgs.11/dados"
+from src.data.parquet_io import (
+    read_parquet_cached,
+    write_parquet_atomic,
+    write_parquet_if_changed,
+)
+from src.data.sgs import DEFAULT_SGS_DIR, seed_sgs_series, sgs_series
+from src.data.single_flight import SingleFlight, file_lock
 
+DEFAULT_SELIC_PATH = "storage/selic/daily_selic.parquet"
 
-def _fetch_selic_bcb(initial_date: date, final_date: date) -> pd.DataFrame:
-    params = {
-        "formato": "json",
-        "dataInicial": initial_date.strftime("%d/%m/%Y"),
-        "dataFinal": final_date.strftime("%d/%m/%Y"),
-    }
 
-    response = requests.get(BCB_SELIC_URL, params=params, timeout=30)
+_selic_flights = SingleFlight()
 
-    # The Central Bank of Brazil (BCB) returns a 404 error when there are no values in the period.
-    # Example: weekend or current day not yet published.
-    if response.status_code == 404:
-        return pd.DataFrame(columns=["date", "selic_day_pct"])
 
-    if not response.ok:
-        raise RuntimeError(
-            f"Error BCB {response.status_code}: {response.text}\nURL: {response.url}"
-        )
+def daily_selic_10y(
+        final_date: date | None = None,
+        save_as: str | Path = DEFAULT_SELIC_PATH,
+        sgs_dir: str | Path = DEFAULT_SGS_DIR,
+) -> pd.DataFrame:
+    """
+    Searches/updates the daily Selic rate for the last 10 years.
 
-    data = response.json()
+    The data comes from the shared SGS series store (series 11); the Parquet
+    at 'save_as' is a 10-year view of it, kept for the cumulative factor
+    index and for existing readers.
 
-    if not data:
-        return pd.DataFrame(columns=["date", "selic_day_pct"])
+    Concurrent calls for the same file and date share a single update, and a
+    file lock keeps two processes from updating the Parquet at the same time.
+    """
 
-    df = pd.DataFrame(data)
+    if final_date is None:
+        final_date = date.today()
 
-    df["date"] = pd.to_datetime(df["data"], format="%d/%m/%Y")
-    df["selic_day_pct"] = (
-        df["valor"]
-        .astype(str)
-        .str.replace(",", ".", regex=False)
-        .astype(float)
-    )
+    path = Path(save_as)
 
-    df = df[["date", "selic_day_pct"]]
-    df = df.sort_values("date").reset_index(drop=True)
+    def update() -> pd.DataFrame:
+        with file_lock(path.parent / "locks" / f"{path.stem}.lock"):
+            return _update_daily_selic(final_date, path, sgs_dir)
 
-    return df
+    return _selic_flights.do((str(path.resolve()), final_date), update)
 
 
-def daily_selic_10y(
-        final_date: date | None = None,
-        save_as: str | Path = "storage/selic/daily_selic.parquet",
+def _update_daily_selic(
+        final_date: date,
+        save_as: str | Path,
+        sgs_dir: str | Path = DEFAULT_SGS_DIR,
 ) -> pd.DataFrame:
     """
-    Searches/updates the daily Selic rate for the last 10 years.
-    If the Parquet already exists:
-        - reads the file;
-        - deletes data older than 10 years;
-        - searches only for the missing delta;
-        - joins everything;
-        - removes duplicates;
-        - saves again.
+    - seeds the SGS store with an existing Parquet (only the first time);
+    - lets the SGS store fetch the missing delta;
+    - saves the 10-year view again, only if something changed (atomic write);
+    - rebuilds the cumulative factor index next to it when it did.
     """
 
-    if final_date is None:
-        final_date = date.today()
-
     initial_date = final_date - relativedelta(years=10)
 
     path = Path(save_as)
     path.parent.mkdir(parents=True, exist_ok=True)
 
+    # Current file content, so it is only rewritten when something changed.
+    stored = None
+
     if path.exists():
-        df_old = pd.read_parquet(path)
+        stored = read_parquet_cached(path)
+        seed_sgs_series("selic_day_pct", stored, storage_dir=sgs_dir)
 
-        df_old["date"] = pd.to_datetime(df_old["date"])
+    df = sgs_series(
+        ["selic_day_pct"],
+        initial_date=initial_date,
+        final_date=final_date,
+        storage_dir=sgs_dir,
+    )
 
-        # Remove data older than the desired window
-        df_old = df_old[df_old["date"] >= pd.Timestamp(initial_date)]
+    df = df.dropna(subset=["selic_day_pct"]).reset_index(drop=True)
 
-        if not df_old.empty:
-            last_saved_date = df_old["date"].max().date()
-            delta_initial_date = last_saved_date + timedelta(days=1)
-        else:
-            delta_initial_date = initial_date
+    written = write_parquet_if_changed(df, path, previous=stored)
 
-        if delta_initial_date <= final_date:
-            df_new = _fetch_selic_bcb(delta_initial_date, final_date)
-            df = pd.concat([df_old, df_new], ignore_index=True)
-        else:
-            df = df_old
+    index_path = selic_index_path(path)
 
-    else:
-        df = _fetch_selic_bcb(initial_date, final_date)
+    if written or not index_path.exists():
+        write_parquet_atomic(build_selic_index(df), index_path)
+
+    return df
+
+
+# ==========================================================
+# Cumulative factor index
+# ==========================================================
+
+def selic_index_path(parquet_path: str | Path = DEFAULT_SELIC_PATH) -> Path:
+    path = Path(parquet_path)
+    return path.with_name(f"{path.stem}_index.parquet")
 
-    # Final guarantees
-    df["date"] = pd.to_datetime(df["date"])
 
-    df = df[
-        (df["date"] >= pd.Timestamp(initial_date))
-        & (df["date"] <= pd.Timestamp(final_date))
-        ]
+def build_selic_index(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cumulative log factor of the daily Selic:
+
+        cum_log_factor[i] = sum(log(1 + pct[k] / 100) for k <= i)
+
+    The compounded factor of any window is then exp of one subtraction.
+    """
+
+    df = df.sort_values("date")
 
-    df = (
-        df
-        .drop_duplicates(subset=["date"], keep="last")
-        .sort_values("date")
-        .reset_index(drop=True)
+    daily_pct = pd.to_numeric(df["selic_day_pct"], errors="coerce").fillna(0.0)
+
+    return pd.DataFrame(
+        {
+            "date": pd.to_datetime(df["date"]).to_numpy(dtype="datetime64[ns]"),
+            "cum_log_factor": np.cumsum(np.log1p(daily_pct.to_numpy() / 100)),
+        }
     )
 
-    df.to_parquet(path, index=False)
 
-    return df
+@dataclass(frozen=True)
+class SelicIndex:
+    # dates: Selic business days, ascending (datetime64[ns]).
+    # cum_log_factor: len(dates) + 1 values; position 0 is the empty sum,
+    # position i + 1 accumulates every day up to dates[i].
+    dates: np.ndarray
+    cum_log_factor: np.ndarray
+
+    @classmethod
+    def from_frame(cls, index_df: pd.DataFrame) -> "SelicIndex":
+        dates = pd.to_datetime(index_df["date"]).to_numpy(dtype="datetime64[ns]")
+        cum = index_df["cum_log_factor"].to_numpy(dtype="float64")
+
+        return cls(dates=dates, cum_log_factor=np.concatenate([[0.0], cum]))
+
+    def _bounds(self, start, end) -> tuple[np.ndarray, np.ndarray]:
+        start = pd.to_datetime(start)
+        end = pd.to_datetime(end)
+
+        start = np.asarray(start, dtype="datetime64[ns]")
+        end = np.asarray(end, dtype="datetime64[ns]")
+
+        first = np.searchsorted(self.dates, start, side="left")
+        last = np.searchsorted(self.dates, end, side="right")
+
+        return first, np.maximum(last, first)
+
+    def days(self, start, end):
+        """
+        Number of Selic days in [start, end]. Vectorized like factor.
+        """
+
+        first, last = self._bounds(start, end)
+        return last - first
+
+    def log_factor(self, start, end):
+        first, last = self._bounds(start, end)
+        return self.cum_log_factor[last] - self.cum_log_factor[first]
+
+    def factor(self, start, end):
+        """
+        Compounded factor of the daily Selic in [start, end] (both
+        inclusive). 'start' and 'end' may be scalars or arrays of the same
+        length; a window without Selic days has factor 1.0.
+        """
+
+        return np.exp(self.log_factor(start, end))
+
+    def annualized(self, start, end, years):
+        """
+        Annualized rate of the window, assuming it spans 'years' years.
+        """
+
+        return np.exp(self.log_factor(start, end) / np.asarray(years)) - 1
+
+
+def load_selic_index(
+        final_date: date | None = None,
+        parquet_path: str | Path = DEFAULT_SELIC_PATH,
+) -> SelicIndex:
+    """
+    Updates the daily Selic if needed and returns its cumulative factor
+    index (read through the process cache).
+    """
+
+    daily_selic_10y(final_date=final_date, save_as=parquet_path)
+
+    index_path = selic_index_path(parquet_path)
+
+    if not index_path.exists():
+        df = read_parquet_cached(parquet_path)
+        write_parquet_atomic(build_selic_index(df), index_path)
+
+    return SelicIndex.from_frame(read_parquet_cached(index_path))
+
+
+def selic_factor(
+        start,
+        end,
+        final_date: date | None = None,
+        parquet_path: str | Path = DEFAULT_SELIC_PATH,
+):
+    """
+    Compounded Selic factor for [start, end]. Accepts scalars or arrays of
+    windows, e.g. thousands of (start, end) pairs in a single call:
+
+        selic_factor(starts, ends) - 1  ->  risk-free return per window
+    """
+
+    index = load_selic_index(final_date=final_date, parquet_path=parquet_path)
+
+    return index.factor(start, end)
+
 
 def selic_periods_row(
     final_date: date | None = None,
-    parquet_path: str | Path = "storage/selic/daily_selic.parquet",
+    parquet_path: str | Path = DEFAULT_SELIC_PATH,
 ) -> pd.DataFrame:
     """
     Returns the annualized SELIC rate for periods of 12 months, 3 years, 5 years, and 10 years.
@@ -125,26 +227,25 @@ def selic_periods_row(
     SELIC
     """
 
-    df = daily_selic_10y(
+    index = load_selic_index(
         final_date=final_date,
-        save_as=parquet_path,
+        parquet_path=parquet_path,
     )
 
-    if df.empty:
+    if len(index.dates) == 0:
         return pd.DataFrame(
             [["SELIC", None, None, None, None]],
             columns=["", "12m", "3A", "5A", "10A"],
         )
 
-    df["date"] = pd.to_datetime(df["date"])
-    df = df.sort_values("date").reset_index(drop=True)
+    last_date = pd.Timestamp(index.dates[-1]).date()
 
     if final_date is None:
-        effective_final_date = df["date"].max().date()
+        effective_final_date = last_date
     else:
         effective_final_date = min(
             pd.Timestamp(final_date).date(),
-            df["date"].max().date(),
+            last_date,
         )
 
     periods = [
@@ -154,25 +255,20 @@ def selic_periods_row(
         ("10A", 10),
     ]
 
-    row = ["SELIC"]
-
-    for label, years in periods:
-        initial_date = effective_final_date - relativedelta(years=years)
-
-        df_period = df[
-            (df["date"] >= pd.Timestamp(initial_date))
-            & (df["date"] <= pd.Timestamp(effective_final_date))
-        ]
-
-        if df_period.empty:
-            row.append(None)
-            continue
+    starts = [
+        effective_final_date - relativedelta(years=years)
+        for _, years in periods
+    ]
+    ends = [effective_final_date] * len(periods)
+    years = np.array([years for _, years in periods], dtype=float)
 
-        factor = (1 + df_period["selic_day_pct"] / 100).prod()
+    days = index.days(starts, ends)
+    annualized = index.annualized(starts, ends, years)
 
-        annualized = factor ** (1 / years) - 1
+    row = ["SELIC"]
 
-        row.append(annualized)
+    for count, value in zip(days, annualized):
+        row.append(float(value) if count > 0 else None)
 
     return pd.DataFrame(
         [row],
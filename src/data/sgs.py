@@ -0,0 +1,438 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from uuid import uuid4
+import json
+import os
+
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from src.data.http_client import http_get
+from src.data.parquet_io import read_parquet_cached, write_parquet_if_changed
+from src.data.single_flight import SingleFlight, file_lock
+from src.data.trading_calendar import is_history_up_to_date
+
+
+# Cliente genérico do SGS (Sistema Gerenciador de Séries Temporais) do BCB.
+#
+# Todas as séries ficam num único Parquet "largo" (date + uma coluna por
+# série) e um manifest guarda, por série, o intervalo já buscado. Cada
+# atualização só pede ao BCB o que falta de cada série, em paralelo.
+
+SGS_URL = "https://api.bcb.gov.br/dados/serie/bcdata.sgs.{code}/dados"
+
+DEFAULT_SGS_DIR = "storage/sgs"
+
+# O BCB recusa consultas de séries diárias com mais de 10 anos.
+MAX_RANGE_YEARS = 10
+
+SGS_FETCH_WORKERS = 4
+
+
+@dataclass(frozen=True)
+class SgsSeries:
+    name: str
+    code: int
+    # "D" (diária, publicada no dia útil seguinte) ou "M" (mensal).
+    frequency: str = "D"
+
+
+SGS_SERIES = {
+    series.name: series
+    for series in [
+        SgsSeries("selic_day_pct", 11, "D"),
+        SgsSeries("cdi_day_pct", 12, "D"),
+        SgsSeries("ipca_month_pct", 433, "M"),
+        SgsSeries("igpm_month_pct", 189, "M"),
+    ]
+}
+
+_sgs_flights = SingleFlight()
+
+
+def _series_path(storage_dir: str | Path) -> Path:
+    return Path(storage_dir) / "series.parquet"
+
+
+def _manifest_path(storage_dir: str | Path) -> Path:
+    return Path(storage_dir) / "manifest.json"
+
+
+def resolve_series(series: str | int | SgsSeries) -> SgsSeries:
+    """
+    Aceita o nome de uma série conhecida, um código SGS qualquer (vira a
+    coluna 'sgs_<código>', diária) ou um SgsSeries.
+    """
+
+    if isinstance(series, SgsSeries):
+        return series
+
+    if isinstance(series, int):
+        for known in SGS_SERIES.values():
+            if known.code == series:
+                return known
+
+        return SgsSeries(f"sgs_{series}", series, "D")
+
+    if series not in SGS_SERIES:
+        raise ValueError(f"Série SGS desconhecida: {series}")
+
+    return SGS_SERIES[series]
+
+
+def _empty_series(name: str) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "date": pd.Series(dtype="datetime64[ns]"),
+            name: pd.Series(dtype="float64"),
+        }
+    )
+
+
+def _fetch_sgs_range(
+        series: SgsSeries,
+        initial_date: date,
+        final_date: date,
+) -> pd.DataFrame:
+    params = {
+        "formato": "json",
+        "dataInicial": initial_date.strftime("%d/%m/%Y"),
+        "dataFinal": final_date.strftime("%d/%m/%Y"),
+    }
+
+    response = http_get(
+        SGS_URL.format(code=series.code),
+        params=params,
+        timeout=30,
+    )
+
+    # O BCB devolve 404 quando não há valores no período
+    # (ex: fim de semana ou dia ainda não publicado).
+    if response.status_code == 404:
+        return _empty_series(series.name)
+
+    if not response.ok:
+        raise RuntimeError(
+            f"Error BCB {response.status_code}: {response.text}\nURL: {response.url}"
+        )
+
+    data = response.json()
+
+    if not data:
+        return _empty_series(series.name)
+
+    df = pd.DataFrame(data)
+
+    return pd.DataFrame(
+        {
+            "date": pd.to_datetime(
+                df["data"],
+                format="%d/%m/%Y",
+            ).astype("datetime64[ns]"),
+            series.name: (
+                df["valor"]
+                .astype(str)
+                .str.replace(",", ".", regex=False)
+                .astype(float)
+            ),
+        }
+    )
+
+
+def _split_range(
+        initial_date: date,
+        final_date: date,
+        max_years: int = MAX_RANGE_YEARS,
+) -> list[tuple[date, date]]:
+    """
+    Quebra [initial_date, final_date] em pedaços aceitos pela API.
+    """
+
+    chunks = []
+    start = initial_date
+
+    while start <= final_date:
+        end = min(
+            start + relativedelta(years=max_years) - timedelta(days=1),
+            final_date,
+        )
+        chunks.append((start, end))
+        start = end + timedelta(days=1)
+
+    return chunks
+
+
+def _read_manifest(storage_dir: str | Path) -> dict:
+    path = _manifest_path(storage_dir)
+
+    if not path.exists():
+        return {"series": {}}
+
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _save_manifest(manifest: dict, storage_dir: str | Path) -> None:
+    path = _manifest_path(storage_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def _missing_ranges(
+        series: SgsSeries,
+        entry: dict | None,
+        initial_date: date,
+        final_date: date,
+) -> list[tuple[date, date]]:
+    """
+    Intervalos de [initial_date, final_date] que ainda não foram buscados
+    para a série, a partir das marcas do manifest:
+
+    - fetched_from / fetched_until: intervalo já pedido ao BCB;
+    - last_date: última data com valor.
+    """
+
+    if entry is None:
+        return [(initial_date, final_date)]
+
+    fetched_from = date.fromisoformat(entry["fetched_from"])
+    fetched_until = date.fromisoformat(entry["fetched_until"])
+    last_date = (
+        date.fromisoformat(entry["last_date"])
+        if entry.get("last_date")
+        else None
+    )
+
+    ranges = []
+
+    if initial_date < fetched_from:
+        ranges.append((initial_date, fetched_from - timedelta(days=1)))
+
+    if series.frequency == "D":
+        # Dia D é publicado no dia útil seguinte; se já está no disco, não
+        # há dado novo.
+        stale = not is_history_up_to_date(
+            last_date,
+            "bcb",
+            final_date=final_date,
+        )
+    else:
+        # Séries mensais: no máximo uma consulta por dia.
+        stale = fetched_until < final_date
+
+    if stale:
+        # Recomeça depois do último valor, para pegar publicações atrasadas.
+        start = last_date + timedelta(days=1) if last_date else fetched_from
+        start = max(start, initial_date)
+
+        if start <= final_date:
+            ranges.append((start, final_date))
+
+    return ranges
+
+
+def _merge_series(stored: pd.DataFrame | None, fetched: list[pd.DataFrame]) -> pd.DataFrame:
+    if stored is None:
+        df = pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]")})
+    else:
+        df = stored.copy()
+
+    for new in fetched:
+        if new.empty:
+            continue
+
+        name = new.columns[1]
+
+        if name not in df.columns:
+            df[name] = pd.Series(dtype="float64")
+
+        new = new.drop_duplicates(subset=["date"], keep="last")
+
+        df = df.merge(new, on="date", how="outer", suffixes=("", "_new"))
+        df[name] = df[f"{name}_new"].combine_first(df[name])
+        df = df.drop(columns=[f"{name}_new"])
+
+    return df.sort_values("date").reset_index(drop=True)
+
+
+def _update_sgs_series(
+        series: list[SgsSeries],
+        initial_date: date,
+        final_date: date,
+        storage_dir: str | Path,
+) -> pd.DataFrame:
+    path = _series_path(storage_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    stored = read_parquet_cached(path) if path.exists() else None
+    manifest = _read_manifest(storage_dir)
+
+    jobs = []
+
+    for item in series:
+        entry = manifest["series"].get(item.name)
+
+        for start, end in _missing_ranges(item, entry, initial_date, final_date):
+            for chunk in _split_range(start, end):
+                jobs.append((item, chunk))
+
+    if jobs:
+        workers = max(1, min(SGS_FETCH_WORKERS, len(jobs)))
+
+        with ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="sgs",
+        ) as executor:
+            fetched = list(
+                executor.map(
+                    lambda job: _fetch_sgs_range(job[0], *job[1]),
+                    jobs,
+                )
+            )
+
+        df = _merge_series(stored, fetched)
+
+        write_parquet_if_changed(df, path, previous=stored)
+
+        for item in series:
+            entry = manifest["series"].get(item.name)
+
+            last_date = None
+
+            if item.name in df.columns and df[item.name].notna().any():
+                last_date = df.loc[df[item.name].notna(), "date"].max().date()
+
+            fetched_from = initial_date
+            fetched_until = final_date
+
+            if entry is not None:
+                fetched_from = min(fetched_from, date.fromisoformat(entry["fetched_from"]))
+                fetched_until = max(fetched_until, date.fromisoformat(entry["fetched_until"]))
+
+            manifest["series"][item.name] = {
+                "code": item.code,
+                "frequency": item.frequency,
+                "fetched_from": fetched_from.isoformat(),
+                "fetched_until": fetched_until.isoformat(),
+                "last_date": last_date.isoformat() if last_date else None,
+            }
+
+        _save_manifest(manifest, storage_dir)
+
+    else:
+        df = stored
+
+    columns = ["date", *[item.name for item in series]]
+
+    if df is None:
+        return pd.DataFrame(columns=columns)
+
+    for name in columns:
+        if name not in df.columns:
+            df = df.assign(**{name: pd.Series(dtype="float64")})
+
+    df = df[
+        (df["date"] >= pd.Timestamp(initial_date))
+        & (df["date"] <= pd.Timestamp(final_date))
+    ][columns]
+
+    return df.dropna(how="all", subset=columns[1:]).reset_index(drop=True)
+
+
+def sgs_series(
+        series: list[str | int | SgsSeries],
+        initial_date: date | None = None,
+        final_date: date | None = None,
+        years: int = 10,
+        storage_dir: str | Path = DEFAULT_SGS_DIR,
+) -> pd.DataFrame:
+    """
+    Devolve as séries pedidas como colunas (date + uma coluna por série),
+    buscando no BCB só o que falta de cada uma.
+
+    Ex:
+        sgs_series(["selic_day_pct", "cdi_day_pct", "ipca_month_pct"])
+
+    Séries diárias e mensais dividem o mesmo índice de datas; a coluna fica
+    NaN nas datas em que a série não tem valor.
+    """
+
+    if final_date is None:
+        final_date = date.today()
+
+    if initial_date is None:
+        initial_date = final_date - relativedelta(years=years)
+
+    resolved = [resolve_series(item) for item in series]
+
+    def update() -> pd.DataFrame:
+        with file_lock(Path(storage_dir) / "locks" / "series.lock"):
+            return _update_sgs_series(
+                resolved,
+                initial_date,
+                final_date,
+                storage_dir,
+            )
+
+    key = (
+        str(Path(storage_dir).resolve()),
+        tuple(item.name for item in resolved),
+        initial_date,
+        final_date,
+    )
+
+    return _sgs_flights.do(key, update)
+
+
+def seed_sgs_series(
+        series: str | int | SgsSeries,
+        df: pd.DataFrame,
+        storage_dir: str | Path = DEFAULT_SGS_DIR,
+) -> None:
+    """
+    Carrega no store uma série já baixada (ex: o daily_selic.parquet
+    antigo), marcando o intervalo coberto por ela como buscado.
+    """
+
+    item = resolve_series(series)
+
+    if df.empty:
+        return
+
+    new = pd.DataFrame(
+        {
+            "date": pd.to_datetime(df["date"]).astype("datetime64[ns]"),
+            item.name: pd.to_numeric(df[item.name], errors="coerce"),
+        }
+    )
+
+    with file_lock(Path(storage_dir) / "locks" / "series.lock"):
+        path = _series_path(storage_dir)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        manifest = _read_manifest(storage_dir)
+
+        if item.name in manifest["series"]:
+            return
+
+        stored = read_parquet_cached(path) if path.exists() else None
+        merged = _merge_series(stored, [new])
+
+        write_parquet_if_changed(merged, path, previous=stored)
+
+        first = new["date"].min().date().isoformat()
+        last = new["date"].max().date().isoformat()
+
+        manifest["series"][item.name] = {
+            "code": item.code,
+            "frequency": item.frequency,
+            "fetched_from": first,
+            "fetched_until": last,
+            "last_date": last,
+        }
+
+        _save_manifest(manifest, storage_dir)
@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Hashable, Iterator, TypeVar
+import os
+import threading
+
+import pandas as pd
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Junta chamadas concorrentes para a mesma chave: só a primeira executa a
+    função; as demais esperam e recebem o mesmo resultado (ou a mesma
+    exceção).
+
+    DataFrames são devolvidos como cópias rasas, para que uma sessão que
+    altere colunas não afete as outras.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as exc:
+                call.error = exc
+            finally:
+                with self._lock:
+                    del self._calls[key]
+
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+
+        if isinstance(call.result, pd.DataFrame):
+            return call.result.copy(deep=False)
+
+        return call.result
+
+
+@contextmanager
+def file_lock(path: str | Path) -> Iterator[None]:
+    """
+    Lock exclusivo entre processos (ex: CLI do ranking e Streamlit
+    atualizando o mesmo ticker). Bloqueia até conseguir o lock.
+    """
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(path, "a+b") as handle:
+        if os.name == "nt":
+            import msvcrt
+
+            handle.seek(0)
+
+            while True:
+                try:
+                    # LK_LOCK tenta por ~10 segundos antes de desistir.
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+
+            try:
+                yield
+            finally:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+        else:
+            import fcntl
+
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
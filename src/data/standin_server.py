@@ -0,0 +1,512 @@
+"""
+Servidor HTTP local que imita as fontes de dados (Yahoo chart, BCB SGS e
+download de índices da B3).
+
+Serve para rodar a atualização de históricos sem depender da rede: medir
+vazão de atualizações concorrentes, reproduzir falhas (latência, 429, 5xx)
+e repetir respostas reais gravadas com configure_http("record", ...).
+
+Uso:
+
+    python -m src.data.standin_server --port 8765 --latency-ms 80 --error-rate 0.05
+    python -m src.data.standin_server --bench 200 --latency-ms 80
+
+Do lado do cliente:
+
+    from src.data.standin_server import use_standin_server
+    use_standin_server("http://127.0.0.1:8765")
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time as time_module
+import zlib
+
+import numpy as np
+
+from src.data.http_client import (
+    configure_http,
+    load_recorded_response,
+    request_key,
+)
+from src.data.trading_calendar import is_trading_day
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Hosts reais atendidos pelo servidor local.
+UPSTREAM_HOSTS = [
+    "query1.finance.yahoo.com",
+    "api.bcb.gov.br",
+    "sistemaswebb3-listados.b3.com.br",
+]
+
+# As séries sintéticas começam sempre na mesma data; assim o preço de um
+# dia não depende da janela pedida.
+SERIES_START = date(2000, 1, 3)
+
+B3_MONTH_HEADERS = [
+    "Jan", "Fev", "Mar", "Abr", "Mai", "Jun",
+    "Jul", "Ago", "Set", "Out", "Nov", "Dez",
+]
+
+_YAHOO_PATH = re.compile(r"^/v8/finance/chart/(?P<ticker>[^/]+)$")
+_SGS_PATH = re.compile(r"^/dados/serie/bcdata\.sgs\.(?P<code>\d+)/dados$")
+_B3_PATH = re.compile(
+    r"^/indexStatisticsProxy/IndexCall/GetDownloadPortfolioDay/(?P<payload>.+)$"
+)
+
+
+@lru_cache(maxsize=64)
+def _trading_days_until(year: int) -> tuple[date, ...]:
+    days = []
+    current = SERIES_START
+    last = date(year, 12, 31)
+
+    while current <= last:
+        if is_trading_day(current):
+            days.append(current)
+
+        current += timedelta(days=1)
+
+    return tuple(days)
+
+
+@lru_cache(maxsize=1024)
+def _synthetic_series(name: str, year: int) -> tuple[tuple[date, ...], np.ndarray]:
+    """
+    Passeio aleatório geométrico determinístico por nome (ticker, índice,
+    série do SGS), de SERIES_START até o fim de 'year'.
+    """
+
+    days = _trading_days_until(year)
+    rng = np.random.default_rng(zlib.crc32(name.encode("utf-8")))
+
+    returns = rng.normal(0.0004, 0.018, size=len(days))
+    start_price = 10 + (zlib.crc32(name.encode("utf-8")) % 9000) / 100
+
+    return days, start_price * np.exp(np.cumsum(returns))
+
+
+def _series_window(
+        name: str,
+        start: date,
+        end: date,
+) -> tuple[list[date], np.ndarray]:
+    days, values = _synthetic_series(name, end.year)
+
+    begin = bisect_left(days, start)
+    finish = bisect_right(days, end)
+
+    return list(days[begin:finish]), values[begin:finish]
+
+
+def yahoo_chart_payload(ticker: str, period1: int, period2: int) -> dict:
+    start = datetime.fromtimestamp(period1, timezone.utc).date()
+    end = (
+        datetime.fromtimestamp(period2, timezone.utc) - timedelta(seconds=1)
+    ).date()
+
+    days, closes = _series_window(ticker, start, end)
+
+    # Pregão da B3 às 13h UTC (10h em São Paulo), como a Yahoo devolve.
+    timestamps = [
+        int(datetime.combine(day, time(13), timezone.utc).timestamp())
+        for day in days
+    ]
+
+    opens = closes * 0.995
+    highs = closes * 1.01
+    lows = closes * 0.985
+    volumes = [
+        1_000_000 + zlib.crc32(f"{ticker}{day}".encode("utf-8")) % 5_000_000
+        for day in days
+    ]
+
+    dividends = {}
+
+    # Um provento por trimestre, no primeiro pregão de mar/jun/set/dez.
+    for i, day in enumerate(days):
+        first_of_month = i == 0 or days[i - 1].month != day.month
+
+        if first_of_month and day.month in {3, 6, 9, 12}:
+            dividends[str(timestamps[i])] = {
+                "amount": round(float(closes[i]) * 0.015, 6),
+                "date": timestamps[i],
+            }
+
+    return {
+        "chart": {
+            "result": [
+                {
+                    "meta": {"symbol": ticker, "currency": "BRL"},
+                    "timestamp": timestamps,
+                    "events": {"dividends": dividends},
+                    "indicators": {
+                        "quote": [
+                            {
+                                "open": opens.round(4).tolist(),
+                                "high": highs.round(4).tolist(),
+                                "low": lows.round(4).tolist(),
+                                "close": closes.round(4).tolist(),
+                                "volume": volumes,
+                            }
+                        ],
+                        "adjclose": [
+                            {"adjclose": closes.round(4).tolist()}
+                        ],
+                    },
+                }
+            ],
+            "error": None,
+        }
+    }
+
+
+def sgs_payload(code: int, start: date, end: date) -> list[dict]:
+    """
+    Série diária do SGS no formato do BCB: data dd/mm/aaaa e valor com
+    vírgula. Valores pequenos e estáveis, parecidos com a Selic diária (%).
+    """
+
+    days, values = _series_window(f"SGS{code}", start, end)
+
+    # Entre 0,03% e 0,05% ao dia; depende só do dia, não da janela pedida.
+    level = 0.04 + 0.01 * np.tanh(np.log(values / 50))
+
+    return [
+        {
+            "data": day.strftime("%d/%m/%Y"),
+            "valor": f"{value:.6f}".replace(".", ","),
+        }
+        for day, value in zip(days, level)
+    ]
+
+
+def b3_index_download(payload: str) -> str:
+    """
+    Tabela anual em matriz (Dia x Mês), em Base64, como o download de
+    evolução diária dos índices da B3.
+    """
+
+    request = json.loads(base64.b64decode(payload))
+    index = request["index"].upper()
+    year = int(request["year"])
+
+    days, closes = _series_window(
+        index,
+        date(year, 1, 1),
+        min(date(year, 12, 31), date.today()),
+    )
+
+    values = {
+        (day.month, day.day): close * 30
+        for day, close in zip(days, closes)
+    }
+
+    lines = [
+        f"{index} - {year}",
+        "Dia;" + ";".join(B3_MONTH_HEADERS),
+    ]
+
+    for day in range(1, 32):
+        cells = []
+
+        for month in range(1, 13):
+            value = values.get((month, day))
+
+            if value is None:
+                cells.append("")
+            else:
+                text = f"{value:,.2f}"
+                cells.append(
+                    text.replace(",", "X").replace(".", ",").replace("X", ".")
+                )
+
+        lines.append(f"{day};" + ";".join(cells))
+
+    text = "\n".join(lines)
+
+    return base64.b64encode(text.encode("utf-8")).decode("ascii")
+
+
+def _parse_br_date(text: str) -> date:
+    return datetime.strptime(text, "%d/%m/%Y").date()
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+            self,
+            address: tuple[str, int],
+            latency_ms: float = 0.0,
+            error_rate: float = 0.0,
+            throttle_rate: float = 0.0,
+            cassette_dir: str | Path | None = None,
+            seed: int | None = None,
+    ):
+        super().__init__(address, StandinHandler)
+
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.cassette_dir = Path(cassette_dir) if cassette_dir else None
+
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def draw(self) -> tuple[float, float]:
+        with self._random_lock:
+            return self._random.random(), self._random.random()
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    server: StandinServer
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _send(
+            self,
+            status: int,
+            body: bytes,
+            content_type: str = "application/json",
+            headers: dict | None = None,
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data) -> None:
+        self._send(status, json.dumps(data).encode("utf-8"))
+
+    def do_GET(self) -> None:
+        server = self.server
+        fault, jitter = server.draw()
+
+        if server.latency_ms > 0:
+            # Latência entre 50% e 150% do valor pedido.
+            time_module.sleep(server.latency_ms * (0.5 + jitter) / 1000)
+
+        if fault < server.throttle_rate:
+            self._send_json(429, {"error": "Too Many Requests"})
+            return
+
+        if fault < server.throttle_rate + server.error_rate:
+            self._send(
+                503,
+                b"Service Unavailable",
+                content_type="text/plain",
+                headers={"Retry-After": "0"},
+            )
+            return
+
+        if server.cassette_dir is not None:
+            recorded = load_recorded_response(
+                server.cassette_dir,
+                request_key(self.path),
+            )
+
+            if recorded is not None:
+                self._send(
+                    recorded["status"],
+                    recorded["body"],
+                    content_type=recorded["headers"].get(
+                        "Content-Type",
+                        "application/octet-stream",
+                    ),
+                )
+                return
+
+        parts = urlsplit(self.path)
+        params = dict(parse_qsl(parts.query))
+
+        try:
+            self._route(parts.path, params)
+        except (KeyError, ValueError) as exc:
+            self._send_json(400, {"error": str(exc)})
+
+    def _route(self, path: str, params: dict[str, str]) -> None:
+        match = _YAHOO_PATH.match(path)
+
+        if match:
+            self._send_json(
+                200,
+                yahoo_chart_payload(
+                    match["ticker"],
+                    int(params["period1"]),
+                    int(params["period2"]),
+                ),
+            )
+            return
+
+        match = _SGS_PATH.match(path)
+
+        if match:
+            data = sgs_payload(
+                int(match["code"]),
+                _parse_br_date(params["dataInicial"]),
+                _parse_br_date(params["dataFinal"]),
+            )
+
+            # Como o BCB: 404 quando não há valores no período.
+            if not data:
+                self._send_json(404, {"error": "Not Found"})
+                return
+
+            self._send_json(200, data)
+            return
+
+        match = _B3_PATH.match(path)
+
+        if match:
+            self._send(
+                200,
+                b3_index_download(match["payload"]).encode("ascii"),
+                content_type="text/plain",
+            )
+            return
+
+        self._send_json(404, {"error": f"Rota desconhecida: {path}"})
+
+
+def start_standin_server(
+        host: str = DEFAULT_HOST,
+        port: int = 0,
+        latency_ms: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        cassette_dir: str | Path | None = None,
+        seed: int | None = None,
+) -> StandinServer:
+    """
+    Sobe o servidor em uma thread daemon. port=0 escolhe uma porta livre.
+    Use server.shutdown() e server.server_close() para parar.
+    """
+
+    server = StandinServer(
+        (host, port),
+        latency_ms=latency_ms,
+        error_rate=error_rate,
+        throttle_rate=throttle_rate,
+        cassette_dir=cassette_dir,
+        seed=seed,
+    )
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server
+
+
+def use_standin_server(base_url: str) -> None:
+    """
+    Aponta Yahoo, BCB e B3 do http_client para o servidor local.
+    """
+
+    configure_http(
+        upstream_overrides={host: base_url for host in UPSTREAM_HOSTS}
+    )
+
+
+def _bench(server: StandinServer, n_tickers: int, max_workers: int) -> None:
+    import tempfile
+
+    from src.data.http_client import http_stats, reset_http_stats
+    from src.data.stocks import daily_stock_history_many
+
+    use_standin_server(server.base_url)
+    reset_http_stats()
+
+    tickers = [f"SYN{i:04d}3" for i in range(n_tickers)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time_module.perf_counter()
+
+        results = daily_stock_history_many(
+            tickers,
+            max_workers=max_workers,
+            storage_dir=Path(tmp) / "stocks",
+            store_dir=Path(tmp) / "market",
+        )
+
+        elapsed = time_module.perf_counter() - started
+
+    errors = sum(1 for result in results if not result.ok)
+
+    print(f"{n_tickers} tickers em {elapsed:.2f}s "
+          f"({n_tickers / elapsed:.1f} tickers/s), {errors} com erro")
+    print(f"HTTP: {http_stats()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--cassettes", default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--bench",
+        type=int,
+        default=0,
+        help="Atualiza N tickers sintéticos contra o servidor e sai.",
+    )
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    server = start_standin_server(
+        host=args.host,
+        port=0 if args.bench else args.port,
+        latency_ms=args.latency_ms,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        cassette_dir=args.cassettes,
+        seed=args.seed,
+    )
+
+    if args.bench:
+        try:
+            _bench(server, args.bench, args.workers)
+        finally:
+            server.shutdown()
+            server.server_close()
+        return
+
+    print(f"Servidor local em {server.base_url}")
+
+    try:
+        while True:
+            time_module.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,43 @@
-from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
 from pathlib import Path
 
 import pandas as pd
-import requests
 from dateutil.relativedelta import relativedelta
 
-YAHOO_CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart"
+from src.data.history_cache import HISTORY_CACHE
+from src.data.hot_cache import load_hot_history
+from src.data.http_client import http_get
+from src.data.market_store import (
+    DEFAULT_MARKET_STORE_DIR,
+    LEGACY_STOCKS_DIR,
+    checked_through,
+    compact_market_store,
+    load_manifest,
+    mark_tickers_checked,
+    needs_compaction,
+    read_ticker_history,
+    write_ticker_history,
+)
+from src.data.single_flight import SingleFlight, file_lock
+from src.data.trading_calendar import expected_session, is_history_up_to_date
 
 
-from datetime import date, timedelta
-from pathlib import Path
+YAHOO_CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart"
 
-import pandas as pd
-import requests
-from dateutil.relativedelta import relativedelta
+_stock_history_flights = SingleFlight()
 
 
-YAHOO_CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart"
+@dataclass(frozen=True)
+class StockHistoryResult:
+    ticker: str
+    history: pd.DataFrame | None
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
 
 
 def normalize_brazilian_ticker(ticker: str) -> str:
@@ -71,7 +92,7 @@ def _fetch_stock_history_yahoo(
         "includeAdjustedClose": "true",
     }
 
-    response = requests.get(
+    response = http_get(
         url,
         params=params,
         timeout=30,
@@ -190,19 +211,29 @@ def daily_stock_history(
     years: int = 10,
     interval: str = "1d",
     final_date: date | None = None,
-    storage_dir: str | Path = "storage/stocks",
+    storage_dir: str | Path = LEGACY_STOCKS_DIR,
     overlap_days: int = 15,
+    store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
 ) -> pd.DataFrame:
     """
     Busca/atualiza o histórico diário de preço + dividendos do ativo.
 
-    Se o Parquet já existir:
-    - lê o arquivo;
-    - remove dados mais antigos que a janela desejada;
+    O histórico fica no store consolidado (src.data.market_store).
+    Se o ativo ainda não estiver lá, importa o Parquet antigo de
+    'storage_dir'/<TICKER>/price_history.parquet, se existir.
+
+    Se já houver histórico:
+    - lê só a janela desejada;
     - busca apenas o delta;
     - refaz os últimos 'overlap_days' por segurança;
     - remove duplicatas;
-    - salva novamente.
+    - grava no store só as linhas novas ou alteradas.
+
+    Se o store já tiver o último pregão publicado, ou se a Yahoo já foi
+    consultada depois que ele saiu (ativo sem pregões novos, fonte
+    atrasada), devolve direto da camada quente (Arrow IPC em memory map).
+    Nesse caso o DataFrame aponta para arrays somente leitura: use .copy()
+    antes de alterar valores no lugar.
     """
 
     ticker = normalize_brazilian_ticker(ticker)
@@ -212,12 +243,91 @@ def daily_stock_history(
 
     initial_date = final_date - relativedelta(years=years)
 
-    path = Path(storage_dir) / ticker / "price_history.parquet"
-    path.parent.mkdir(parents=True, exist_ok=True)
+    entry = load_manifest(store_dir)["tickers"].get(ticker)
+
+    if (
+        entry is not None
+        and entry["last_date"] is not None
+        and is_history_up_to_date(
+            checked_through(entry),
+            "yahoo",
+            final_date=final_date,
+        )
+    ):
+        cache_key = (str(store_dir), ticker)
+
+        cached = HISTORY_CACHE.get(
+            cache_key,
+            entry["version"],
+            initial_date,
+            final_date,
+        )
 
-    if path.exists():
-        df_old = pd.read_parquet(path)
+        if cached is not None:
+            return cached
+
+        hot = load_hot_history(
+            ticker,
+            version=entry["version"],
+            store_dir=store_dir,
+        )
+
+        return HISTORY_CACHE.put(
+            cache_key,
+            entry["version"],
+            initial_date,
+            final_date,
+            value=hot.to_frame(start=initial_date, end=final_date),
+        )
 
+    def refresh() -> pd.DataFrame:
+        # Outro processo (ex: CLI do ranking) pode estar atualizando o mesmo
+        # ticker. Com o lock, quem chegar depois já encontra o delta gravado
+        # e não vai à rede de novo.
+        with file_lock(Path(store_dir) / "locks" / f"{ticker}.lock"):
+            return _refresh_stock_history(
+                ticker=ticker,
+                initial_date=initial_date,
+                final_date=final_date,
+                interval=interval,
+                storage_dir=storage_dir,
+                overlap_days=overlap_days,
+                store_dir=store_dir,
+            )
+
+    # Sessões concorrentes pedindo o mesmo ticker esperam uma única busca.
+    return _stock_history_flights.do(
+        (str(store_dir), ticker, initial_date, final_date, interval),
+        refresh,
+    )
+
+
+def _refresh_stock_history(
+    ticker: str,
+    initial_date: date,
+    final_date: date,
+    interval: str,
+    storage_dir: str | Path,
+    overlap_days: int,
+    store_dir: str | Path,
+) -> pd.DataFrame:
+    # Conteúdo atual do store, para só gravar o que mudar.
+    stored = read_ticker_history(
+        ticker,
+        start=initial_date,
+        store_dir=store_dir,
+    )
+
+    df_old = stored
+
+    if stored.empty:
+        legacy_path = Path(storage_dir) / ticker / "price_history.parquet"
+
+        if legacy_path.exists():
+            df_old = pd.read_parquet(legacy_path)
+
+    if not df_old.empty:
+        df_old = df_old.copy()
         df_old["date"] = pd.to_datetime(df_old["date"])
 
         # Compatibilidade caso o Parquet antigo não tenha alguma coluna nova.
@@ -232,6 +342,7 @@ def daily_stock_history(
         df_old = df_old[df_old["date"] >= pd.Timestamp(initial_date)]
 
         if df_old.empty:
+            last_saved_date = None
             delta_initial_date = initial_date
         else:
             last_saved_date = df_old["date"].max().date()
@@ -242,7 +353,20 @@ def daily_stock_history(
             if delta_initial_date < initial_date:
                 delta_initial_date = initial_date
 
-        if delta_initial_date <= final_date:
+        # Fim de semana, feriado ou segunda chamada no mesmo dia: o último
+        # pregão publicado já está no disco, ou a Yahoo já foi consultada
+        # depois dele (ex: outro processo buscou enquanto esperávamos o lock).
+        checked = checked_through(load_manifest(store_dir)["tickers"].get(ticker))
+
+        up_to_date = is_history_up_to_date(
+            max(filter(None, [last_saved_date, checked]), default=None),
+            "yahoo",
+            final_date=final_date,
+        )
+
+        if delta_initial_date <= final_date and not up_to_date:
+            session = expected_session("yahoo", final_date)
+
             df_new = _fetch_stock_history_yahoo(
                 ticker=ticker,
                 initial_date=delta_initial_date,
@@ -252,10 +376,16 @@ def daily_stock_history(
 
             df = pd.concat([df_old, df_new], ignore_index=True)
 
+            # Mesmo sem linhas novas, não há por que voltar à Yahoo antes
+            # do próximo pregão.
+            mark_tickers_checked([ticker], session, store_dir)
+
         else:
             df = df_old
 
     else:
+        session = expected_session("yahoo", final_date)
+
         df = _fetch_stock_history_yahoo(
             ticker=ticker,
             initial_date=initial_date,
@@ -263,9 +393,10 @@ def daily_stock_history(
             interval=interval,
         )
 
+        mark_tickers_checked([ticker], session, store_dir)
+
     if df.empty:
-        df.to_parquet(path, index=False)
-        return df
+        return _empty_stock_history()
 
     df["date"] = pd.to_datetime(df["date"])
 
@@ -295,6 +426,82 @@ def daily_stock_history(
         ]
     ]
 
-    df.to_parquet(path, index=False)
+    write_ticker_history(
+        ticker,
+        df,
+        previous=stored,
+        store_dir=store_dir,
+    )
 
     return df
+
+
+def daily_stock_history_many(
+    tickers: list[str],
+    max_workers: int = 8,
+    years: int = 10,
+    interval: str = "1d",
+    final_date: date | None = None,
+    storage_dir: str | Path = LEGACY_STOCKS_DIR,
+    overlap_days: int = 15,
+    store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
+) -> list[StockHistoryResult]:
+    """
+    Busca/atualiza o histórico de vários ativos em paralelo.
+
+    - usa um pool de threads limitado por 'max_workers';
+    - respeita o limite de conexões por host do http_client;
+    - um erro em um ticker não interrompe os demais;
+    - compacta o store ao final, se houver deltas demais;
+    - devolve um resultado por ticker, na mesma ordem da entrada.
+    """
+
+    if final_date is None:
+        final_date = date.today()
+
+    # Tickers repetidos (ex: "ITSA4" e "ITSA4.SA") viram uma única busca,
+    # evitando duas escritas concorrentes no mesmo Parquet.
+    unique_tickers = list(
+        dict.fromkeys(normalize_brazilian_ticker(ticker) for ticker in tickers)
+    )
+
+    def load(ticker: str) -> StockHistoryResult:
+        try:
+            history = daily_stock_history(
+                ticker,
+                years=years,
+                interval=interval,
+                final_date=final_date,
+                storage_dir=storage_dir,
+                overlap_days=overlap_days,
+                store_dir=store_dir,
+            )
+        except Exception as exc:
+            return StockHistoryResult(ticker=ticker, history=None, error=exc)
+
+        return StockHistoryResult(ticker=ticker, history=history)
+
+    if not unique_tickers:
+        return []
+
+    workers = max(1, min(max_workers, len(unique_tickers)))
+
+    with ThreadPoolExecutor(
+        max_workers=workers,
+        thread_name_prefix="stock-history",
+    ) as executor:
+        loaded = dict(zip(unique_tickers, executor.map(load, unique_tickers)))
+
+    # Cada atualização vira um pequeno delta no store; depois de uma carga
+    # grande, junta tudo de novo em um arquivo por ano.
+    if needs_compaction(store_dir):
+        compact_market_store(store_dir)
+
+    return [
+        StockHistoryResult(
+            ticker=ticker,
+            history=loaded[normalize_brazilian_ticker(ticker)].history,
+            error=loaded[normalize_brazilian_ticker(ticker)].error,
+        )
+        for ticker in tickers
+    ]
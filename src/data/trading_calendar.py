@@ -0,0 +1,223 @@
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+
+
+# O Brasil não tem horário de verão desde 2019; o pregão segue Brasília.
+B3_TIMEZONE = timezone(timedelta(hours=-3), "BRT")
+
+# Fechamento mais tardio do pregão regular (o horário muda entre 17h e 18h
+# conforme o horário de verão americano). Usar o mais tardio é conservador:
+# nunca consideramos um pregão encerrado antes da hora.
+#
+# Não há tabela de pregões encurtados (ex: jogos do Brasil na Copa): num
+# pregão que fecha mais cedo, esse corte só adia por algumas horas o momento
+# em que o dado passa a contar como publicado. Nunca faz pular uma busca
+# necessária, e o dado do pregão anterior segue valendo até lá.
+REGULAR_CLOSE = time(18, 0)
+
+
+@dataclass(frozen=True)
+class PublicationRule:
+    """
+    Quando o dado de um pregão fica disponível na fonte.
+
+    lag_sessions: quantos pregões depois do pregão de referência o dado sai.
+    publish_time: horário fixo de publicação no dia de saída.
+    delay_after_close: usado quando não há horário fixo; o dado sai este
+    tempo depois do fechamento do pregão.
+    """
+
+    lag_sessions: int = 0
+    publish_time: time | None = None
+    delay_after_close: timedelta = timedelta(0)
+
+
+PUBLICATION_RULES = {
+    # Cotação diária da Yahoo costuma consolidar logo após o call de fechamento.
+    "yahoo": PublicationRule(delay_after_close=timedelta(minutes=45)),
+
+    # Evolução diária de índices da B3 sai à noite.
+    "b3": PublicationRule(delay_after_close=timedelta(hours=2)),
+
+    # Selic diária (SGS 11) do dia D é divulgada na manhã do dia útil seguinte.
+    "bcb": PublicationRule(lag_sessions=1, publish_time=time(10, 0)),
+}
+
+
+def _easter(year: int) -> date:
+    # Algoritmo de Meeus/Jones/Butcher (calendário gregoriano).
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+
+    return date(year, month, day + 1)
+
+
+@lru_cache(maxsize=None)
+def b3_holidays(year: int) -> frozenset[date]:
+    """
+    Dias sem pregão na B3 (fora sábados e domingos).
+    """
+
+    easter = _easter(year)
+
+    holidays = {
+        date(year, 1, 1),                   # Confraternização Universal
+        easter - timedelta(days=48),        # Carnaval (segunda)
+        easter - timedelta(days=47),        # Carnaval (terça)
+        easter - timedelta(days=2),         # Sexta-feira Santa
+        date(year, 4, 21),                  # Tiradentes
+        date(year, 5, 1),                   # Dia do Trabalho
+        easter + timedelta(days=60),        # Corpus Christi
+        date(year, 9, 7),                   # Independência
+        date(year, 10, 12),                 # Nossa Senhora Aparecida
+        date(year, 11, 2),                  # Finados
+        date(year, 11, 15),                 # Proclamação da República
+        date(year, 12, 24),                 # Véspera de Natal
+        date(year, 12, 25),                 # Natal
+        date(year, 12, 31),                 # Último dia do ano
+    }
+
+    # Até 2021 a B3 também fechava nos feriados de São Paulo.
+    if year <= 2021:
+        holidays.update(
+            {
+                date(year, 1, 25),          # Aniversário de São Paulo
+                date(year, 7, 9),           # Revolução Constitucionalista
+                date(year, 11, 20),         # Consciência Negra (municipal)
+            }
+        )
+
+    # Consciência Negra virou feriado nacional em 2024.
+    if year >= 2024:
+        holidays.add(date(year, 11, 20))
+
+    return frozenset(holidays)
+
+
+def is_trading_day(day: date) -> bool:
+    if day.weekday() >= 5:
+        return False
+
+    return day not in b3_holidays(day.year)
+
+
+def previous_trading_day(day: date) -> date:
+    """
+    Último pregão estritamente anterior a 'day'.
+    """
+
+    day -= timedelta(days=1)
+
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+
+    return day
+
+
+def next_trading_day(day: date) -> date:
+    """
+    Primeiro pregão estritamente posterior a 'day'.
+    """
+
+    day += timedelta(days=1)
+
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+
+    return day
+
+
+def last_trading_day_on_or_before(day: date) -> date:
+    if is_trading_day(day):
+        return day
+
+    return previous_trading_day(day)
+
+
+def publication_datetime(session: date, source: str) -> datetime:
+    """
+    Momento (horário de Brasília) em que o dado do pregão 'session'
+    passa a estar disponível na fonte.
+    """
+
+    rule = PUBLICATION_RULES[source]
+
+    day = session
+
+    for _ in range(rule.lag_sessions):
+        day = next_trading_day(day)
+
+    if rule.publish_time is not None:
+        return datetime.combine(day, rule.publish_time, tzinfo=B3_TIMEZONE)
+
+    return (
+        datetime.combine(day, REGULAR_CLOSE, tzinfo=B3_TIMEZONE)
+        + rule.delay_after_close
+    )
+
+
+def latest_published_session(
+        source: str,
+        now: datetime | None = None,
+) -> date:
+    """
+    Último pregão cujo dado já deveria estar publicado na fonte.
+    """
+
+    if now is None:
+        now = datetime.now(B3_TIMEZONE)
+    elif now.tzinfo is None:
+        now = now.replace(tzinfo=B3_TIMEZONE)
+
+    session = last_trading_day_on_or_before(now.astimezone(B3_TIMEZONE).date())
+
+    while publication_datetime(session, source) > now:
+        session = previous_trading_day(session)
+
+    return session
+
+
+def is_history_up_to_date(
+        last_saved_date: date | None,
+        source: str,
+        final_date: date | None = None,
+        now: datetime | None = None,
+) -> bool:
+    """
+    Indica se o histórico local já contém o último pregão que a fonte
+    poderia devolver; nesse caso não há por que ir à rede.
+
+    Se 'final_date' for informado, considera apenas pregões até essa data.
+    """
+
+    if last_saved_date is None:
+        return False
+
+    return last_saved_date >= expected_session(source, final_date, now=now)
+
+
+def expected_session(
+        source: str,
+        final_date: date | None = None,
+        now: datetime | None = None,
+) -> date:
+    """
+    Último pregão que a fonte já poderia devolver, limitado a 'final_date'
+    se informado.
+    """
+
+    expected = latest_published_session(source, now=now)
+
+    if final_date is not None:
+        expected = min(expected, last_trading_day_on_or_before(final_date))
+
+    return expected
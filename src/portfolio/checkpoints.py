@@ -0,0 +1,388 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from uuid import uuid4
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.data.parquet_io import write_parquet_atomic
+from src.data.single_flight import file_lock
+from src.portfolio.storage import PORTFOLIO_DIR
+
+
+# Checkpoints do motor da carteira (src.portfolio.engine).
+#
+# Cada cálculo grava o estado no fim de cada dia com evento (posições, preço
+# de negociação dos tickers ainda sem pregão, caixa, a receber, cotas e
+# totais) e o ledger. No fim de cada mês e na última data calculada fica um
+# checkpoint com o hash de tudo que entra no estado até aquela data: os
+# eventos e os fechamentos (já ajustados) de cada ticker a partir do seu
+# primeiro evento.
+#
+# No cálculo seguinte, o motor retoma do checkpoint mais recente cujo hash
+# ainda bate e só reprocessa os dias depois dele: editar um lançamento de
+# março de 2024 refaz a partir de fevereiro; um fechamento novo refaz só o
+# último dia.
+
+DEFAULT_CHECKPOINT_DIR = PORTFOLIO_DIR / "checkpoints"
+
+# Aumentar sempre que mudar alguma regra do motor que altere o estado.
+CHECKPOINT_VERSION = 1
+
+STATE_COLUMNS = [
+    "receivables",
+    "cash",
+    "quota_count",
+    "external_flow",
+    "external_money_total",
+    "income_received",
+    "income_received_total",
+]
+
+
+@dataclass
+class EngineTrace:
+    """
+    Estado no fim de cada dia com evento (uma linha por dia) e o ledger.
+    """
+
+    dates: list[pd.Timestamp]
+    tickers: list[str]
+    positions: np.ndarray
+    trade_prices: np.ndarray
+    state: dict[str, np.ndarray]
+    # Linhas do ledger até o fim de cada dia (inclusive).
+    ledger_counts: np.ndarray
+    ledger_rows: list[dict] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class Checkpoint:
+    date: pd.Timestamp
+    # Dias com evento até a data (inclusive).
+    events: int
+    digest: str
+
+
+def _month_start(value: int) -> int:
+    return pd.Timestamp(value).to_period("M").start_time.value
+
+
+def _next_month_start(value: int) -> int:
+    return (pd.Timestamp(value).to_period("M") + 1).start_time.value
+
+
+class InputDigests:
+    """
+    Hash do que entra no estado do motor até cada data.
+
+    Os meses formam uma cadeia (hash do mês anterior + conteúdo do mês);
+    uma data no meio do mês usa a cadeia até o mês anterior e o trecho do
+    mês até ela.
+    """
+
+    def __init__(
+            self,
+            first_date: pd.Timestamp,
+            calendar: np.ndarray,
+            tickers: list[str],
+            closes: np.ndarray,
+            event_dates: np.ndarray,
+            event_hashes: np.ndarray,
+    ):
+        self.first_date = first_date
+        self.calendar = calendar
+        self.tickers = np.array(tickers, dtype=object)
+        self.closes = closes
+
+        order = np.argsort(event_dates, kind="stable")
+        self.event_dates = event_dates[order]
+        self.event_hashes = event_hashes[order]
+
+        self._chain: dict[int, str] = {}
+
+    def _segment(self, start: int, stop: int) -> bytes:
+        # Conteúdo das datas em [start, stop) (ns).
+        digest = hashlib.sha1()
+
+        first, last = np.searchsorted(self.event_dates, [start, stop])
+        digest.update(self.event_dates[first:last].tobytes())
+        digest.update(self.event_hashes[first:last].tobytes())
+
+        first, last = np.searchsorted(self.calendar, [start, stop])
+        closes = self.closes[first:last]
+        has_close = ~np.isnan(closes)
+
+        rows = has_close.any(axis=1)
+        columns = has_close.any(axis=0)
+
+        digest.update(self.calendar[first:last][rows].tobytes())
+        digest.update("\0".join(self.tickers[columns]).encode("utf-8"))
+        digest.update(np.ascontiguousarray(closes[rows][:, columns]).tobytes())
+
+        return digest.digest()
+
+    def _month(self, month_start: int) -> str:
+        """
+        Hash de tudo antes do início do mês seguinte a 'month_start'.
+        """
+
+        if month_start in self._chain:
+            return self._chain[month_start]
+
+        first_month = _month_start(self.first_date.value)
+
+        if month_start <= first_month:
+            previous = f"{CHECKPOINT_VERSION}:{self.first_date.value}"
+        else:
+            previous = self._month(
+                _month_start(month_start - 1)
+            )
+
+        digest = hashlib.sha1(previous.encode("utf-8"))
+        digest.update(self._segment(month_start, _next_month_start(month_start)))
+
+        self._chain[month_start] = digest.hexdigest()
+
+        return self._chain[month_start]
+
+    def at(self, current_date: pd.Timestamp) -> str:
+        month_start = _month_start(current_date.value)
+
+        if month_start <= _month_start(self.first_date.value):
+            previous = f"{CHECKPOINT_VERSION}:{self.first_date.value}"
+        else:
+            previous = self._month(_month_start(month_start - 1))
+
+        stop = current_date.value + 1
+
+        if stop == _next_month_start(month_start):
+            return self._month(month_start)
+
+        digest = hashlib.sha1(previous.encode("utf-8"))
+        digest.update(b"partial")
+        digest.update(self._segment(month_start, stop))
+
+        return digest.hexdigest()
+
+
+def checkpoint_dates(all_dates: list[pd.Timestamp]) -> list[pd.Timestamp]:
+    """
+    Último dia de cada mês já encerrado no calendário e a última data.
+    """
+
+    if not all_dates:
+        return []
+
+    end = all_dates[-1]
+    months = pd.PeriodIndex([current_date.to_period("M") for current_date in (all_dates[0], end)])
+
+    dates = [
+        period.end_time.normalize()
+        for period in pd.period_range(months[0], months[1], freq="M")
+        if period.end_time.normalize() < end
+    ]
+    dates.append(end)
+
+    return dates
+
+
+def engine_checkpoints(
+        digests: InputDigests,
+        all_dates: list[pd.Timestamp],
+        event_dates: list[pd.Timestamp],
+) -> list[Checkpoint]:
+    event_values = np.array(
+        [current_date.value for current_date in event_dates],
+        dtype="int64",
+    )
+
+    return [
+        Checkpoint(
+            date=current_date,
+            events=int(np.searchsorted(event_values, current_date.value, side="right")),
+            digest=digests.at(current_date),
+        )
+        for current_date in checkpoint_dates(all_dates)
+    ]
+
+
+def event_hashes(events: pd.DataFrame, columns: list[str]) -> np.ndarray:
+    """
+    Hash (uint64) de cada evento, só com as colunas que entram no estado.
+    """
+
+    if events.empty:
+        return np.zeros(0, dtype="uint64")
+
+    return pd.util.hash_pandas_object(
+        events[columns].astype(str),
+        index=False,
+    ).to_numpy(dtype="uint64")
+
+
+def _trace_path(checkpoint_dir: Path) -> Path:
+    return checkpoint_dir / "trace.parquet"
+
+
+def _ledger_path(checkpoint_dir: Path) -> Path:
+    return checkpoint_dir / "ledger.parquet"
+
+
+def _manifest_path(checkpoint_dir: Path) -> Path:
+    return checkpoint_dir / "manifest.json"
+
+
+def save_engine_checkpoints(
+        trace: EngineTrace,
+        checkpoints: list[Checkpoint],
+        checkpoint_dir: str | Path = DEFAULT_CHECKPOINT_DIR,
+) -> None:
+    checkpoint_dir = Path(checkpoint_dir)
+
+    frame = pd.DataFrame(
+        {
+            "date": pd.DatetimeIndex(trace.dates).as_unit("ns"),
+            **trace.state,
+            "ledger_count": trace.ledger_counts,
+        }
+    )
+
+    positions = pd.DataFrame(
+        trace.positions,
+        columns=[f"q:{ticker}" for ticker in trace.tickers],
+    )
+    trade_prices = pd.DataFrame(
+        trace.trade_prices,
+        columns=[f"p:{ticker}" for ticker in trace.tickers],
+    )
+
+    frame = pd.concat([frame, positions, trade_prices], axis=1)
+
+    manifest = {
+        "version": CHECKPOINT_VERSION,
+        "tickers": trace.tickers,
+        "checkpoints": [
+            {
+                "date": checkpoint.date.isoformat(),
+                "events": checkpoint.events,
+                "digest": checkpoint.digest,
+            }
+            for checkpoint in checkpoints
+        ],
+    }
+
+    with file_lock(checkpoint_dir / "locks" / "engine.lock"):
+        write_parquet_atomic(frame, _trace_path(checkpoint_dir))
+        write_parquet_atomic(
+            pd.DataFrame(trace.ledger_rows),
+            _ledger_path(checkpoint_dir),
+        )
+
+        # O manifest vai por último: só aponta para arquivos completos.
+        manifest_path = _manifest_path(checkpoint_dir)
+        tmp_path = manifest_path.with_name(f".{manifest_path.name}.{uuid4().hex}.tmp")
+        tmp_path.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+        os.replace(tmp_path, manifest_path)
+
+
+def load_engine_checkpoint(
+        digests: InputDigests,
+        event_dates: list[pd.Timestamp],
+        tickers: list[str],
+        checkpoint_dir: str | Path = DEFAULT_CHECKPOINT_DIR,
+) -> EngineTrace | None:
+    """
+    Estado até o checkpoint mais recente que ainda vale para as entradas
+    atuais (trace com os primeiros dias com evento), ou None.
+    """
+
+    checkpoint_dir = Path(checkpoint_dir)
+    manifest_path = _manifest_path(checkpoint_dir)
+
+    if not manifest_path.exists():
+        return None
+
+    try:
+        # Mesmo lock da escrita: manifest, trace e ledger da mesma gravação.
+        with file_lock(checkpoint_dir / "locks" / "engine.lock"):
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            stored = pd.read_parquet(_trace_path(checkpoint_dir))
+            ledger = pd.read_parquet(_ledger_path(checkpoint_dir))
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get("version") != CHECKPOINT_VERSION:
+        return None
+
+    found = None
+
+    for item in reversed(manifest.get("checkpoints", [])):
+        checkpoint = Checkpoint(
+            date=pd.Timestamp(item["date"]),
+            events=int(item["events"]),
+            digest=item["digest"],
+        )
+
+        if checkpoint.events == 0 or checkpoint.events > len(event_dates):
+            continue
+
+        if digests.at(checkpoint.date) == checkpoint.digest:
+            found = checkpoint
+            break
+
+    if found is None:
+        return None
+
+    stored = stored.iloc[:found.events]
+
+    # Mesmos dias com evento (o hash já garante; conferência barata).
+    stored_dates = stored["date"].to_numpy(dtype="datetime64[ns]").view("int64")
+    current_dates = np.array(
+        [current_date.value for current_date in event_dates[:found.events]],
+        dtype="int64",
+    )
+
+    if len(stored) != found.events or not np.array_equal(stored_dates, current_dates):
+        return None
+
+    # Colunas na ordem dos tickers atuais; ticker novo começa zerado.
+    positions = np.zeros((found.events, len(tickers)))
+    trade_prices = np.full((found.events, len(tickers)), np.nan)
+
+    for column, ticker in enumerate(tickers):
+        if f"q:{ticker}" in stored.columns:
+            positions[:, column] = stored[f"q:{ticker}"].to_numpy(dtype="float64")
+            trade_prices[:, column] = stored[f"p:{ticker}"].to_numpy(dtype="float64")
+
+    ledger_counts = stored["ledger_count"].to_numpy(dtype="int64")
+
+    # Datas do ledger voltam como os Timestamps do calendário atual.
+    dates_by_value = {current_date.value: current_date for current_date in event_dates}
+
+    ledger_rows = []
+
+    for row in ledger.iloc[:ledger_counts[-1]].to_dict("records"):
+        row = {
+            key: value
+            for key, value in row.items()
+            if value is not None and not (isinstance(value, float) and np.isnan(value))
+        }
+        row["date"] = dates_by_value[pd.Timestamp(row["date"]).value]
+        ledger_rows.append(row)
+
+    return EngineTrace(
+        dates=list(event_dates[:found.events]),
+        tickers=list(tickers),
+        positions=positions,
+        trade_prices=trade_prices,
+        state={
+            column: stored[column].to_numpy(dtype="float64")
+            for column in STATE_COLUMNS
+        },
+        ledger_counts=ledger_counts,
+        ledger_rows=ledger_rows,
+    )
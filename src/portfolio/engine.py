@@ -1,11 +1,23 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import date
+from pathlib import Path
 from typing import Callable
 
+import numpy as np
 import pandas as pd
 
+from src.portfolio.checkpoints import (
+    STATE_COLUMNS,
+    EngineTrace,
+    InputDigests,
+    engine_checkpoints,
+    event_hashes,
+    load_engine_checkpoint,
+    save_engine_checkpoints,
+)
+
 
 INITIAL_QUOTA_VALUE = 1.0
 EPSILON = 1e-9
@@ -16,6 +28,13 @@ class PortfolioResult:
     history: pd.DataFrame
     positions: pd.DataFrame
     ledger: pd.DataFrame
+    # Quantidade e peso no patrimônio de cada ticker por data (datas x
+    # tickers), para gráficos de alocação.
+    daily_positions: pd.DataFrame = field(default_factory=pd.DataFrame)
+    daily_weights: pd.DataFrame = field(default_factory=pd.DataFrame)
+    # Fator acumulado de ajuste por eventos corporativos (datas x tickers
+    # com evento): preço bruto = fechamento ajustado / fator.
+    adjustment_factors: pd.DataFrame = field(default_factory=pd.DataFrame)
 
     @property
     def latest(self) -> pd.Series | None:
@@ -36,6 +55,25 @@ def _normalize_ticker(value) -> str:
     return str(value).strip().upper().removesuffix(".SA")
 
 
+def _normalize_dates(dates: pd.Series) -> pd.Series:
+    """
+    Mesmo resultado de pd.to_datetime(dates).dt.normalize(), sem refazer a
+    conversão nem a normalização de datas que já estão à meia-noite.
+    """
+
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates)
+
+    if dates.dt.tz is None:
+        values = dates.to_numpy()
+        midnight = values.astype("datetime64[D]").astype(values.dtype)
+
+        if ((midnight == values) | np.isnat(values)).all():
+            return dates
+
+    return dates.dt.normalize()
+
+
 def _prepare_history(history: pd.DataFrame, ticker: str) -> pd.DataFrame:
     required = {"date", "close"}
     missing = required.difference(history.columns)
@@ -44,12 +82,20 @@ def _prepare_history(history: pd.DataFrame, ticker: str) -> pd.DataFrame:
         raise ValueError(f"Histórico de {ticker} sem colunas: {sorted(missing)}")
 
     result = history[["date", "close"]].copy()
-    result["date"] = pd.to_datetime(result["date"]).dt.normalize()
-    result["close"] = pd.to_numeric(result["close"], errors="coerce")
+    result["date"] = _normalize_dates(result["date"])
+
+    if not pd.api.types.is_numeric_dtype(result["close"]):
+        result["close"] = pd.to_numeric(result["close"], errors="coerce")
+
+    if result["close"].isna().any():
+        result = result.dropna(subset=["close"])
+
+    # Histórico do store já vem em ordem e sem datas repetidas.
+    if result["date"].is_monotonic_increasing and result["date"].is_unique:
+        return result.reset_index(drop=True)
 
     return (
-        result.dropna(subset=["close"])
-        .sort_values("date")
+        result.sort_values("date")
         .drop_duplicates("date", keep="last")
         .reset_index(drop=True)
     )
@@ -226,48 +272,269 @@ def _prepare_corporate_actions(
     ).reset_index(drop=True)
 
 
-def _first_market_date_on_or_after(
-    history: pd.DataFrame,
-    target_date: pd.Timestamp,
-) -> pd.Timestamp:
-    dates = history.loc[history["date"] >= target_date, "date"]
+def _same_ticker_actions(corporate_actions: pd.DataFrame) -> pd.DataFrame:
+    # Eventos que mudam a quantidade sem trocar de ticker (desdobramento,
+    # grupamento, bonificação): são os que ajustam o histórico.
+    if corporate_actions.empty:
+        return corporate_actions
+
+    return corporate_actions[
+        corporate_actions["source_ticker"]
+        == corporate_actions["target_ticker"]
+    ]
 
-    if dates.empty:
-        return target_date
 
-    return dates.iloc[0]
+def _cumulative_adjustment_factors(
+    actions: pd.DataFrame,
+    dates: np.ndarray,
+) -> np.ndarray:
+    """
+    Fator de ajuste de cada data: produto dos fatores dos eventos com data
+    ex posterior a ela (1.0 a partir da última data ex).
+    """
+
+    ex_dates = actions["ex_date"].to_numpy(dtype="datetime64[ns]")
+    order = np.argsort(ex_dates, kind="stable")
+
+    factors = actions["factor"].to_numpy(dtype="float64")[order]
+    # suffix[j] = produto dos fatores do j-ésimo evento em diante.
+    suffix = np.append(np.cumprod(factors[::-1])[::-1], 1.0)
+
+    return suffix[np.searchsorted(ex_dates[order], dates, side="right")]
 
 
 def _adjust_histories_for_corporate_actions(
     histories: dict[str, pd.DataFrame],
     corporate_actions: pd.DataFrame,
 ) -> dict[str, pd.DataFrame]:
-    adjusted = {
-        ticker: history.copy()
-        for ticker, history in histories.items()
+    """
+    Históricos com o fechamento ajustado pelos eventos do próprio ticker.
+
+    Só os tickers com evento ganham um DataFrame novo, com 'raw_close' e
+    'adjustment_factor' ao lado do 'close' ajustado; os demais são os
+    mesmos objetos recebidos.
+    """
+
+    adjusted = dict(histories)
+
+    for ticker, actions in _same_ticker_actions(corporate_actions).groupby(
+        "source_ticker",
+        sort=False,
+    ):
+        if ticker not in adjusted:
+            continue
+
+        history = adjusted[ticker]
+        factors = _cumulative_adjustment_factors(
+            actions,
+            history["date"].to_numpy(dtype="datetime64[ns]"),
+        )
+
+        adjusted[ticker] = history.assign(
+            raw_close=history["close"],
+            adjustment_factor=factors,
+            close=history["close"].to_numpy(dtype="float64") * factors,
+        )
+
+    return adjusted
+
+
+def _adjustment_factor_matrix(
+    corporate_actions: pd.DataFrame,
+    tickers: list[str],
+    all_dates: list[pd.Timestamp],
+) -> pd.DataFrame:
+    """
+    Fatores de ajuste datas x tickers, só dos tickers com evento.
+    """
+
+    actions = _same_ticker_actions(corporate_actions)
+    actions = actions[actions["source_ticker"].isin(tickers)]
+
+    dates = pd.DatetimeIndex(all_dates, name="date")
+    calendar = dates.to_numpy(dtype="datetime64[ns]")
+
+    factors = {
+        ticker: _cumulative_adjustment_factors(group, calendar)
+        for ticker, group in actions.groupby("source_ticker")
     }
 
-    if corporate_actions.empty:
-        return adjusted
+    return pd.DataFrame(
+        factors,
+        index=dates,
+        columns=pd.Index(list(factors), name="ticker"),
+    )
 
-    same_ticker_actions = corporate_actions[
-        corporate_actions["source_ticker"]
-        == corporate_actions["target_ticker"]
+
+def _first_market_dates_on_or_after(
+    history: pd.DataFrame,
+    target_dates: pd.Series,
+) -> list[pd.Timestamp]:
+    """
+    Para cada data alvo, o primeiro pregão do histórico nela ou depois (a
+    própria data alvo se não houver).
+    """
+
+    market_dates = history["date"]
+    rows = np.searchsorted(
+        market_dates.to_numpy(dtype="datetime64[ns]"),
+        target_dates.to_numpy(dtype="datetime64[ns]"),
+        side="left",
+    )
+
+    found = rows < len(market_dates)
+    first_dates = market_dates.iloc[np.where(found, rows, 0)]
+
+    return [
+        first_date if is_found else target_date
+        for first_date, is_found, target_date in zip(first_dates, found, target_dates)
     ]
 
-    for _, action in same_ticker_actions.iterrows():
-        ticker = action["source_ticker"]
 
-        if ticker not in adjusted:
+def _calendar_dates(
+    date_columns: list[pd.Series],
+    first_date: pd.Timestamp,
+    end: pd.Timestamp,
+) -> list[pd.Timestamp]:
+    """
+    Datas distintas de todas as colunas entre first_date e end, em ordem.
+
+    Vale a primeira ocorrência de cada data, na ordem das colunas: a
+    resolução dela (s, us, ns) define o dtype das datas do histórico e do
+    ledger.
+    """
+
+    columns = [column for column in date_columns if len(column)]
+
+    values = np.concatenate(
+        [
+            column.to_numpy(dtype="datetime64[ns]").view("int64")
+            for column in columns
+        ]
+    )
+    offsets = np.cumsum([0] + [len(column) for column in columns[:-1]])
+    units = [column.dt.unit for column in columns]
+
+    inside = np.flatnonzero((values >= first_date.value) & (values <= end.value))
+
+    unique_values, first_rows = np.unique(values[inside], return_index=True)
+    first_columns = np.searchsorted(offsets, inside[first_rows], side="right") - 1
+
+    return [
+        pd.Timestamp(value).as_unit(units[column])
+        for value, column in zip(unique_values.tolist(), first_columns)
+    ]
+
+
+def _events_by_date(
+    events: pd.DataFrame,
+    date_column: str,
+) -> dict[pd.Timestamp, list[dict]]:
+    # Eventos de cada data, na ordem do DataFrame.
+    grouped: dict[pd.Timestamp, list[dict]] = {}
+
+    for event in events.to_dict("records"):
+        grouped.setdefault(event[date_column], []).append(event)
+
+    return grouped
+
+
+def _close_matrix(
+    histories: dict[str, pd.DataFrame],
+    tickers: list[str],
+    all_dates: list[pd.Timestamp],
+) -> np.ndarray:
+    """
+    Fechamentos datas x tickers (colunas na ordem de 'tickers'); NaN onde o
+    ticker não tem pregão na data.
+    """
+
+    calendar = np.array([current_date.value for current_date in all_dates], dtype="int64")
+    closes = np.full((len(calendar), len(tickers)), np.nan)
+
+    for column, ticker in enumerate(tickers):
+        history = histories[ticker]
+        history_dates = history["date"].to_numpy(dtype="datetime64[ns]").view("int64")
+
+        rows = np.searchsorted(calendar, history_dates)
+        inside = rows < len(calendar)
+        inside[inside] = calendar[rows[inside]] == history_dates[inside]
+
+        closes[rows[inside], column] = history["close"].to_numpy(dtype="float64")[inside]
+
+    return closes
+
+
+def _forward_fill(matrix: np.ndarray) -> np.ndarray:
+    # Repete, em cada coluna, o último valor não NaN.
+    rows = np.arange(matrix.shape[0])[:, None]
+    last_valid = np.maximum.accumulate(
+        np.where(np.isnan(matrix), -1, rows),
+        axis=0,
+    )
+
+    filled = matrix[np.maximum(last_valid, 0), np.arange(matrix.shape[1])]
+
+    return np.where(last_valid >= 0, filled, np.nan)
+
+
+def _input_digests(
+    first_date: pd.Timestamp,
+    all_dates: list[pd.Timestamp],
+    tickers: list[str],
+    closes: np.ndarray,
+    events: list[tuple[pd.DataFrame, str, list[str], list[str]]],
+) -> InputDigests:
+    """
+    Hashes das entradas do laço de eventos. 'events' traz, na ordem em que
+    o laço aplica, (eventos, coluna da data, colunas com tickers, colunas
+    que entram no estado).
+
+    O preço de um ticker só pesa depois do primeiro evento dele: antes
+    disso os fechamentos ficam fora do hash (um ticker novo não invalida os
+    checkpoints antigos). Vale a partir do último pregão até esse evento,
+    que é o preço repetido no dia.
+    """
+
+    calendar = np.array([current_date.value for current_date in all_dates], dtype="int64")
+    ticker_index = {ticker: column for column, ticker in enumerate(tickers)}
+
+    first_event_rows = np.full(len(tickers), len(calendar))
+    event_dates = []
+    hashes = []
+
+    for frame, date_column, ticker_columns, columns in events:
+        if frame.empty:
             continue
 
-        factor = float(action["factor"])
-        ex_date = action["ex_date"]
+        dates = frame[date_column].to_numpy(dtype="datetime64[ns]").view("int64")
+        rows = np.searchsorted(calendar, dates)
 
-        before_event = adjusted[ticker]["date"] < ex_date
-        adjusted[ticker].loc[before_event, "close"] *= factor
+        for ticker_column in ticker_columns:
+            columns_of_events = frame[ticker_column].map(ticker_index).to_numpy()
+            np.minimum.at(first_event_rows, columns_of_events, rows)
 
-    return adjusted
+        event_dates.append(dates)
+        hashes.append(event_hashes(frame, columns))
+
+    masked = closes.copy()
+    row_numbers = np.arange(len(calendar))[:, None]
+    has_close = ~np.isnan(closes) & (row_numbers <= first_event_rows)
+    start_rows = np.where(
+        has_close.any(axis=0),
+        np.max(np.where(has_close, row_numbers, -1), axis=0),
+        first_event_rows,
+    )
+    masked[row_numbers < start_rows] = np.nan
+
+    return InputDigests(
+        first_date=first_date,
+        calendar=calendar,
+        tickers=tickers,
+        closes=masked,
+        event_dates=np.concatenate(event_dates) if event_dates else np.zeros(0, dtype="int64"),
+        event_hashes=np.concatenate(hashes) if hashes else np.zeros(0, dtype="uint64"),
+    )
 
 
 def calculate_portfolio(
@@ -276,7 +543,18 @@ def calculate_portfolio(
     corporate_actions: pd.DataFrame | None = None,
     history_loader: Callable[[str], pd.DataFrame] | None = None,
     final_date: date | pd.Timestamp | None = None,
+    histories_loader: (
+        Callable[[list[str]], dict[str, pd.DataFrame]] | None
+    ) = None,
+    checkpoint_dir: str | Path | None = None,
 ) -> PortfolioResult:
+    """
+    Com 'checkpoint_dir', o estado do laço de eventos é gravado em
+    checkpoints (src.portfolio.checkpoints) e o cálculo seguinte só
+    reprocessa os dias depois do último checkpoint que ainda vale para os
+    lançamentos, proventos, eventos corporativos e fechamentos atuais.
+    """
+
     transactions = _prepare_transactions(transactions)
     income_events = _prepare_income_events(income_events)
     corporate_actions = _prepare_corporate_actions(corporate_actions)
@@ -284,7 +562,7 @@ def calculate_portfolio(
     if transactions.empty:
         return _empty_result()
 
-    if history_loader is None:
+    if history_loader is None and histories_loader is None:
         raise ValueError("Informe uma função history_loader.")
 
     tickers = set(transactions["ticker"].unique())
@@ -298,8 +576,17 @@ def calculate_portfolio(
 
     tickers = sorted(tickers)
 
+    if histories_loader is not None:
+        # Carrega todos os tickers de uma vez (ex: busca paralela).
+        raw_histories = histories_loader(tickers)
+    else:
+        raw_histories = {
+            ticker: history_loader(ticker)
+            for ticker in tickers
+        }
+
     histories = {
-        ticker: _prepare_history(history_loader(ticker), ticker)
+        ticker: _prepare_history(raw_histories[ticker], ticker)
         for ticker in tickers
     }
 
@@ -326,47 +613,63 @@ def calculate_portfolio(
     income_events = income_events.copy()
 
     if not income_events.empty:
-        ex_dates = []
+        ex_dates = [None] * len(income_events)
 
-        for _, income in income_events.iterrows():
-            ticker = income["ticker"]
-            position_date = income["position_date"]
-            ex_date = _first_market_date_on_or_after(
+        for ticker, group in income_events.groupby("ticker", sort=False):
+            group_ex_dates = _first_market_dates_on_or_after(
                 histories[ticker],
-                position_date,
+                group["position_date"],
             )
-            ex_dates.append(ex_date)
+
+            for row, ex_date in zip(group.index, group_ex_dates):
+                ex_dates[row] = ex_date
 
         income_events["ex_date"] = ex_dates
     else:
         income_events["ex_date"] = pd.Series(dtype="datetime64[ns]")
 
-    calendar_dates = set(transactions["date"])
-
-    for history in histories.values():
-        calendar_dates.update(
-            history.loc[
-                history["date"].between(first_date, end),
-                "date",
-            ]
-        )
+    date_columns = [transactions["date"]]
+    date_columns.extend(history["date"] for history in histories.values())
 
     if not income_events.empty:
-        calendar_dates.update(income_events["ex_date"])
-        calendar_dates.update(income_events["payment_date"])
+        date_columns.append(income_events["ex_date"])
+        date_columns.append(income_events["payment_date"])
 
     if not corporate_actions.empty:
-        calendar_dates.update(corporate_actions["ex_date"])
-        calendar_dates.update(corporate_actions["credit_date"])
-
-    all_dates = sorted(
-        current_date
-        for current_date in calendar_dates
-        if first_date <= current_date <= end
+        date_columns.append(corporate_actions["ex_date"])
+        date_columns.append(corporate_actions["credit_date"])
+
+    all_dates = _calendar_dates(date_columns, first_date, end)
+
+    # Eventos agrupados uma vez por data; o laço só consulta o dia.
+    actions_by_date = _events_by_date(corporate_actions, "credit_date")
+    income_rights_by_date = _events_by_date(income_events, "ex_date")
+    income_payments_by_date = _events_by_date(income_events, "payment_date")
+    transactions_by_date = _events_by_date(transactions, "date")
+
+    ticker_index = {ticker: column for column, ticker in enumerate(tickers)}
+
+    # Fechamentos de mercado datas x tickers, repetindo o último pregão.
+    closes = _close_matrix(histories, tickers, all_dates)
+    market_prices = _forward_fill(closes)
+
+    # Dias com algum evento: só neles o estado muda.
+    event_days = sorted(
+        day
+        for day, current_date in enumerate(all_dates)
+        if current_date in actions_by_date
+        or current_date in income_rights_by_date
+        or current_date in income_payments_by_date
+        or current_date in transactions_by_date
     )
 
-    positions = {ticker: 0.0 for ticker in tickers}
-    last_prices: dict[str, float] = {}
+    event_dates = [all_dates[day] for day in event_days]
+
+    positions = np.zeros(len(tickers))
+
+    # Preço de um ticker negociado antes do primeiro pregão (vale até
+    # aparecer um fechamento).
+    trade_prices = np.full(len(tickers), np.nan)
 
     cash = 0.0
     receivables = 0.0
@@ -375,41 +678,93 @@ def calculate_portfolio(
     external_money_total = 0.0
     income_received_total = 0.0
 
-    history_rows: list[dict] = []
+    # Estado no fim de cada dia com evento.
+    n_events = len(event_days)
+    event_positions = np.zeros((n_events, len(tickers)))
+    event_trade_prices = np.full((n_events, len(tickers)), np.nan)
+    event_state = {
+        column: np.zeros(n_events)
+        for column in STATE_COLUMNS
+    }
+    ledger_counts = np.zeros(n_events, dtype="int64")
+
     ledger_rows: list[dict] = []
+    first_event = 0
+
+    if checkpoint_dir is not None:
+        digests = _input_digests(
+            first_date,
+            all_dates,
+            tickers,
+            closes,
+            [
+                (
+                    corporate_actions,
+                    "credit_date",
+                    ["source_ticker", "target_ticker"],
+                    ["id", "action_type", "source_ticker", "target_ticker", "factor", "cash_amount"],
+                ),
+                (income_events, "ex_date", ["ticker"], ["id", "ticker", "net_amount"]),
+                (income_events, "payment_date", ["ticker"], ["id", "ticker", "net_amount"]),
+                (
+                    transactions,
+                    "date",
+                    ["ticker"],
+                    ["id", "type", "ticker", "quantity", "unit_price", "costs"],
+                ),
+            ],
+        )
 
-    histories_by_date = {
-        ticker: history.set_index("date")
-        for ticker, history in histories.items()
-    }
+        trace = load_engine_checkpoint(digests, event_dates, tickers, checkpoint_dir)
 
-    for current_date in all_dates:
-        for ticker, history in histories_by_date.items():
-            if current_date not in history.index:
-                continue
+        if trace is not None:
+            # Retoma do fim do último dia com evento do checkpoint.
+            first_event = len(trace.dates)
+
+            event_positions[:first_event] = trace.positions
+            event_trade_prices[:first_event] = trace.trade_prices
+
+            for column in STATE_COLUMNS:
+                event_state[column][:first_event] = trace.state[column]
 
-            market_row = history.loc[current_date]
+            ledger_counts[:first_event] = trace.ledger_counts
+            ledger_rows = trace.ledger_rows
 
-            if isinstance(market_row, pd.DataFrame):
-                market_row = market_row.iloc[-1]
+            positions = trace.positions[-1].copy()
+            trade_prices = trace.trade_prices[-1].copy()
 
-            last_prices[ticker] = float(market_row["close"])
+            cash = float(trace.state["cash"][-1])
+            receivables = float(trace.state["receivables"][-1])
+            quota_count = float(trace.state["quota_count"][-1])
+            external_money_total = float(trace.state["external_money_total"][-1])
+            income_received_total = float(trace.state["income_received_total"][-1])
+
+    for event in range(first_event, n_events):
+        day = event_days[event]
+        current_date = all_dates[day]
+
+        # Preços no começo do dia: fechamento do dia (ou o último), senão o
+        # preço de negociação, senão 0.0.
+        day_prices = np.where(
+            np.isnan(market_prices[day]),
+            trade_prices,
+            market_prices[day],
+        )
+        has_price = ~np.isnan(day_prices)
+        day_prices = np.nan_to_num(day_prices, nan=0.0)
 
         daily_external_flow = 0.0
         daily_income_received = 0.0
 
-        day_corporate_actions = corporate_actions[
-            corporate_actions["credit_date"] == current_date
-        ]
-
-        for _, action in day_corporate_actions.iterrows():
+        for action in actions_by_date.get(current_date, ()):
             action_type = action["action_type"]
             source_ticker = action["source_ticker"]
             target_ticker = action["target_ticker"]
             factor = float(action["factor"])
             cash_amount = float(action["cash_amount"])
 
-            source_quantity = positions.get(source_ticker, 0.0)
+            source = ticker_index[source_ticker]
+            source_quantity = float(positions[source])
 
             if source_quantity <= EPSILON:
                 continue
@@ -422,7 +777,7 @@ def calculate_portfolio(
                 new_quantity = source_quantity * factor
                 quantity_delta = new_quantity - source_quantity
 
-                positions[source_ticker] = new_quantity
+                positions[source] = new_quantity
                 cash += cash_amount
 
                 ledger_rows.append(
@@ -441,12 +796,10 @@ def calculate_portfolio(
 
             elif action_type in {"mudança de ticker", "conversão"}:
                 new_quantity = source_quantity * factor
+                target = ticker_index[target_ticker]
 
-                positions[source_ticker] = 0.0
-                positions[target_ticker] = (
-                    positions.get(target_ticker, 0.0)
-                    + new_quantity
-                )
+                positions[source] = 0.0
+                positions[target] = positions[target] + new_quantity
                 cash += cash_amount
 
                 ledger_rows.append(
@@ -463,11 +816,7 @@ def calculate_portfolio(
                     }
                 )
 
-        day_income_rights = income_events[
-            income_events["ex_date"] == current_date
-        ]
-
-        for _, income in day_income_rights.iterrows():
+        for income in income_rights_by_date.get(current_date, ()):
             amount = float(income["net_amount"])
             receivables += amount
 
@@ -485,11 +834,7 @@ def calculate_portfolio(
                 }
             )
 
-        day_income_payments = income_events[
-            income_events["payment_date"] == current_date
-        ]
-
-        for _, income in day_income_payments.iterrows():
+        for income in income_payments_by_date.get(current_date, ()):
             amount = float(income["net_amount"])
 
             receivables -= amount
@@ -515,25 +860,25 @@ def calculate_portfolio(
                 }
             )
 
-        day_transactions = transactions[
-            transactions["date"] == current_date
-        ]
-
-        for _, transaction in day_transactions.iterrows():
+        for transaction in transactions_by_date.get(current_date, ()):
             ticker = transaction["ticker"]
+            column = ticker_index[ticker]
             transaction_type = transaction["type"]
             quantity = float(transaction["quantity"])
             unit_price = float(transaction["unit_price"])
             costs = float(transaction["costs"])
 
-            last_prices.setdefault(ticker, unit_price)
+            if not has_price[column]:
+                day_prices[column] = unit_price
+                has_price[column] = True
+                trade_prices[column] = unit_price
 
             if transaction_type == "venda":
-                if quantity > positions[ticker] + EPSILON:
+                if quantity > positions[column] + EPSILON:
                     raise ValueError(
                         f"Venda de {quantity:g} {ticker} em "
                         f"{current_date.date()} excede a posição de "
-                        f"{positions[ticker]:g}."
+                        f"{positions[column]:g}."
                     )
 
                 proceeds = quantity * unit_price - costs
@@ -541,7 +886,7 @@ def calculate_portfolio(
                 if proceeds < -EPSILON:
                     raise ValueError("Custos da venda excedem o valor vendido.")
 
-                positions[ticker] -= quantity
+                positions[column] -= quantity
                 cash += proceeds
 
                 ledger_rows.append(
@@ -564,10 +909,7 @@ def calculate_portfolio(
             external_flow = purchase_total - internal_cash_used
 
             if external_flow > EPSILON:
-                marked_assets_before_flow = sum(
-                    position * last_prices.get(position_ticker, 0.0)
-                    for position_ticker, position in positions.items()
-                )
+                marked_assets_before_flow = float(positions @ day_prices)
                 equity_before_flow = (
                     marked_assets_before_flow
                     + receivables
@@ -590,7 +932,7 @@ def calculate_portfolio(
             if abs(cash) < EPSILON:
                 cash = 0.0
 
-            positions[ticker] += quantity
+            positions[column] += quantity
 
             ledger_rows.append(
                 {
@@ -605,44 +947,117 @@ def calculate_portfolio(
                 }
             )
 
-        marked_assets = sum(
-            position * last_prices.get(ticker, 0.0)
-            for ticker, position in positions.items()
+        event_positions[event] = positions
+        event_trade_prices[event] = trade_prices
+        ledger_counts[event] = len(ledger_rows)
+        event_state["receivables"][event] = receivables
+        event_state["cash"][event] = cash
+        event_state["quota_count"][event] = quota_count
+        event_state["external_flow"][event] = daily_external_flow
+        event_state["external_money_total"][event] = external_money_total
+        event_state["income_received"][event] = daily_income_received
+        event_state["income_received_total"][event] = income_received_total
+
+    if checkpoint_dir is not None and n_events:
+        save_engine_checkpoints(
+            EngineTrace(
+                dates=event_dates,
+                tickers=tickers,
+                positions=event_positions,
+                trade_prices=event_trade_prices,
+                state=event_state,
+                ledger_counts=ledger_counts,
+                ledger_rows=ledger_rows,
+            ),
+            engine_checkpoints(digests, all_dates, event_dates),
+            checkpoint_dir,
         )
 
-        equity = marked_assets + receivables + cash
+    # Preço de marcação: fechamento; antes do primeiro pregão, o preço da
+    # primeira negociação (fixo depois de definido); sem nenhum dos dois,
+    # 0.0.
+    first_trade_prices = np.full(market_prices.shape, np.nan)
+    first_trade_prices[event_days] = event_trade_prices
+
+    prices = np.where(
+        np.isnan(market_prices),
+        _forward_fill(first_trade_prices),
+        market_prices,
+    )
+    priced = ~np.isnan(prices)
+    prices = np.nan_to_num(prices, nan=0.0)
+
+    # Estado de cada data = estado do último dia com evento até ela. Fluxos
+    # do dia só contam no próprio dia.
+    n_dates = len(all_dates)
+    last_event = np.searchsorted(event_days, np.arange(n_dates), side="right") - 1
+    is_event_day = np.zeros(n_dates, dtype=bool)
+    is_event_day[event_days] = True
+
+    def state_by_date(values: np.ndarray, only_on_event_day: bool = False) -> np.ndarray:
+        result = np.where(last_event >= 0, values[np.maximum(last_event, 0)], 0.0)
+
+        if only_on_event_day:
+            result = np.where(is_event_day, result, 0.0)
+
+        return result
+
+    position_matrix = np.zeros((n_dates, len(tickers)))
+    has_event = last_event >= 0
+    position_matrix[has_event] = event_positions[last_event[has_event]]
+
+    market_values = position_matrix * prices
+    assets = market_values.sum(axis=1)
+
+    receivables_by_date = state_by_date(event_state["receivables"])
+    cash_by_date = state_by_date(event_state["cash"])
+    quota_count_by_date = state_by_date(event_state["quota_count"])
+    external_money_by_date = state_by_date(event_state["external_money_total"])
+
+    equity = assets + receivables_by_date + cash_by_date
 
-        quota_value = (
-            equity / quota_count
-            if quota_count > EPSILON
-            else INITIAL_QUOTA_VALUE
+    with np.errstate(invalid="ignore", divide="ignore"):
+        quota_value = np.where(
+            quota_count_by_date > EPSILON,
+            equity / quota_count_by_date,
+            INITIAL_QUOTA_VALUE,
         )
 
-        history_rows.append(
-            {
-                "date": current_date,
-                "assets": marked_assets,
-                "receivables": receivables,
-                "cash": cash,
-                "equity": equity,
-                "quota_count": quota_count,
-                "quota_value": quota_value,
-                "return": quota_value / INITIAL_QUOTA_VALUE - 1.0,
-                "external_flow": daily_external_flow,
-                "external_money_total": external_money_total,
-                "new_money_total": external_money_total,
-                "income_received": daily_income_received,
-                "income_received_total": income_received_total,
-            }
+        weights = np.where(
+            equity[:, None] != 0,
+            market_values / equity[:, None],
+            np.nan,
         )
 
+    history = pd.DataFrame(
+        {
+            "date": all_dates,
+            "assets": assets,
+            "receivables": receivables_by_date,
+            "cash": cash_by_date,
+            "equity": equity,
+            "quota_count": quota_count_by_date,
+            "quota_value": quota_value,
+            "return": quota_value / INITIAL_QUOTA_VALUE - 1.0,
+            "external_flow": state_by_date(event_state["external_flow"], True),
+            "external_money_total": external_money_by_date,
+            "new_money_total": external_money_by_date,
+            "income_received": state_by_date(event_state["income_received"], True),
+            "income_received_total": state_by_date(
+                event_state["income_received_total"]
+            ),
+        }
+    )
+
     position_rows = []
 
-    for ticker, quantity in positions.items():
+    for column, ticker in enumerate(tickers):
+        quantity = float(positions[column])
+
         if quantity <= EPSILON:
             continue
 
-        price = last_prices.get(ticker)
+        price = float(prices[-1, column]) if priced[-1, column] else None
 
         position_rows.append(
             {
@@ -657,8 +1072,31 @@ def calculate_portfolio(
             }
         )
 
+    # Séries diárias só dos tickers que estiveram na carteira.
+    held = (position_matrix > EPSILON).any(axis=0)
+    date_index = pd.DatetimeIndex(history["date"], name="date")
+    held_tickers = pd.Index(
+        [ticker for ticker, is_held in zip(tickers, held) if is_held],
+        name="ticker",
+    )
+
     return PortfolioResult(
-        history=pd.DataFrame(history_rows),
+        history=history,
         positions=pd.DataFrame(position_rows),
         ledger=pd.DataFrame(ledger_rows),
-    )
\ No newline at end of file
+        daily_positions=pd.DataFrame(
+            position_matrix[:, held],
+            index=date_index,
+            columns=held_tickers,
+        ),
+        daily_weights=pd.DataFrame(
+            weights[:, held],
+            index=date_index,
+            columns=held_tickers,
+        ),
+        adjustment_factors=_adjustment_factor_matrix(
+            corporate_actions,
+            tickers,
+            all_dates,
+        ),
+    )
@@ -0,0 +1,251 @@
+from datetime import date
+from pathlib import Path
+from uuid import uuid4
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from src.data.market_store import (
+    DEFAULT_MARKET_STORE_DIR,
+    checked_through,
+    load_manifest,
+)
+from src.data.parquet_io import write_parquet_atomic
+from src.data.single_flight import file_lock
+from src.data.stocks import normalize_brazilian_ticker
+from src.data.trading_calendar import is_history_up_to_date
+from src.portfolio.corporate_actions_storage import ACTIONS_PATH
+from src.portfolio.engine import PortfolioResult
+from src.portfolio.income_storage import INCOME_PATH
+from src.portfolio.storage import PORTFOLIO_DIR, TRANSACTIONS_PATH
+
+
+# Cache em disco do último PortfolioResult da carteira.
+#
+# A chave tem duas partes:
+#
+# - fingerprint dos arquivos de lançamentos, proventos e eventos
+#   corporativos (mtime/tamanho, sem abrir os Parquet), da data final e da
+#   versão do código;
+# - versão, no store de mercado (src.data.market_store), do histórico de
+#   cada ticker usado no cálculo.
+#
+# Se tudo bater e os históricos das posições em aberto ainda tiverem o
+# último pregão publicado, o resultado sai direto do disco, sem carregar a
+# carteira nem rodar o motor. Tickers já zerados (origem de mudança de
+# ticker ou conversão, ativos deslistados) só conferem a versão: não recebem
+# pregões novos, e uma atualização que mude os dados já muda a versão.
+
+DEFAULT_RESULT_CACHE_DIR = PORTFOLIO_DIR / "result_cache"
+
+# Aumentar sempre que mudar alguma regra do motor ou do PortfolioResult.
+RESULT_CACHE_VERSION = 2
+
+PORTFOLIO_FILES = [TRANSACTIONS_PATH, INCOME_PATH, ACTIONS_PATH]
+
+RESULT_FRAMES = [
+    "history",
+    "positions",
+    "ledger",
+    "daily_positions",
+    "daily_weights",
+    "adjustment_factors",
+]
+
+# Guardados com o índice de datas como coluna.
+INDEXED_FRAMES = {"daily_positions", "daily_weights", "adjustment_factors"}
+
+
+def _file_version(path: Path) -> list[int] | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def portfolio_fingerprint(
+        final_date: date | None = None,
+        files: list[Path] | None = None,
+) -> str:
+    """
+    Fingerprint dos arquivos da carteira e da data final do cálculo.
+
+    Deve ser tirado antes de carregar os arquivos: uma gravação no meio do
+    cálculo muda o fingerprint e o próximo acesso recalcula.
+    """
+
+    if final_date is None:
+        final_date = date.today()
+
+    if files is None:
+        files = PORTFOLIO_FILES
+
+    payload = json.dumps(
+        {
+            "version": RESULT_CACHE_VERSION,
+            "final_date": final_date.isoformat(),
+            "files": {path.name: _file_version(Path(path)) for path in files},
+        },
+        sort_keys=True,
+    )
+
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def price_versions(
+        tickers: list[str],
+        store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
+) -> dict[str, int | None]:
+    entries = load_manifest(store_dir)["tickers"]
+
+    versions = {}
+
+    for ticker in tickers:
+        entry = entries.get(normalize_brazilian_ticker(ticker))
+        versions[ticker] = None if entry is None else entry["version"]
+
+    return versions
+
+
+def _prices_still_valid(
+        stored_versions: dict[str, int | None],
+        open_tickers: list[str],
+        final_date: date,
+        store_dir: str | Path,
+) -> bool:
+    entries = load_manifest(store_dir)["tickers"]
+
+    for ticker, version in stored_versions.items():
+        entry = entries.get(normalize_brazilian_ticker(ticker))
+
+        if entry is None or version is None or entry["version"] != version:
+            return False
+
+        if ticker not in open_tickers:
+            continue
+
+        # Posição em aberto sem o último pregão publicado (nem consulta à
+        # Yahoo depois dele): o caminho normal ainda vai buscar o delta, então
+        # o resultado guardado já está velho.
+        if not is_history_up_to_date(
+            checked_through(entry),
+            "yahoo",
+            final_date=final_date,
+        ):
+            return False
+
+    return True
+
+
+def _frame_path(cache_dir: Path, name: str) -> Path:
+    return cache_dir / f"{name}.parquet"
+
+
+def _manifest_path(cache_dir: Path) -> Path:
+    return cache_dir / "manifest.json"
+
+
+def load_cached_portfolio(
+        fingerprint: str,
+        final_date: date | None = None,
+        cache_dir: str | Path = DEFAULT_RESULT_CACHE_DIR,
+        store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
+) -> PortfolioResult | None:
+    """
+    PortfolioResult guardado para 'fingerprint', se os históricos usados
+    ainda estiverem na mesma versão e em dia; senão None.
+    """
+
+    if final_date is None:
+        final_date = date.today()
+
+    cache_dir = Path(cache_dir)
+    manifest_path = _manifest_path(cache_dir)
+
+    if not manifest_path.exists():
+        return None
+
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get("fingerprint") != fingerprint:
+        return None
+
+    stored_versions = manifest.get("price_versions", {})
+
+    if not _prices_still_valid(
+            stored_versions,
+            manifest.get("open_tickers", list(stored_versions)),
+            final_date,
+            store_dir,
+    ):
+        return None
+
+    frames = {}
+
+    try:
+        with file_lock(cache_dir / "locks" / "result.lock"):
+            # Conferido de novo sob o lock: os Parquet são da mesma gravação.
+            if json.loads(manifest_path.read_text(encoding="utf-8")) != manifest:
+                return None
+
+            for name in RESULT_FRAMES:
+                frames[name] = pd.read_parquet(_frame_path(cache_dir, name))
+    except (OSError, ValueError):
+        return None
+
+    for name in INDEXED_FRAMES:
+        frame = frames[name].set_index("date")
+        frame.columns.name = "ticker"
+        frames[name] = frame
+
+    return PortfolioResult(**frames)
+
+
+def save_cached_portfolio(
+        result: PortfolioResult,
+        fingerprint: str,
+        tickers: list[str],
+        cache_dir: str | Path = DEFAULT_RESULT_CACHE_DIR,
+        store_dir: str | Path = DEFAULT_MARKET_STORE_DIR,
+) -> None:
+    """
+    Grava 'result' com o fingerprint da carteira e as versões atuais dos
+    históricos de 'tickers' (os que o motor carregou), marcando os que têm
+    posição em aberto no fim do cálculo.
+    """
+
+    cache_dir = Path(cache_dir)
+
+    open_tickers = (
+        set(result.positions["ticker"])
+        if not result.positions.empty
+        else set()
+    )
+
+    manifest = {
+        "fingerprint": fingerprint,
+        "price_versions": price_versions(tickers, store_dir),
+        "open_tickers": [ticker for ticker in tickers if ticker in open_tickers],
+    }
+
+    with file_lock(cache_dir / "locks" / "result.lock"):
+        for name in RESULT_FRAMES:
+            frame = getattr(result, name)
+
+            if name in INDEXED_FRAMES:
+                frame = frame.rename_axis(index="date", columns=None).reset_index()
+
+            write_parquet_atomic(frame, _frame_path(cache_dir, name))
+
+        # O manifest vai por último: só aponta para arquivos completos.
+        manifest_path = _manifest_path(cache_dir)
+        tmp_path = manifest_path.with_name(f".{manifest_path.name}.{uuid4().hex}.tmp")
+        tmp_path.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+        os.replace(tmp_path, manifest_path)
@@ -2,30 +2,45 @@ import pandas as pd
 import streamlit as st
 
 from src.data.stocks import daily_stock_history
-from src.data.selic import selic_periods_row
+from src.data.selic import SelicIndex, load_selic_index, selic_periods_row
 from src.data.benchmarks import ibov_history, ifix_history
-from src.analytics.stock_metrics import (
-    stock_metrics_by_period,
-    format_metrics_report,
-)
+from src.analytics.metrics_cache import cached_stock_metrics
+from src.analytics.rolling import rolling_metrics
+from src.analytics.stock_metrics import format_metrics_report
+
+
+# Os históricos de ações já passam pelo cache LRU do processo na camada de
+# dados (src.data.history_cache), invalidado pela versão do armazenamento, e
+# o store registra a última consulta à Yahoo: um ticker sem pregões novos não
+# volta à rede a cada rerun. Um st.cache_data aqui só duplicaria cada
+# DataFrame por sessão.
+#
+# Selic e benchmarks não guardam a última consulta: sem o TTL curto, uma
+# fonte atrasada seria consultada de novo a cada rerun, com lock e releitura
+# do arquivo.
+SERIES_CACHE_TTL_SECONDS = 900
 
 
-@st.cache_data(show_spinner=False)
 def load_stock_history_cached(ticker: str) -> pd.DataFrame:
     return daily_stock_history(ticker)
 
 
-@st.cache_data(show_spinner=False)
+@st.cache_data(show_spinner=False, ttl=SERIES_CACHE_TTL_SECONDS)
 def load_selic_periods_cached() -> pd.DataFrame:
     return selic_periods_row()
 
 
-@st.cache_data(show_spinner=False)
+@st.cache_data(show_spinner=False, ttl=SERIES_CACHE_TTL_SECONDS)
+def load_selic_index_cached() -> SelicIndex:
+    return load_selic_index()
+
+
+@st.cache_data(show_spinner=False, ttl=SERIES_CACHE_TTL_SECONDS)
 def load_ibov_cached() -> pd.DataFrame:
     return ibov_history()
 
 
-@st.cache_data(show_spinner=False)
+@st.cache_data(show_spinner=False, ttl=SERIES_CACHE_TTL_SECONDS)
 def load_ifix_cached() -> pd.DataFrame:
     return ifix_history()
 
@@ -48,11 +63,25 @@ def calculate_stock_metrics(
 
     risk_free_by_period = get_risk_free_by_period()
 
-    metrics = stock_metrics_by_period(
+    # Mesmo cache persistente do ranking: se o histórico e a Selic não
+    # mudaram desde o último cálculo, as métricas vêm do disco.
+    metrics = cached_stock_metrics(
+        ticker,
         history,
         risk_free_by_period=risk_free_by_period,
     )
 
     formatted_metrics = format_metrics_report(metrics)
 
-    return history, metrics, formatted_metrics
\ No newline at end of file
+    return history, metrics, formatted_metrics
+
+
+def calculate_rolling_metrics(ticker: str) -> pd.DataFrame:
+    history = load_stock_history_cached(ticker)
+
+    # Cada janela contra a Selic do próprio intervalo, não a de hoje.
+    return rolling_metrics(
+        history,
+        selic_index=load_selic_index_cached(),
+        benchmark=load_ibov_cached(),
+    )
@@ -5,7 +5,7 @@ from src.web.common import (
     latest_close,
     latest_date,
 )
-from src.web.loaders import calculate_stock_metrics
+from src.web.loaders import calculate_rolling_metrics, calculate_stock_metrics
 
 
 def render_asset_page(ticker: str):
@@ -54,5 +54,21 @@ def render_asset_page(ticker: str):
             "Essas métricas vêm dos dados históricos locais: preço, dividendos e Selic."
         )
 
+        st.subheader("Métricas móveis (252 pregões)")
+
+        rolling = calculate_rolling_metrics(ticker).dropna(how="all")
+
+        if rolling.empty:
+            st.info("Histórico curto demais para a janela de 252 pregões.")
+        else:
+            st.line_chart(rolling[["vol_price", "downside_vol_price"]])
+            st.line_chart(rolling[["sharpe_price", "sortino_price"]])
+            st.line_chart(rolling[["drawdown_price", "current_drawdown_price"]])
+            st.line_chart(rolling[["beta"]])
+
+            st.caption(
+                "Cada ponto usa os 252 pregões anteriores; beta contra o IBOV."
+            )
+
     except Exception as exc:
         st.error(f"Erro ao carregar {ticker}: {exc}")
\ No newline at end of file
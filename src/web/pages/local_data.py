@@ -13,10 +13,14 @@ def render_local_data_page():
 
     paths = [
         "storage/selic/daily_selic.parquet",
+        "storage/selic/daily_selic_index.parquet",
+        "storage/sgs/series.parquet",
         "storage/benchmarks/IBOV/history.parquet",
         "storage/benchmarks/IFIX/history.parquet",
+        "storage/market/manifest.json",
         "storage/fundamentus/latest.parquet",
         "storage/rankings/latest.parquet",
+        "storage/metrics/panel_metrics.parquet",
         "storage/valuations/valuations.sqlite",
     ]
 
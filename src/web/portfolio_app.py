@@ -8,9 +8,11 @@ from datetime import date
 
 from src.portfolio.corporate_actions_storage import load_corporate_actions, save_corporate_actions, add_corporate_action
 
-from src.data.stocks import daily_stock_history
+from src.data.stocks import daily_stock_history_many
+from src.portfolio.checkpoints import DEFAULT_CHECKPOINT_DIR
 from src.portfolio.engine import calculate_portfolio
 from src.portfolio.income_storage import load_income_events, add_income_event, delete_income_event, save_income_events
+from src.portfolio.result_cache import load_cached_portfolio, portfolio_fingerprint, save_cached_portfolio
 
 from src.portfolio.storage import load_transactions, delete_transaction, add_transaction, save_transactions
 
@@ -222,28 +224,52 @@ def format_money(value: float) -> str:
     )
 
 
-@st.cache_data(
-    show_spinner=False,
-    ttl=900,
-)
-def load_market_history(
-        ticker: str,
-) -> pd.DataFrame:
-    return daily_stock_history(ticker)
+def load_market_histories(
+        tickers: tuple[str, ...],
+) -> dict[str, pd.DataFrame]:
+    histories = {}
+
+    for result in daily_stock_history_many(list(tickers)):
+        if result.error is not None:
+            raise result.error
+
+        histories[result.ticker] = result.history
+
+    return histories
 
 
 def calculate_current_portfolio():
+    # Rerun sem mudança na carteira nem nos preços: resultado do disco.
+    fingerprint = portfolio_fingerprint()
+    cached = load_cached_portfolio(fingerprint)
+
+    if cached is not None:
+        return cached
+
     transactions = load_transactions()
     income_events = load_income_events()
     corporate_actions = load_corporate_actions()
 
-    return calculate_portfolio(
+    loaded_tickers: list[str] = []
+
+    def histories_loader(tickers: list[str]) -> dict[str, pd.DataFrame]:
+        loaded_tickers.extend(tickers)
+        return load_market_histories(tuple(tickers))
+
+    result = calculate_portfolio(
         transactions=transactions,
         income_events=income_events,
         corporate_actions=corporate_actions,
-        history_loader=load_market_history,
+        histories_loader=histories_loader,
+        # Alterar um lançamento só refaz os dias a partir do último
+        # checkpoint anterior a ele.
+        checkpoint_dir=DEFAULT_CHECKPOINT_DIR,
     )
 
+    save_cached_portfolio(result, fingerprint, loaded_tickers)
+
+    return result
+
 
 def render_summary():
     st.title("Carteira cotizada")
@@ -352,6 +378,14 @@ def render_summary():
         hide_index=True,
     )
 
+    if not result.daily_weights.empty:
+        st.subheader("Alocação")
+
+        st.area_chart(
+            result.daily_weights.fillna(0.0),
+            use_container_width=True,
+        )
+
     with st.expander("Ver movimentações calculadas"):
         st.dataframe(
             result.ledger,
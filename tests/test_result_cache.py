@@ -0,0 +1,142 @@
+from datetime import date
+
+import pandas as pd
+
+from src.data.market_store import write_ticker_history
+from src.portfolio.engine import calculate_portfolio
+from src.portfolio.result_cache import (
+    load_cached_portfolio,
+    portfolio_fingerprint,
+    save_cached_portfolio,
+)
+
+
+FINAL_DATE = date(2026, 10, 14)
+
+
+def _history(start: str, end: str, close: float) -> pd.DataFrame:
+    dates = pd.bdate_range(start, end)
+
+    return pd.DataFrame(
+        {
+            "date": dates,
+            "open": close,
+            "high": close,
+            "low": close,
+            "close": close,
+            "adj_close": close,
+            "volume": 1000.0,
+            "financial_volume": 1000.0 * close,
+            "dividend": 0.0,
+        }
+    )
+
+
+def _ticker_change_result(store_dir, new_end: str):
+    # OLD3 virou NEW3 em 30/09: o histórico de OLD3 para ali e nunca mais
+    # recebe pregões.
+    histories = {
+        "OLD3": _history("2026-09-01", "2026-09-30", 10.0),
+        "NEW3": _history("2026-09-01", new_end, 10.0),
+    }
+
+    for ticker, history in histories.items():
+        write_ticker_history(f"{ticker}.SA", history, store_dir=store_dir)
+
+    transactions = pd.DataFrame(
+        [
+            {
+                "id": "t1",
+                "date": "2026-09-02",
+                "type": "compra",
+                "ticker": "OLD3",
+                "quantity": 100,
+                "unit_price": 10.0,
+                "costs": 0.0,
+                "created_at": "2026-09-02T10:00:00",
+            }
+        ]
+    )
+    corporate_actions = pd.DataFrame(
+        [
+            {
+                "id": "a1",
+                "ex_date": "2026-09-30",
+                "credit_date": "2026-09-30",
+                "action_type": "mudança de ticker",
+                "source_ticker": "OLD3",
+                "target_ticker": "NEW3",
+                "factor": 1.0,
+                "created_at": "2026-09-30T10:00:00",
+            }
+        ]
+    )
+
+    loaded_tickers: list[str] = []
+
+    def histories_loader(tickers: list[str]) -> dict[str, pd.DataFrame]:
+        loaded_tickers.extend(tickers)
+        return {ticker: histories[ticker] for ticker in tickers}
+
+    result = calculate_portfolio(
+        transactions=transactions,
+        corporate_actions=corporate_actions,
+        histories_loader=histories_loader,
+        final_date=FINAL_DATE,
+    )
+
+    return result, loaded_tickers
+
+
+def test_ticker_change_source_does_not_block_cache_hit(tmp_path):
+    store_dir = tmp_path / "market"
+    cache_dir = tmp_path / "result_cache"
+
+    result, loaded_tickers = _ticker_change_result(store_dir, "2026-10-14")
+
+    assert sorted(loaded_tickers) == ["NEW3", "OLD3"]
+    assert result.positions["ticker"].tolist() == ["NEW3"]
+
+    fingerprint = portfolio_fingerprint(FINAL_DATE, files=[])
+    save_cached_portfolio(
+        result,
+        fingerprint,
+        loaded_tickers,
+        cache_dir=cache_dir,
+        store_dir=store_dir,
+    )
+
+    cached = load_cached_portfolio(
+        fingerprint,
+        final_date=FINAL_DATE,
+        cache_dir=cache_dir,
+        store_dir=store_dir,
+    )
+
+    assert cached is not None
+    pd.testing.assert_frame_equal(cached.positions, result.positions)
+
+
+def test_open_position_without_last_session_misses(tmp_path):
+    store_dir = tmp_path / "market"
+    cache_dir = tmp_path / "result_cache"
+
+    result, loaded_tickers = _ticker_change_result(store_dir, "2026-10-13")
+
+    fingerprint = portfolio_fingerprint(FINAL_DATE, files=[])
+    save_cached_portfolio(
+        result,
+        fingerprint,
+        loaded_tickers,
+        cache_dir=cache_dir,
+        store_dir=store_dir,
+    )
+
+    cached = load_cached_portfolio(
+        fingerprint,
+        final_date=FINAL_DATE,
+        cache_dir=cache_dir,
+        store_dir=store_dir,
+    )
+
+    assert cached is None
@@ -0,0 +1,72 @@
+from datetime import date
+
+import pandas as pd
+
+from src.data import stocks
+from src.data.market_store import load_manifest, write_ticker_history
+
+
+FINAL_DATE = date(2026, 10, 14)
+
+
+def _history(start: str, end: str) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "date": pd.bdate_range(start, end),
+            "open": 10.0,
+            "high": 10.0,
+            "low": 10.0,
+            "close": 10.0,
+            "adj_close": 10.0,
+            "volume": 1000.0,
+            "financial_volume": 10_000.0,
+            "dividend": 0.0,
+        }
+    )
+
+
+def test_lagging_ticker_is_fetched_once_per_session(tmp_path, monkeypatch):
+    store_dir = tmp_path / "market"
+
+    # Ativo deslistado: o histórico para em 30/09 e a Yahoo não devolve
+    # nada depois disso.
+    write_ticker_history(
+        "OLD3.SA",
+        _history("2026-09-01", "2026-09-30"),
+        store_dir=store_dir,
+    )
+    version = load_manifest(store_dir)["tickers"]["OLD3.SA"]["version"]
+
+    fetches = []
+
+    def fake_fetch(**kwargs):
+        fetches.append(kwargs)
+        return _history("2026-09-15", "2026-09-30")
+
+    monkeypatch.setattr(stocks, "_fetch_stock_history_yahoo", fake_fetch)
+
+    for _ in range(3):
+        history = stocks.daily_stock_history(
+            "OLD3",
+            final_date=FINAL_DATE,
+            storage_dir=tmp_path / "legacy",
+            store_dir=store_dir,
+        )
+
+        assert history["date"].max() == pd.Timestamp("2026-09-30")
+
+    entry = load_manifest(store_dir)["tickers"]["OLD3.SA"]
+
+    assert len(fetches) == 1
+    assert entry["checked_session"] == FINAL_DATE.isoformat()
+    assert entry["version"] == version
+
+    # Um pregão depois, volta a consultar a fonte.
+    stocks.daily_stock_history(
+        "OLD3",
+        final_date=date(2026, 10, 15),
+        storage_dir=tmp_path / "legacy",
+        store_dir=store_dir,
+    )
+
+    assert len(fetches) == 2